@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+端到端吞吐基准：saver_pg.py 整条流程跑在本地替身站（seek_stub_server.py）+ 本地 Postgres 上
+    python bench_e2e.py                                  # 50 / 500 / 5000 个投递
+    python bench_e2e.py --sizes 50 --latency-ms 80 --fail-rate 0.02 --env DETAIL_CONCURRENCY=8
+每个规模：起一个替身站、清空基准库里的 jobsnew / job_events / attachments、用临时 Chrome 配置目录跑一次 saver_pg.py，
+输出 jobs/min、入库完整度，替身站看到的各阶段（列表 / 详情 / ApplicantCount / 抽屉 / 下载）请求数与耗时区间，
+以及 saver_pg.py 自己的运行报告（RUN_REPORT_PATH：分阶段耗时、回退 / 验证页 / 下载超时 / DB 错误计数）。
+数据库连接沿用 POSTGRES_HOST / PORT / USER / PASSWORD，库名取 BENCH_POSTGRES_DB（默认 seek_bench，不存在会自动创建）。
+基准库会被清空，不要指向正式库。
+"""
+import os, sys, json, time, shutil, argparse, tempfile, subprocess
+import psycopg2
+from dotenv import load_dotenv
+
+from seek_stub_server import StubSite, serve
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SAVER = os.path.join(HERE, "saver_pg.py")
+
+# 替身站的路由类别 → 阶段
+STAGES = (
+    ("collect", ("list_page", "graphql_applied_jobs")),
+    ("details", ("job_page", "expired_page")),
+    ("applicants", ("graphql_job_details",)),
+    ("drawers", ("drawer_page",)),
+    ("downloads", ("download",)),
+    ("verification", ("verification",)),
+    ("throttled", ("throttled",)),
+)
+
+
+def pg_params(dbname):
+    return dict(host=os.getenv("POSTGRES_HOST", "localhost"), port=os.getenv("POSTGRES_PORT", "5432"),
+                user=os.getenv("POSTGRES_USER", "postgres"), password=os.getenv("POSTGRES_PASSWORD", "postgres"),
+                dbname=dbname)
+
+def prepare_db(dbname):
+    """基准库不存在就建；每轮开始前清掉 saver_pg 建的表和视图（替身站每轮的 job ID 相同，旧事件不能留）。"""
+    admin = psycopg2.connect(**pg_params("postgres"))
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (dbname,))
+        if cur.fetchone() is None:
+            cur.execute(f'CREATE DATABASE "{dbname}"')
+    admin.close()
+    conn = psycopg2.connect(**pg_params(dbname))
+    with conn.cursor() as cur:
+        cur.execute("DROP VIEW IF EXISTS jobsnew_status_timeline")
+        cur.execute("DROP TABLE IF EXISTS job_events CASCADE")
+        cur.execute("DROP TABLE IF EXISTS jobsnew CASCADE")
+        cur.execute("DROP TABLE IF EXISTS attachments CASCADE")
+    conn.commit()
+    conn.close()
+
+def db_summary(dbname):
+    conn = psycopg2.connect(**pg_params(dbname))
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""SELECT count(*), count(*) FILTER (WHERE jd IS NOT NULL),
+                                  count(*) FILTER (WHERE competitor_count IS NOT NULL),
+                                  count(*) FILTER (WHERE cv_sha256 IS NOT NULL),
+                                  count(*) FILTER (WHERE cl_sha256 IS NOT NULL)
+                           FROM jobsnew""")
+            rows, with_jd, with_count, with_cv, with_cl = cur.fetchone()
+    except psycopg2.Error:
+        rows = with_jd = with_count = with_cv = with_cl = 0   # saver_pg.py 没跑到迁移那一步
+    finally:
+        conn.close()
+    return {"rows": rows, "with_jd": with_jd, "with_competitor": with_count, "with_cv": with_cv, "with_cl": with_cl}
+
+def stage_times(stats, t0):
+    """按替身站看到的首末请求时间算各阶段区间（相对运行开始，秒）。"""
+    out = {}
+    for stage, kinds in STAGES:
+        hits = [stats[k] for k in kinds if k in stats]
+        if not hits: continue
+        first, last = min(h["first"] for h in hits), max(h["last"] for h in hits)
+        out[stage] = {"requests": sum(h["count"] for h in hits), "errors": sum(h["errors"] for h in hits),
+                      "start": round(first - t0, 2), "end": round(last - t0, 2), "seconds": round(last - first, 2)}
+    return out
+
+
+def run_one(n, args):
+    site = StubSite(jobs=n, seed=args.seed, latency_ms=args.latency_ms, fail_rate=args.fail_rate,
+                    verify_rate=args.verify_rate, page_kb=args.page_kb, throttle_rps=args.throttle_rps)
+    server, base_url = serve(site)
+    prepare_db(args.db)
+    workdir = tempfile.mkdtemp(prefix=f"seek_bench_{n}_")
+    env = dict(os.environ,
+               SEEK_BASE_URL=base_url, POSTGRES_DB=args.db, MODE="prod", SYNC_MODE="full",
+               CHROME_USER_DATA_DIR=os.path.join(workdir, "chrome"), CHROME_PROFILE_DIR="Default",
+               CHROME_HEADLESS="0" if args.headful else "1",
+               SEEK_CRED_CACHE=os.path.join(workdir, "session.json"),
+               PAGE_ARCHIVE_PATH=os.path.join(workdir, "pages.sqlite3"),
+               RUN_REPORT_PATH=os.path.join(workdir, "run_report.json"),
+               RUN_METRICS_PROM=os.path.join(workdir, "run_metrics.prom"),
+               RUN_JOURNAL_PATH=os.path.join(workdir, "run_journal.jsonl"), DB_BACKEND="postgres",
+               PYTHONUNBUFFERED="1")
+    env.update(kv.split("=", 1) for kv in args.env)
+    log_path = os.path.join(workdir, "saver.log")
+
+    t0 = time.time()
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            proc = subprocess.run([sys.executable, SAVER], cwd=workdir, env=env, stdout=log,
+                                  stderr=subprocess.STDOUT, timeout=args.timeout)
+        rc = proc.returncode
+    except subprocess.TimeoutExpired:
+        rc = "timeout"
+    wall = time.time() - t0
+    stats = site.snapshot()
+    server.shutdown()
+    try:
+        with open(env["RUN_REPORT_PATH"], encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        report = {}
+
+    result = {
+        "jobs": n, "exit": rc, "seconds": round(wall, 1), "jobs_per_min": round(n / wall * 60, 1),
+        "seek_sourced": sum(not j["is_external"] for j in site.jobs),
+        "db": db_summary(args.db), "stages": stage_times(stats, t0), "log": log_path,
+        "saver": {k: report.get(k) for k in ("status", "stages", "counters")},
+    }
+    if args.keep:
+        result["workdir"] = workdir
+    else:
+        with open(log_path, encoding="utf-8", errors="replace") as f:
+            result["log_tail"] = f.read()[-2000:] if rc != 0 else ""
+        shutil.rmtree(workdir, ignore_errors=True)
+        del result["log"]
+    return result
+
+def print_result(r):
+    db = r["db"]
+    print(f"\n[{r['jobs']} jobs] exit={r['exit']}  {r['seconds']}s  {r['jobs_per_min']} jobs/min  "
+          f"rows {db['rows']}/{r['jobs']}  jd {db['with_jd']}  competitor {db['with_competitor']}/{r['seek_sourced']}  "
+          f"cv {db['with_cv']}  cl {db['with_cl']}")
+    print(f"  {'stage':<13}{'requests':>9}{'errors':>8}{'start':>9}{'end':>9}{'seconds':>9}")
+    for stage, st in r["stages"].items():
+        print(f"  {stage:<13}{st['requests']:>9}{st['errors']:>8}{st['start']:>9}{st['end']:>9}{st['seconds']:>9}")
+    saver = r.get("saver") or {}
+    if saver.get("stages"):
+        print(f"  saver_pg run report ({saver.get('status')}):")
+        print(f"  {'stage':<20}{'count':>7}{'total s':>10}{'p50 s':>9}{'p95 s':>9}")
+        for stage, st in sorted(saver["stages"].items(), key=lambda kv: -kv[1]["total_s"]):
+            print(f"  {stage:<20}{st['count']:>7}{st['total_s']:>10}{st['p50_s']:>9}{st['p95_s']:>9}")
+    if saver.get("counters"):
+        print("  counters: " + ", ".join(f"{k}={v}" for k, v in sorted(saver["counters"].items())))
+    if r.get("log_tail"):
+        print("  --- saver_pg.py output (tail) ---\n" + r["log_tail"])
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="50,500,5000", help="逗号分隔的投递数量")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--fail-rate", type=float, default=0.01)
+    ap.add_argument("--verify-rate", type=float, default=0.0)
+    ap.add_argument("--page-kb", type=int, default=200)
+    ap.add_argument("--throttle-rps", type=float, default=0.0, help="替身站超过该速率回 429")
+    ap.add_argument("--db", default=os.getenv("BENCH_POSTGRES_DB", "seek_bench"))
+    ap.add_argument("--timeout", type=float, default=4 * 3600, help="单轮超时（秒）")
+    ap.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="额外传给 saver_pg.py 的环境变量")
+    ap.add_argument("--headful", action="store_true", help="显示 Chrome 窗口")
+    ap.add_argument("--keep", action="store_true", help="保留每轮的临时目录（日志、归档、Chrome 配置）")
+    ap.add_argument("--json", help="结果另存为 JSON")
+    args = ap.parse_args()
+
+    if args.db == os.getenv("POSTGRES_DB", "jobsdb"):
+        sys.exit(f"refusing to benchmark against {args.db!r}: it is the POSTGRES_DB saver_pg.py writes to")
+
+    results = []
+    for n in (int(x) for x in args.sizes.split(",") if x.strip()):
+        results.append(run_one(n, args))
+        print_result(results[-1])
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    main()
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+详情页解析基准：seek_parser（内嵌状态 + 片段解析）对比旧实现（整页 BeautifulSoup/lxml）
+    python bench_parser.py                       # fixtures/ 下的 active / expired / verification 页面
+    python bench_parser.py --archive seek_pages.sqlite3 --limit 200   # 再加上归档里的真实页面
+输出每种页面、每种实现的 pages/s、单页峰值内存（tracemalloc），以及两种实现结果是否一致。
+"""
+import os, sys, glob, time, zlib, sqlite3, argparse, tracemalloc
+from bs4 import BeautifulSoup
+
+import seek_parser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def legacy_parse(html):
+    """改造前 fetch_detail_via_https 的解析：验证页检测 + 整页建树。"""
+    if seek_parser.is_verification_page(html):
+        return (None, None, None, None)
+    soup = BeautifulSoup(html, "lxml")
+    jd_node = soup.select_one("div[data-automation='jobAdDetails']")
+    jd_text = jd_node.get_text("\n", strip=True) if jd_node else None
+    html_fragment = str(jd_node) if jd_node else None
+    field_node = soup.select_one("[data-automation='job-detail-classifications'] a")
+    job_type_node = soup.select_one("[data-automation='job-detail-work-type'] a")
+    field_text = field_node.get_text(strip=True) if field_node else None
+    job_type_text = job_type_node.get_text(strip=True) if job_type_node else None
+    return (field_text, job_type_text, jd_text, html_fragment)
+
+
+IMPLS = (("legacy", legacy_parse), ("seek_parser", seek_parser.parse_detail))
+
+
+def load_pages(archive=None, limit=None):
+    pages = []
+    for fp in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html"))):
+        with open(fp, encoding="utf-8") as f:
+            pages.append((os.path.splitext(os.path.basename(fp))[0], f.read()))
+    if archive:
+        conn = sqlite3.connect(archive)
+        sql = "SELECT job_id, body FROM pages ORDER BY fetched_at DESC" + (f" LIMIT {int(limit)}" if limit else "")
+        rows = conn.execute(sql).fetchall()
+        conn.close()
+        pages.append(("archive", [zlib.decompress(b).decode("utf-8", "replace") for _, b in rows]))
+    return pages
+
+
+def bench(fn, htmls, min_seconds):
+    """重复跑到至少 min_seconds，返回 (pages/s, 单页峰值内存 KiB)。"""
+    n, start = 0, time.perf_counter()
+    while True:
+        for h in htmls:
+            fn(h)
+        n += len(htmls)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_seconds: break
+    peak = 0
+    for h in htmls:
+        tracemalloc.start()
+        fn(h)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return n / elapsed, peak / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--archive", help="page_archive.py 的归档文件")
+    ap.add_argument("--limit", type=int, default=200, help="从归档取多少页")
+    ap.add_argument("--seconds", type=float, default=2.0, help="每组至少跑多久")
+    args = ap.parse_args()
+
+    pages = load_pages(args.archive, args.limit)
+    if not pages:
+        sys.exit(f"no fixtures in {FIXTURE_DIR}")
+    print(f"{'pages':<14}{'impl':<13}{'pages/s':>10}{'peak KiB':>11}  match")
+    for name, htmls in pages:
+        htmls = htmls if isinstance(htmls, list) else [htmls]
+        expected = [legacy_parse(h) for h in htmls]
+        rates = {}
+        for impl, fn in IMPLS:
+            rate, peak = bench(fn, htmls, args.seconds)
+            rates[impl] = rate
+            same = sum(fn(h) == e for h, e in zip(htmls, expected))
+            print(f"{name:<14}{impl:<13}{rate:>10.1f}{peak:>11.0f}  {same}/{len(htmls)}")
+        print(f"{'':<14}speedup {rates['seek_parser'] / rates['legacy']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
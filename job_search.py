@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+投递过的职位全文检索（标题 / 公司 / 领域 / JD），按相关度排序、带 JD 高亮片段
+    python job_search.py kubernetes
+    python job_search.py '"platform engineer" terraform -contract' --status Viewed --since 2025-01-01 --limit 10
+查询语法同 Postgres websearch_to_tsquery："短语"、or、-排除；日期过滤按 posted_date（YYYY-MM-DD）。
+后端按 DB_BACKEND（storage.py）：postgres 走 search_tsv 的 GIN 索引，sqlite 走 FTS5。
+"""
+import re, time, argparse
+from dotenv import load_dotenv
+
+load_dotenv()   # 先于 storage 导入：DB_BACKEND / SQLITE_PATH 在 import 时读取
+
+from storage import open_store
+
+
+def print_hits(hits):
+    for i, (jid, title, company, status, posted, rank, snippet) in enumerate(hits, 1):
+        print(f"{i:>3}. {rank:8.4g}  {jid}  {title or '?'} — {company or '?'}  [{status or '-'}]  {posted or ''}")
+        snippet = re.sub(r"\s+", " ", snippet or "").strip()
+        if snippet:
+            print(f"       {snippet}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="jobsnew 全文检索")
+    ap.add_argument("query", nargs="+", help="检索词")
+    ap.add_argument("--status", help="只看当前状态（status_summary）为该值的，不区分大小写")
+    ap.add_argument("--since", help="posted_date 不早于 YYYY-MM-DD")
+    ap.add_argument("--until", help="posted_date 不晚于 YYYY-MM-DD")
+    ap.add_argument("--limit", type=int, default=20)
+    args = ap.parse_args()
+
+    store = open_store()
+    try:
+        t0 = time.perf_counter()
+        hits = store.search(" ".join(args.query), status=args.status, since=args.since,
+                            until=args.until, limit=args.limit)
+        ms = (time.perf_counter() - t0) * 1000
+    finally:
+        store.close()
+    print_hits(hits)
+    print(f"[SEARCH] {len(hits)} hits in {ms:.1f} ms ({store.backend})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+"""
+旧库批量迁移进 jobsnew：saver_pg_old.py 的 Postgres jobs 表 + seek_job_saver.py 的 SQLite jobs 表
+    python migrate_legacy.py                                 # 两个旧表都导；目标库按 DB_BACKEND（storage.py）
+    python migrate_legacy.py --sqlite old/seek_jobs_demo.db --no-pg
+    python migrate_legacy.py --dry-run                       # 只读旧表、统计，不写目标库
+旧表逐批流式读出（Postgres 用服务端游标），从 job_url 取 SEEK job ID（/job/ 与 /expiredjob/ 归到同一个 job），
+取不到 ID 的行跳过。每批 COPY（SQLite 目标用 executemany）进暂存表，读完后一次合并（见 storage.py 批量导入）：
+  - 只补空：库里已有的值一律保留，旧数据不覆盖 saver_pg.py 抓到的新数据；同一 job 多行按读出顺序依次补
+    （旧 Postgres 表在前，各表内有 JD 的行在前）
+  - 状态时间线拆成事件插进 job_events（已有的跳过），status_summary 按事件重算；
+    SQLite 旧表没有时间线，applied_date 记成一条 Applied 事件
+  - 旧 Postgres 表的 cv_file / cl_file 按 SHA-256 存进 attachments，jobsnew 只写引用
+整个导入一个事务，中途失败不留半截；重复跑是幂等的。
+旧 Postgres 表和目标库用同一组 POSTGRES_* 连接参数（表名 --pg-table）；SQLite 旧库默认 DB_PATH。
+"""
+import os, time, uuid, sqlite3, argparse
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()   # 先于 storage 导入：DB_BACKEND / SQLITE_PATH 在 import 时读取，DB_PATH / IMPORT_BATCH_SIZE 见下
+
+import storage
+from storage import attachment_hash, open_store, seek_job_id_from_url
+
+LEGACY_SQLITE_PATH = os.getenv("DB_PATH", "seek_jobs_demo.db")   # seek_job_saver.py 的库
+IMPORT_BATCH_SIZE  = int(os.getenv("IMPORT_BATCH_SIZE", "5000"))  # 每批暂存的行数
+
+PG_LEGACY_COLUMNS = ("job_url", "job_title", "company", "address", "field", "job_type", "posted_date",
+                     "jd", "source", "status_summary", "status_timeline", "cv_file", "cl_file", "created_at")
+SQLITE_LEGACY_COLUMNS = ("job_url", "job_title", "company", "address", "field", "job_type", "posted_date",
+                         "applied_date", "jd", "created_at")
+
+
+# =========================
+# 读旧表
+# =========================
+def read_legacy_pg(table, batch_size):
+    """旧 Postgres 表，服务端游标分批读；表不存在返回空。"""
+    conn = storage.pg_connect()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass(%s)", (table,))
+        if cur.fetchone()[0] is None:
+            print(f"[WARN] legacy Postgres table {table!r} not found, skipped")
+            return
+        cur.close()
+        cur = conn.cursor(name="legacy_jobs")   # 服务端游标：不把整表（含 JD / 附件）读进内存
+        cur.itersize = batch_size
+        cur.execute(f"SELECT {', '.join(PG_LEGACY_COLUMNS)} FROM {table} "
+                    f"ORDER BY COALESCE(jd, '') = '', created_at")
+        for row in cur:
+            yield dict(zip(PG_LEGACY_COLUMNS, row))
+        cur.close()
+    finally:
+        conn.close()
+
+def read_legacy_sqlite(path):
+    if not os.path.exists(path):
+        print(f"[WARN] legacy SQLite db {path!r} not found, skipped")
+        return
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'jobs'").fetchone() is None:
+            print(f"[WARN] {path!r} has no jobs table, skipped")
+            return
+        cur = conn.execute(f"SELECT {', '.join(SQLITE_LEGACY_COLUMNS)} FROM jobs "
+                           f"ORDER BY COALESCE(jd, '') = '', created_at")
+        for row in cur:
+            yield dict(zip(SQLITE_LEGACY_COLUMNS, row))
+    finally:
+        conn.close()
+
+
+# =========================
+# 旧行 → payload
+# =========================
+def legacy_payload(row, jid):
+    """旧行按新行格式填；status_timeline 是事件列表（进 job_events）。
+    detail_variant 留空：旧表没记哪个详情 URL 抓成功过，交给 saver_pg.py 下次实际抓到时写。"""
+    url = row["job_url"]
+    timeline = row.get("status_timeline")
+    timeline = [t for t in timeline if isinstance(t, dict)] if isinstance(timeline, list) else []
+    if not timeline and row.get("applied_date"):
+        timeline = [{"status": "Applied", "date": row["applied_date"], "note": ""}]   # seek_job_saver.py 只记了投递日期
+    status = row.get("status_summary") or (timeline[-1].get("status") if timeline else None)
+    return {
+        "id": str(uuid.uuid4()),
+        "job_url": url,
+        "job_title": row.get("job_title"),
+        "company": row.get("company"),
+        "address": row.get("address"),
+        "field": row.get("field"),
+        "job_type": row.get("job_type"),
+        "posted_date": row.get("posted_date"),
+        "salary": None,
+        "competitor_count": None,
+        "jd": row.get("jd"),
+        "html_content": None,
+        "source": row.get("source"),
+        "status_summary": status,
+        "status_timeline": timeline,
+        "cv_sha256": attachment_hash(row.get("cv_file")),
+        "cl_sha256": attachment_hash(row.get("cl_file")),
+        "created_at": row.get("created_at") or datetime.utcnow().isoformat(),
+        "seek_job_id": jid,
+        "sync_fingerprint": None,
+        "detail_variant": None,
+    }
+
+
+class LegacyImporter:
+    """分批暂存进 store；附件按哈希去重上传（与暂存同一事务）。"""
+    def __init__(self, store, batch_size=IMPORT_BATCH_SIZE):
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.buffer = []
+        self.blobs = {}
+        self._known_hashes = set()
+        self.stats = {"read": 0, "staged": 0, "no_job_id": 0, "attachments": 0}
+
+    def add(self, row):
+        self.stats["read"] += 1
+        jid = seek_job_id_from_url(row.get("job_url"))
+        if not jid:
+            self.stats["no_job_id"] += 1
+            return
+        for blob in (row.get("cv_file"), row.get("cl_file")):
+            if blob:
+                blob = bytes(blob)
+                self.blobs.setdefault(attachment_hash(blob), blob)
+        self.buffer.append(legacy_payload(row, jid))
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.store is not None:
+            self._store_attachments()
+            if self.buffer:
+                self.store.stage_import(self.buffer)
+        self.stats["staged"] += len(self.buffer)
+        self.buffer = []
+        self.blobs = {}
+
+    def _store_attachments(self):
+        missing = [h for h in self.blobs if h not in self._known_hashes]
+        if not missing: return
+        have = self.store.existing_attachments(missing)
+        now = datetime.utcnow().isoformat()
+        new = [(h, self.blobs[h], len(self.blobs[h]), now) for h in missing if h not in have]
+        if new:
+            self.store.insert_attachments(new)
+            self.stats["attachments"] += len(new)
+        self._known_hashes.update(missing)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sqlite", default=LEGACY_SQLITE_PATH, help="seek_job_saver.py 的 SQLite 库（默认 DB_PATH）")
+    ap.add_argument("--no-sqlite", action="store_true", help="不导 SQLite 旧库")
+    ap.add_argument("--pg-table", default="jobs", help="saver_pg_old.py 的表名")
+    ap.add_argument("--no-pg", action="store_true", help="不导旧 Postgres 表")
+    ap.add_argument("--batch", type=int, default=IMPORT_BATCH_SIZE, help="每批暂存的行数")
+    ap.add_argument("--dry-run", action="store_true", help="只读旧表、统计，不写目标库")
+    args = ap.parse_args()
+
+    sources = []
+    if not args.no_pg:
+        sources.append((f"postgres:{args.pg_table}", lambda: read_legacy_pg(args.pg_table, args.batch)))
+    if not args.no_sqlite:
+        sources.append((f"sqlite:{args.sqlite}", lambda: read_legacy_sqlite(args.sqlite)))
+
+    store = None if args.dry_run else open_store()
+    importer = LegacyImporter(store, args.batch)
+    t0 = time.perf_counter()
+    try:
+        for name, read in sources:
+            n = importer.stats["read"]
+            for row in read():
+                importer.add(row)
+            print(f"[LEGACY] {name}: {importer.stats['read'] - n} rows read")
+        importer.flush()
+        t_stage = time.perf_counter() - t0
+        inserted = merged = 0
+        if store is not None:
+            inserted, merged = store.merge_import()
+            store.commit()
+    except Exception:
+        if store is not None: store.rollback()
+        raise
+    finally:
+        if store is not None: store.close()
+    st = importer.stats
+    print(f"[LEGACY] read {st['read']}, staged {st['staged']}, skipped {st['no_job_id']} without a SEEK job id, "
+          f"attachments +{st['attachments']}")
+    if args.dry_run:
+        print(f"[LEGACY] dry run, nothing written ({t_stage:.1f}s)")
+    else:
+        print(f"[LEGACY] jobsnew: {inserted} inserted, {merged} merged into existing rows "
+              f"({store.backend}, staged in {t_stage:.1f}s, total {time.perf_counter() - t0:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+详情页原始 HTML 归档 + 离线重解析
+- saver_pg.py 每抓到一个详情页就原样存一份（zlib 压缩，SQLite 单文件，键 = job_id + 抓取时间）
+- SEEK 改了 data-automation 选择器时，不用再过 Cloudflare 重爬：
+    python page_archive.py reparse            # 用每个 job 最新一份页面重建 field / job_type / jd / html_content
+    python page_archive.py reparse --dry-run  # 只解析、统计，不写库
+    python page_archive.py stats
+回写目标按 DB_BACKEND（storage.py）：postgres 或 sqlite
+"""
+import os, zlib, sqlite3, argparse, threading
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from seek_parser import parse_detail
+
+PAGE_ARCHIVE_PATH = os.getenv("PAGE_ARCHIVE_PATH", os.path.join(os.getcwd(), "seek_pages.sqlite3"))
+
+
+class PageArchive:
+    """线程安全的压缩页面归档。WAL + synchronous=NORMAL，抓取线程写入不会互相等 fsync。"""
+    def __init__(self, path=PAGE_ARCHIVE_PATH, level=6):
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                job_id TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                url TEXT,
+                body BLOB NOT NULL,
+                PRIMARY KEY (job_id, fetched_at)
+            )
+        """)
+        self.conn.commit()
+
+    def put(self, job_id, url, html):
+        body = zlib.compress(html.encode("utf-8"), self.level)
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO pages (job_id, fetched_at, url, body) VALUES (?, ?, ?, ?)",
+                              (str(job_id), datetime.utcnow().isoformat(), url, body))
+            self.conn.commit()
+
+    def latest(self):
+        """每个 job 最新一份：(job_id, fetched_at, url, 压缩后的 body)。"""
+        with self._lock:
+            return self.conn.execute("""
+                SELECT p.job_id, p.fetched_at, p.url, p.body FROM pages p
+                JOIN (SELECT job_id, MAX(fetched_at) AS ts FROM pages GROUP BY job_id) m
+                  ON m.job_id = p.job_id AND m.ts = p.fetched_at
+            """).fetchall()
+
+    def stats(self):
+        with self._lock:
+            pages, jobs, size = self.conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT job_id), COALESCE(SUM(LENGTH(body)), 0) FROM pages").fetchone()
+        return {"pages": pages, "jobs": jobs, "compressed_bytes": size}
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+def _parse_archived(item):
+    job_id, body = item
+    return job_id, parse_detail(zlib.decompress(body).decode("utf-8", "replace"))
+
+
+def reparse(archive, workers=None, dry_run=False, batch_size=500):
+    """进程池并行解析整个归档，按 seek_job_id 批量回写；解析不到的字段保留库里原值。"""
+    items = [(job_id, body) for job_id, _, _, body in archive.latest()]
+    print(f"[REPARSE] {len(items)} jobs in {archive.path}")
+    store = None
+    if not dry_run:
+        from storage import open_store
+        store = open_store()
+
+    parsed = empty = updated = 0
+    pending = []
+
+    def _flush():
+        nonlocal updated
+        if not pending or dry_run: pending.clear(); return
+        updated += store.update_details(pending)
+        store.commit()
+        pending.clear()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for job_id, result in pool.map(_parse_archived, items, chunksize=32):
+            parsed += 1
+            if not any(result):
+                empty += 1
+                continue
+            pending.append((job_id, *result))
+            if len(pending) >= batch_size:
+                _flush()
+    _flush()
+    if store is not None:
+        store.close()
+    print(f"[REPARSE] parsed {parsed}, nothing found in {empty}, updated {updated} rows"
+          + (" (dry run)" if dry_run else ""))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SEEK 详情页归档工具")
+    ap.add_argument("--archive", default=os.getenv("PAGE_ARCHIVE_PATH", PAGE_ARCHIVE_PATH))   # .env 在 import 之后才加载
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    rp = sub.add_parser("reparse", help="离线重解析整个归档并回写 jobsnew")
+    rp.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    rp.add_argument("--dry-run", action="store_true", help="只解析统计，不写库")
+    sub.add_parser("stats", help="归档规模")
+    args = ap.parse_args()
+
+    archive = PageArchive(args.archive)
+    try:
+        if args.cmd == "reparse":
+            reparse(archive, workers=args.workers, dry_run=args.dry_run)
+        else:
+            print(archive.stats())
+    finally:
+        archive.close()
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    main()
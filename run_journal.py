@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+运行进度日志（断点续跑）：一次同步里每个 job 完成了哪些阶段，追加写进本地 JSONL
+    journal = RunJournal(RUN_JOURNAL_PATH)
+    journal.start(ordered_ids=..., process_ids=..., jobs_map=...)   # 新的一次运行：清空旧日志
+    journal.record_drawer(jid, competitor, cv_bytes, cl_bytes)
+    journal.record_written([jid, ...])                               # 已提交进库
+    journal.finish()                                                 # 跑完：打结束标记、删 blobs
+    python saver_pg.py --resume                                      # 上次没跑完：从第一个未完成的阶段接着跑
+大块内容（详情页结果、CV/CL 字节）按 SHA-256 存进旁边的 <journal>.blobs/（zlib 压缩），日志行里只放哈希；
+运行中内存里不留这些结果，续跑时 load() 只读回引用，journal.detail(jid) / journal.drawer(jid) 逐个 job 按需读 blob。
+每行写完即 flush；抽屉 / 入库这类贵的阶段额外 fsync，进程崩溃、断电、休眠都最多丢最后一行（读回时跳过坏行）。
+"""
+import os, json, time, uuid, shutil, hashlib, zlib, threading
+
+RUN_JOURNAL_PATH = os.getenv("RUN_JOURNAL_PATH", os.path.join(os.getcwd(), "seek_run_journal.jsonl"))
+
+
+class RunJournal:
+    """线程安全；load() 读回上一次运行，start() 开始新的一次。"""
+    def __init__(self, path=RUN_JOURNAL_PATH):
+        self.path = path
+        self.blob_dir = path + ".blobs"
+        self._lock = threading.Lock()
+        self._fh = None
+        self._reset()
+
+    def _reset(self):
+        self.run_id = None
+        self.header = {}
+        self.details = {}     # jid -> (blob 哈希, URL 变体)；只由 load() 填，内容见 detail()
+        self.counts = None    # ApplicantCount 批量结果 {jid: count}
+        self.drawers = {}     # jid -> (competitor, cv 哈希, cl 哈希)；只由 load() 填，内容见 drawer()
+        self.written = set()
+        self.finished = False
+
+    # ---------- 读回 ----------
+    def load(self):
+        """读回已有日志；上一次运行没跑完（有开始、无结束标记）返回 True。"""
+        self._reset()
+        try:
+            f = open(self.path, "r", encoding="utf-8")
+        except OSError:
+            return False
+        details, drawers = {}, {}
+        with f:
+            for line in f:
+                try: rec = json.loads(line)
+                except ValueError: continue   # 写到一半的最后一行
+                kind = rec.get("type")
+                if kind == "start":
+                    self._reset()
+                    details, drawers = {}, {}
+                    self.run_id, self.header = rec.get("run_id"), rec
+                elif kind == "detail":
+                    details[rec["jid"]] = rec
+                elif kind == "counts":
+                    self.counts = rec["counts"]
+                elif kind == "drawer":
+                    drawers[rec["jid"]] = rec
+                elif kind == "written":
+                    self.written.update(rec["jids"])
+                elif kind == "done":
+                    self.finished = True
+        if self.run_id is None or self.finished:
+            return False
+        # 只记引用，不读内容；blob 文件不在的条目当作没做过，续跑时重做
+        for jid, rec in details.items():
+            if self._has_blob(rec.get("blob")):
+                self.details[jid] = (rec.get("blob"), rec.get("variant"))
+        for jid, rec in drawers.items():
+            if self._has_blob(rec.get("cv")) and self._has_blob(rec.get("cl")):
+                self.drawers[jid] = (rec.get("competitor"), rec.get("cv"), rec.get("cl"))
+        return True
+
+    def detail(self, jid):
+        """load() 读回的详情结果四元组；blob 读坏了返回全 None（当作没抓到，走 Selenium 回退）。"""
+        key, _ = self.details[jid]
+        try: return tuple(json.loads(self._get_blob(key) or b"[null,null,null,null]"))
+        except (OSError, ValueError, zlib.error): return (None, None, None, None)
+
+    def drawer(self, jid):
+        """load() 读回的抽屉结果 (competitor, cv_bytes, cl_bytes)；blob 读坏了返回 None。"""
+        competitor, cv, cl = self.drawers[jid]
+        try: return competitor, self._get_blob(cv), self._get_blob(cl)
+        except (OSError, zlib.error): return None
+
+    # ---------- 写入 ----------
+    def start(self, **header):
+        """开始新的一次运行：清掉旧日志和 blobs，第一行写运行头（job 列表等）。"""
+        with self._lock:
+            self._close()
+            shutil.rmtree(self.blob_dir, ignore_errors=True)
+            self._reset()
+            self.run_id = uuid.uuid4().hex
+            self.header = {"type": "start", "run_id": self.run_id, "started_at": time.time(), **header}
+            self._fh = open(self.path, "w", encoding="utf-8")
+        self._append(self.header, sync=True)
+
+    def reopen(self):
+        """--resume：接着上一次的日志往后追加。"""
+        with self._lock:
+            self._close()
+            self._fh = open(self.path, "a", encoding="utf-8")
+
+    def record_detail(self, jid, result, variant=None):
+        blob = self._put_blob(json.dumps(list(result)).encode("utf-8")) if any(result) else None
+        self._append({"type": "detail", "jid": jid, "blob": blob, "variant": variant})
+
+    def record_counts(self, counts):
+        self.counts = dict(counts)
+        self._append({"type": "counts", "counts": self.counts}, sync=True)
+
+    def record_drawer(self, jid, competitor, cv_bytes, cl_bytes):
+        self._append({"type": "drawer", "jid": jid, "competitor": competitor,
+                      "cv": self._put_blob(cv_bytes), "cl": self._put_blob(cl_bytes)}, sync=True)
+
+    def record_written(self, jids):
+        jids = list(jids)
+        if not jids: return
+        self.written.update(jids)
+        self._append({"type": "written", "jids": jids}, sync=True)
+
+    def finish(self):
+        """整次运行跑完：打结束标记，blobs 不再需要。"""
+        self.finished = True
+        self._append({"type": "done", "finished_at": time.time()}, sync=True)
+        shutil.rmtree(self.blob_dir, ignore_errors=True)
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def _append(self, rec, sync=False):
+        line = json.dumps(rec, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._fh is None: return
+            self._fh.write(line)
+            self._fh.flush()
+            if sync: os.fsync(self._fh.fileno())
+
+    # ---------- blobs ----------
+    def _put_blob(self, data):
+        if not data: return None
+        key = hashlib.sha256(data).hexdigest()
+        fp = os.path.join(self.blob_dir, key)
+        if not os.path.exists(fp):
+            os.makedirs(self.blob_dir, exist_ok=True)
+            tmp = f"{fp}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(zlib.compress(data, 6))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, fp)
+        return key
+
+    def _has_blob(self, key):
+        return not key or os.path.exists(os.path.join(self.blob_dir, key))
+
+    def _get_blob(self, key):
+        if not key: return None
+        with open(os.path.join(self.blob_dir, key), "rb") as f:
+            return zlib.decompress(f.read())
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+"""
+运行指标：分阶段计时 + 结果计数，退出时写 JSON 报告和 Prometheus 文本格式文件
+    METRICS = RunMetrics("seek_saver")
+    with METRICS.stage("drawer_nav"): driver.get(url)
+    METRICS.incr("fallback_used")
+    METRICS.write(json_path, prom_path)
+Prometheus 文件给 node_exporter 的 textfile collector 读（原子替换写入），调度器按阶段直方图 / 计数器告警。
+"""
+import os, json, time, socket, threading
+from contextlib import contextmanager
+from datetime import datetime
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+MAX_SAMPLES = 20000   # 每个阶段保留的样本上限（算分位数用）
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "count", "total", "max", "samples")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = []
+
+    def observe(self, v):
+        self.count += 1
+        self.total += v
+        self.max = max(self.max, v)
+        for i, b in enumerate(self.buckets):
+            if v <= b: self.counts[i] += 1
+        if len(self.samples) < MAX_SAMPLES:
+            self.samples.append(v)
+
+    def quantile(self, q):
+        if not self.samples: return None
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+
+class RunMetrics:
+    """线程安全；计时用 monotonic。stage() 可嵌套，也可在线程池里用。"""
+    def __init__(self, namespace="seek_saver", buckets=DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self.started_at = time.time()
+        self._t0 = time.monotonic()
+        self._lock = threading.Lock()
+        self._hist = {}
+        self.counters = {}
+        self.info = {}
+        self.status = "incomplete"   # 主流程跑完才改成 ok；崩溃退出时报告里仍是 incomplete
+
+    @contextmanager
+    def stage(self, name):
+        t = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(name, time.monotonic() - t)
+
+    def observe(self, name, seconds):
+        with self._lock:
+            h = self._hist.get(name)
+            if h is None:
+                h = self._hist[name] = _Histogram(self.buckets)
+            h.observe(seconds)
+
+    def incr(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_info(self, **kw):
+        with self._lock:
+            self.info.update(kw)
+
+    def report(self):
+        with self._lock:
+            stages = {}
+            for name, h in self._hist.items():
+                stages[name] = {
+                    "count": h.count, "total_s": round(h.total, 3), "max_s": round(h.max, 3),
+                    "mean_s": round(h.total / h.count, 4) if h.count else None,
+                    "p50_s": _round(h.quantile(0.5)), "p95_s": _round(h.quantile(0.95)),
+                }
+            return {
+                "status": self.status,
+                "started_at": datetime.utcfromtimestamp(self.started_at).isoformat() + "Z",
+                "duration_s": round(time.monotonic() - self._t0, 3),
+                "host": socket.gethostname(),
+                "info": dict(self.info),
+                "stages": stages,
+                "counters": dict(self.counters),
+            }
+
+    def prometheus(self):
+        ns = self.namespace
+        lines = [f"# HELP {ns}_stage_seconds Wall time per pipeline stage.",
+                 f"# TYPE {ns}_stage_seconds histogram"]
+        with self._lock:
+            for name in sorted(self._hist):
+                h = self._hist[name]
+                lab = _labels(stage=name)
+                for b, c in zip(h.buckets, h.counts):
+                    lines.append(f'{ns}_stage_seconds_bucket{_labels(stage=name, le=_fmt(b))} {c}')
+                lines.append(f'{ns}_stage_seconds_bucket{_labels(stage=name, le="+Inf")} {h.count}')
+                lines.append(f"{ns}_stage_seconds_sum{lab} {_fmt(h.total)}")
+                lines.append(f"{ns}_stage_seconds_count{lab} {h.count}")
+            lines += [f"# HELP {ns}_events_total Outcome counters for the run.",
+                      f"# TYPE {ns}_events_total counter"]
+            for name in sorted(self.counters):
+                lines.append(f"{ns}_events_total{_labels(event=name)} {self.counters[name]}")
+            status = self.status
+        lines += [f"# HELP {ns}_run_duration_seconds Duration of the last run.",
+                  f"# TYPE {ns}_run_duration_seconds gauge",
+                  f"{ns}_run_duration_seconds {_fmt(time.monotonic() - self._t0)}",
+                  f"# HELP {ns}_run_success Whether the last run finished (1) or died part way (0).",
+                  f"# TYPE {ns}_run_success gauge",
+                  f"{ns}_run_success {1 if status == 'ok' else 0}",
+                  f"# HELP {ns}_run_timestamp_seconds Start time of the last run.",
+                  f"# TYPE {ns}_run_timestamp_seconds gauge",
+                  f"{ns}_run_timestamp_seconds {int(self.started_at)}"]
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path=None, prom_path=None):
+        """两种格式都是写临时文件再 os.replace，采集方不会读到半个文件。"""
+        if json_path:
+            _atomic_write(json_path, json.dumps(self.report(), indent=2, ensure_ascii=False))
+        if prom_path:
+            _atomic_write(prom_path, self.prometheus())
+
+
+def _round(v):
+    return None if v is None else round(v, 4)
+
+def _fmt(v):
+    return repr(float(v))
+
+def _labels(**kw):
+    esc = lambda s: str(s).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in kw.items()) + "}"
+
+def _atomic_write(path, text):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
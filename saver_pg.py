@@ -2,23 +2,56 @@
 """
 SEEK 抓取（无 selenium-wire，CDP 读取 GraphQL）
 流程：
-1) 进入 https://www.seek.co.nz/my-activity/applied-jobs ，用 CDP 收集 appliedJobs 全量（含顺序、isExternal、isActive、events）
-2) 计算 page = idx // 20 + 1，构造抽屉页 URL：https://www.seek.co.nz/my-activity/applied-jobs/{job_id}?page={page}
-   - SEEK 源：打开该 URL，CDP 取 ApplicantCount；Selenium 点击按钮下载 CV/CL
+1) 收集 appliedJobs 全量（含顺序、isExternal、isActive、events）：回放缓存的 appliedJobs GraphQL 请求并按游标翻页；
+   没有模板时打开一次 https://www.seek.co.nz/my-activity/applied-jobs ，用 CDP 事件订阅记下请求模板
+2) page 取回放时的真实页码（回退滚动收集时才按 idx // 20 + 1 估算），构造抽屉页 URL：https://www.seek.co.nz/my-activity/applied-jobs/{job_id}?page={page}
+   - SEEK 源：ApplicantCount 先批量回放 jobDetails GraphQL 拿（COMPETITOR_MODE=graphql）；
+     打开该 URL，Selenium 点击按钮下载 CV/CL（DevTools 下载事件按 GUID 认领，CV/CL 并行下载），批量没拿到的再从抽屉的 GraphQL 里取
+     DRAWER_TABS>1 时同一 Chrome 会话开多个后台 tab 并行处理抽屉（每个 tab 独立 DevTools 会话，下载按 frameId 认领）
    - 非 SEEK 源：跳过抽屉页
-3) 详情页统一 HTTPS（带浏览器 Cookie）抓取：field / job_type / JD(innerText) / 静态 HTML(outerHTML)；失败再回退 Selenium
-4) 入库（按 job_id 与 job_url 中 id 匹配）：
-   - 只追加 timeline（去重，按日期排序），status_summary 取最后一条
+3) 详情页统一 HTTPS（带浏览器 Cookie，线程池 + keep-alive 连接池并发，按 host 自适应限速）抓取：
+   field / job_type / JD(innerText) / 静态 HTML(outerHTML)；失败再回退 Selenium
+   成功的 URL 变体（/job/ 或 /expiredjob/）记进 detail_variant，下次先试它；限流只重试同一 URL，不换变体
+   已下线且 jd / html_content 都已入库的 job 视为不可变，详情整个跳过
+   流水线：详情预取线程池（领先主循环至多 DETAIL_PREFETCH 个 job）/ 主线程浏览器（抽屉、下载、回退）/ 写库线程（队列上限 DB_QUEUE_SIZE）
+   三段同时跑，阶段间有界、满了就反压；记录按处理顺序入队，同一 job 的写入顺序确定
+   解析走 seek_parser.py：优先取页面内嵌的 SEEK_REDUX_DATA，JD 只切出 jobAdDetails 片段解析，不建整页 DOM
+   原始页面压缩归档（page_archive.py），选择器变了可离线 reparse，无需重爬
+4) 入库（按 seek_job_id 唯一键匹配；JobWriter 缓冲后按批 upsert，单事务提交；合并在 upsert 语句里由数据库完成，不回读已有行）：
+   - 状态事件只追加进 job_events（唯一键去重，insert do nothing），status_summary 取按日期排序的最后一条；
+     旧的 status_timeline 数组见视图 jobsnew_status_timeline
    - competitor_count 取 max(已有, 新值)
    - 其它字段仅在库里为空时补齐
+   - CV/CL 按 SHA-256 存进 attachments（同一份简历只存一次），jobsnew 只存 cv_sha256 / cl_sha256
+   存储层见 storage.py：DB_BACKEND=postgres（默认）/ sqlite（SQLITE_PATH 单文件，WAL + 批量事务，单用户 / CI 不需要数据库服务）
+SYNC_MODE=incremental：启动时读一次 jobsnew 快照，按 appliedJobs 节点指纹（events / isActive / salary）
+   只对新增或变化的 job 跑 2)~4)，最后打印跳过/处理数量
+启动：python saver_pg.py [--mode test] [--sync-mode incremental] [--resume]；import 时不连库、不起 Chrome（get_db() / get_driver() 按需创建）
+   凭据缓存有效、GraphQL 模板在、CV/CL 已入库的 job 不开抽屉 —— 这些都满足时整次运行不启动浏览器
+断点续跑：每个 job 完成的阶段（详情 / ApplicantCount / 抽屉 / 入库）记进 RUN_JOURNAL_PATH（run_journal.py），
+   中途崩溃后 --resume 跳过已入库的 job，已抓到的详情、已下载的 CV/CL 直接取日志里的
+限速：所有打到 SEEK 的请求共用 AdaptivePacer（按 host 令牌桶，429 / 503 / 验证页乘性降速，成功加性回升），不再固定 sleep
+运行报告：各阶段耗时与结果计数，退出时（含崩溃）写 RUN_REPORT_PATH（JSON）和 RUN_METRICS_PROM（Prometheus 文本格式）
+SEEK_BASE_URL 可指向本地替身站（seek_stub_server.py），配合 bench_e2e.py 做端到端吞吐基准；CHROME_HEADLESS=1 无窗口运行
 """
-import os, re, time, uuid, json, random, requests, psycopg2
-from bs4 import BeautifulSoup
+import os, re, copy, time, uuid, json, queue, atexit, base64, argparse, hashlib, itertools, threading, requests, websocket
+from collections import deque
 from datetime import datetime
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
 from dateutil import parser as date_parser
-from psycopg2.extras import Json
 from dotenv import load_dotenv
 
+# 先加载 .env 再导入本地模块：storage / page_archive / run_journal 在 import 时读 DB_BACKEND、SQLITE_PATH、*_PATH
+load_dotenv(dotenv_path=r"D:\JD_saver\seek_job_saver\.env")
+
+from page_archive import PageArchive, PAGE_ARCHIVE_PATH
+from run_journal import RunJournal, RUN_JOURNAL_PATH
+from run_metrics import RunMetrics
+from seek_parser import is_verification_page, parse_detail
+from storage import attachment_hash, connect_store
+
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.chrome.service import Service
@@ -27,84 +60,60 @@ from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import (
-    TimeoutException, InvalidSessionIdException, WebDriverException
+    TimeoutException, InvalidSessionIdException, WebDriverException, NoSuchElementException
 )
 from webdriver_manager.chrome import ChromeDriverManager
 
 
 # =========================
-# ENV & DB
+# ENV
 # =========================
-load_dotenv(dotenv_path=r"D:\JD_saver\seek_job_saver\.env")
 CHROME_USER_DATA_DIR = os.getenv("CHROME_USER_DATA_DIR")
 CHROME_PROFILE_DIR   = os.getenv("CHROME_PROFILE_DIR", "Default")
-APPLIED_URL          = "https://www.seek.co.nz/my-activity/applied-jobs"
+SEEK_BASE_URL        = os.getenv("SEEK_BASE_URL", "https://www.seek.co.nz").rstrip("/")  # 本地替身站：seek_stub_server.py
+SEEK_COOKIE_DOMAIN   = urlsplit(SEEK_BASE_URL).hostname.removeprefix("www.")
+APPLIED_URL          = f"{SEEK_BASE_URL}/my-activity/applied-jobs"
+CHROME_HEADLESS      = os.getenv("CHROME_HEADLESS", "0") == "1"
 MODE                 = os.getenv("MODE", "prod").lower()  # test/prod
-
-PG_CONN = psycopg2.connect(
-    host=os.getenv("POSTGRES_HOST", "localhost"),
-    port=os.getenv("POSTGRES_PORT", "5432"),
-    dbname=os.getenv("POSTGRES_DB", "jobsdb"),
-    user=os.getenv("POSTGRES_USER", "postgres"),
-    password=os.getenv("POSTGRES_PASSWORD", "postgres"),
-)
-cur = PG_CONN.cursor()
-cur.execute("""
-CREATE TABLE IF NOT EXISTS jobsnew (
-    id UUID PRIMARY KEY,
-    job_url TEXT UNIQUE,
-    job_title TEXT,
-    company TEXT,
-    address TEXT,
-    field TEXT,
-    job_type TEXT,
-    posted_date TEXT,
-    salary TEXT,
-    competitor_count TEXT,
-    jd TEXT,
-    html_content TEXT,
-    source TEXT,
-    status_summary TEXT,
-    status_timeline JSONB,
-    cv_file BYTEA,
-    cl_file BYTEA,
-    created_at TEXT
-)
-""")
-PG_CONN.commit()
-
-
-# =========================
-# Chrome（原生 Selenium + Performance Log）
-# =========================
+SYNC_MODE            = os.getenv("SYNC_MODE", "full").lower()  # full/incremental
+GRAPHQL_CAPTURE      = os.getenv("GRAPHQL_CAPTURE", "cdp").lower()  # cdp=直连 DevTools 事件 / perflog=旧的 performance 日志轮询
+GRAPHQL_BUFFER       = int(os.getenv("GRAPHQL_BUFFER", "200"))    # 已解码 GraphQL 响应的缓冲上限
+COMPETITOR_MODE      = os.getenv("COMPETITOR_MODE", "graphql").lower()  # graphql=批量直连 jobDetails / drawer=逐个开抽屉
+COMPETITOR_CONCURRENCY = int(os.getenv("COMPETITOR_CONCURRENCY", "8"))
+DRAWER_TABS          = int(os.getenv("DRAWER_TABS", "1"))   # >1：同一浏览器会话里开多个 tab 并行处理抽屉
+DRAWER_TIMEOUT       = float(os.getenv("DRAWER_TIMEOUT", "45"))
+DOWNLOAD_BEGIN_TIMEOUT = float(os.getenv("DOWNLOAD_BEGIN_TIMEOUT", "4"))   # 点击后这么久还没开始下载就放弃
+DOWNLOAD_STALL_TIMEOUT = float(os.getenv("DOWNLOAD_STALL_TIMEOUT", "15"))  # 下载中这么久没有新字节就取消
+ARCHIVE_PAGES        = os.getenv("ARCHIVE_PAGES", "1") == "1"   # 详情页原文压缩归档到 PAGE_ARCHIVE_PATH
+DETAIL_CONCURRENCY   = int(os.getenv("DETAIL_CONCURRENCY", "4"))        # 详情页并发数
+DETAIL_PREFETCH      = int(os.getenv("DETAIL_PREFETCH", str(DETAIL_CONCURRENCY * 4)))   # HTTP 阶段最多领先主循环几个 job
+DETAIL_RATE_PER_HOST = float(os.getenv("DETAIL_RATE_PER_HOST", "3"))    # 每个 host 的起始速率（请求/秒），之后自适应
+PACE_MIN_RATE        = float(os.getenv("PACE_MIN_RATE", "0.2"))   # 被限流时最低降到的速率
+PACE_MAX_RATE        = float(os.getenv("PACE_MAX_RATE", "20"))
+PACE_INCREASE        = float(os.getenv("PACE_INCREASE", "0.1"))   # 每次成功加多少（请求/秒）
+PACE_DECREASE        = float(os.getenv("PACE_DECREASE", "0.5"))   # 429 / 验证页时乘上的系数
+PACE_SOFT_FAILURES   = int(os.getenv("PACE_SOFT_FAILURES", "3"))   # 5xx / 403 / 超时在窗口内连着这么多次才降速
+PACE_FAIL_WINDOW     = float(os.getenv("PACE_FAIL_WINDOW", "10"))  # 上面那个窗口（秒）
+CRED_CACHE_PATH      = os.getenv("SEEK_CRED_CACHE", os.path.join(os.getcwd(), ".seek_session.json"))
+CRED_SESSION_TTL     = int(os.getenv("SEEK_CRED_TTL", str(6 * 3600)))   # 会话 Cookie 无过期时间时的保守有效期（秒）
+DB_BATCH_SIZE        = int(os.getenv("DB_BATCH_SIZE", "50"))            # 每批入库条数
+DB_FLUSH_INTERVAL    = float(os.getenv("DB_FLUSH_INTERVAL", "5"))       # 距上次落库超过该秒数也会刷
+DB_QUEUE_SIZE        = int(os.getenv("DB_QUEUE_SIZE", "100"))           # 写库队列上限，满了前面的阶段等着
+RUN_REPORT_PATH      = os.getenv("RUN_REPORT_PATH", os.path.join(os.getcwd(), "seek_run_report.json"))   # 置空则不写
+RUN_METRICS_PROM     = os.getenv("RUN_METRICS_PROM", os.path.join(os.getcwd(), "seek_run_metrics.prom"))
+
+# 分阶段计时 + 结果计数；不管正常结束还是中途崩溃，退出时都落一份报告（main() 里注册）
+METRICS = RunMetrics("seek_saver")
+
+def _write_run_report():
+    try: METRICS.write(RUN_REPORT_PATH or None, RUN_METRICS_PROM or None)
+    except Exception as e: print("[WARN] run report not written:", e)
+
+# 浏览器和数据库都按需创建：import 时不连库、不起 Chrome，见 get_driver() / get_db()
 DOWNLOAD_DIR = os.path.join(os.getcwd(), "downloads")
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-
-chrome_opts = Options()
-chrome_opts.add_argument("--window-size=1920,1080")
-chrome_opts.add_argument("--disable-gpu")
-chrome_opts.add_argument("--no-sandbox")
-chrome_opts.add_argument("--disable-dev-shm-usage")
-chrome_opts.add_argument("--disable-notifications")
-chrome_opts.add_argument(f"--user-data-dir={CHROME_USER_DATA_DIR}")
-chrome_opts.add_argument(f"--profile-directory={CHROME_PROFILE_DIR}")
-# 降低自动化痕迹
-chrome_opts.add_experimental_option("excludeSwitches", ["enable-automation"])
-chrome_opts.add_experimental_option("useAutomationExtension", False)
-chrome_opts.add_experimental_option("prefs", {
-   "download.default_directory": DOWNLOAD_DIR,
-   "download.prompt_for_download": False,
-   "download.directory_upgrade": True,
-   "safebrowsing.enabled": True,
-   "profile.default_content_setting_values.automatic_downloads": 1,
-})
-# 开启 Performance 日志
-chrome_opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
-
-driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()),
-                          options=chrome_opts)
-wait = WebDriverWait(driver, 45)
-driver.execute_cdp_cmd("Network.enable", {})
+driver = wait = None
+GRAPHQL = DOWNLOADS = None
+DB_STORE = None
 
 
 # =========================
@@ -116,13 +125,11 @@ def close_drawer_if_open():
     try:
         btn = driver.find_element(By.XPATH, "//button[@aria-label='Close' or @aria-label='Close dialog']")
         driver.execute_script("arguments[0].click();", btn)
-        time.sleep(0.2)
     except (InvalidSessionIdException, WebDriverException):
         return
     except Exception:
         try:
             driver.switch_to.active_element.send_keys(Keys.ESCAPE)
-            time.sleep(0.2)
         except Exception:
             pass
 
@@ -147,47 +154,116 @@ def uniq_sorted_timeline(events):
 
 def build_job_url_from_jobid(job_id: str, is_active: bool=True) -> str:
     if not job_id: return None
-    return (f"https://www.seek.co.nz/job/{job_id}?ref=applied"
-            if is_active else f"https://www.seek.co.nz/expiredjob/{job_id}?ref=applied")
+    return (f"{SEEK_BASE_URL}/job/{job_id}?ref=applied"
+            if is_active else f"{SEEK_BASE_URL}/expiredjob/{job_id}?ref=applied")
+
+# 详情页的两种 URL 变体；成功过的那个记在 jobsnew.detail_variant，下次直接用
+DETAIL_VARIANTS = ("job", "expiredjob")
+
+def detail_variant_order(is_active, preferred=None):
+    """变体尝试顺序：记住的变体优先；已下线的 job 不再试 /job/。"""
+    order = list(DETAIL_VARIANTS) if is_active else ["expiredjob"]
+    if preferred in order:
+        order.remove(preferred)
+        order.insert(0, preferred)
+    return order
+
+def detail_url_for(job_id, base):
+    """库里记住的变体优先，否则按 isActive 猜。"""
+    variant = base.get("detail_variant") or ("job" if base.get("is_active", True) else "expiredjob")
+    return build_job_url_from_jobid(job_id, is_active=variant == "job")
 
 def build_drawer_url(job_id: str, page_idx: int) -> str:
-    return f"https://www.seek.co.nz/my-activity/applied-jobs/{job_id}?page={page_idx}"
+    return f"{APPLIED_URL}/{job_id}?page={page_idx}"
 
 def wait_new_file(before_files, timeout=20):
+    """（无 DevTools 下载事件时的回退）轮询下载目录，忽略未下完的 .crdownload。"""
     end = time.time()+timeout
     while time.time() < end:
-        after=set(os.listdir(DOWNLOAD_DIR)); new=after-before_files
+        after=set(os.listdir(DOWNLOAD_DIR)); new=[f for f in after-before_files if not f.endswith(".crdownload")]
         if new:
-            fp=os.path.join(DOWNLOAD_DIR, list(new)[0])
+            fp=os.path.join(DOWNLOAD_DIR, new[0])
             if os.path.exists(fp) and os.path.getsize(fp)>0: return fp
         time.sleep(0.4)
     return None
 
+CV_BUTTON_XPATH = ".//div[1]/div[2]/div[3]/span[2]/span"
+CL_BUTTON_XPATH = ".//div[1]/div[2]/div[3]/span[3]/span"
+
 def download_cv_cl_via_buttons():
-    """严格通过抽屉按钮下载 CV/CL（要求当前页就是抽屉已展开的 my-activity/{job_id}?page=X）。"""
+    """严格通过抽屉按钮下载 CV/CL（要求当前页就是抽屉已展开的 my-activity/{job_id}?page=X）。
+    有 DownloadTracker 时：逐个点击并认领各自的下载 GUID，两个下载并行进行，完成即读。
+    返回 (cv_bytes, cl_bytes, ok)：抽屉不在、点了按钮却没下到文件时 ok=False；没有按钮（没传 CL）不算失败。"""
     cv_bytes,cl_bytes=None,None
     try:
         drawer = driver.find_element(By.XPATH, "//div[starts-with(@id,'drawer-view-')]")
     except Exception:
-        return cv_bytes, cl_bytes
+        return cv_bytes, cl_bytes, False
 
+    if DOWNLOADS is not None:
+        guids = {}
+        ok = True
+        for label, xp in (("CV", CV_BUTTON_XPATH), ("CL", CL_BUTTON_XPATH)):
+            try:
+                btn = drawer.find_element(By.XPATH, xp)
+            except NoSuchElementException:
+                continue
+            try:
+                PACER.acquire(SEEK_BASE_URL)
+                since = DOWNLOADS.mark()
+                driver.execute_script("arguments[0].click();", btn)
+                with METRICS.stage("download_begin"):
+                    guids[label] = DOWNLOADS.wait_begin(since)
+                if guids[label] is None:
+                    METRICS.incr("download_timeout")
+                    PACER.feedback(SEEK_BASE_URL, error=True)
+                    print(f"  [Warn] {label} download never started")
+                    ok = False
+            except Exception as e:
+                print(f"  [Warn] {label} button failed:", e)
+                ok = False
+        out = {}
+        for label, guid in guids.items():
+            if guid is None: continue
+            with METRICS.stage("download_wait"):
+                out[label] = DOWNLOADS.wait_done(guid)
+            PACER.feedback(SEEK_BASE_URL, error=out[label] is None)
+            if out[label] is not None:
+                METRICS.incr("download_ok")
+                print(f"  [Downloaded {label}] {len(out[label])} bytes")
+            else:
+                METRICS.incr("download_timeout")
+                print(f"  [Warn] {label} download failed")
+                ok = False
+        return out.get("CV"), out.get("CL"), ok
+
+    failed = []
     def click_and_read(xp,label):
         try:
             btn=drawer.find_element(By.XPATH,xp)
+        except NoSuchElementException:
+            return None
+        try:
+            PACER.acquire(SEEK_BASE_URL)
             before=set(os.listdir(DOWNLOAD_DIR))
             driver.execute_script("arguments[0].click();", btn)
-            fp=wait_new_file(before)
+            with METRICS.stage("download_wait"):
+                fp=wait_new_file(before)
+            PACER.feedback(SEEK_BASE_URL, error=not fp)
             if fp:
                 with open(fp,"rb") as f: b=f.read()
                 os.remove(fp); print(f"  [Downloaded {label}] {len(b)} bytes")
+                METRICS.incr("download_ok")
                 return b
+            METRICS.incr("download_timeout")
         except Exception as e:
             print(f"  [Warn] {label} button failed:", e)
+        failed.append(label)
         return None
 
-    cv_bytes = click_and_read(".//div[1]/div[2]/div[3]/span[2]/span","CV")
-    cl_bytes = click_and_read(".//div[1]/div[2]/div[3]/span[3]/span","CL")
-    return cv_bytes, cl_bytes
+    cv_bytes = click_and_read(CV_BUTTON_XPATH,"CV")
+    cl_bytes = click_and_read(CL_BUTTON_XPATH,"CL")
+    return cv_bytes, cl_bytes, not failed
 
 def is_session_alive() -> bool:
     try:
@@ -199,10 +275,289 @@ def is_session_alive() -> bool:
 
 
 # =========================
-# Performance Log / GraphQL 抓取
+# GraphQL 抓取：DevTools 事件订阅（默认）/ Performance Log 轮询（GRAPHQL_CAPTURE=perflog）
 # =========================
+class CdpSocket:
+    """直连 DevTools WebSocket：后台线程收消息，事件交给 on_event，命令按 id 回调。
+    prefilter(raw) 先在原始字符串上筛一遍，不要的事件连 json.loads 都不做。
+    on_event / 回调都在收消息线程里执行，里面只能用 send()，不能用 call()。"""
+    def __init__(self, ws_url, on_event=None, prefilter=None):
+        self.ws = websocket.create_connection(ws_url, suppress_origin=True, enable_multithread=True)
+        self.on_event = on_event
+        self.prefilter = prefilter
+        self._ids = itertools.count(1)
+        self._callbacks = {}
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def send(self, method, params=None, callback=None):
+        cid = next(self._ids)
+        if callback: self._callbacks[cid] = callback
+        self.ws.send(json.dumps({"id": cid, "method": method, "params": params or {}}))
+        return cid
+
+    def call(self, method, params=None, timeout=10):
+        done, box = threading.Event(), {}
+        def _cb(msg):
+            box["msg"] = msg; done.set()
+        self.send(method, params, _cb)
+        if not done.wait(timeout):
+            raise TimeoutError(f"CDP {method} timed out")
+        if "error" in box["msg"]:
+            raise RuntimeError(f"CDP {method}: {box['msg']['error']}")
+        return box["msg"].get("result") or {}
+
+    def _loop(self):
+        while True:
+            try:
+                raw = self.ws.recv()
+            except Exception:
+                break
+            if not raw: continue
+            if raw.startswith('{"id"'):
+                try: msg = json.loads(raw)
+                except ValueError: continue
+                cb = self._callbacks.pop(msg.get("id"), None)
+                if cb:
+                    try: cb(msg)
+                    except Exception: pass
+                continue
+            if self.on_event is None or (self.prefilter and not self.prefilter(raw)):
+                continue
+            try:
+                msg = json.loads(raw)
+                self.on_event(msg.get("method"), msg.get("params") or {})
+            except Exception:
+                continue
+
+    def close(self):
+        try: self.ws.close()
+        except Exception: pass
+
+def devtools_ws_url(drv, target_id=None):
+    """chromedriver 的 window handle 就是 DevTools target id；target_id=None 取 browser 级端点。"""
+    addr = drv.capabilities["goog:chromeOptions"]["debuggerAddress"]
+    if target_id is None:
+        return requests.get(f"http://{addr}/json/version", timeout=5).json()["webSocketDebuggerUrl"]
+    return f"ws://{addr}/devtools/page/{target_id}"
+
+_OPNAME_RE = re.compile(r'"?operationName"?\s*[:=]\s*"?([A-Za-z0-9_]+)')
+
+class GraphQLCapture:
+    """订阅一个 tab 的 Network 事件，只对 GraphQL 请求取响应体，解码后放进有界缓冲。
+    调用方用 mark() 记下起点，再 wait_for() 等某个 operation / 满足谓词的响应，到了立即返回。"""
+    def __init__(self, ws_url, operations=None, maxlen=GRAPHQL_BUFFER):
+        self.operations = set(operations or ())  # 空 = 所有 GraphQL operation
+        self.buffer = deque(maxlen=maxlen)
+        self.requests = {}    # operationName -> 最近一次请求（url / headers / postData）
+        self._inflight = {}   # requestId -> 请求信息
+        self._seq = 0
+        self._cond = threading.Condition()
+        self.sock = CdpSocket(ws_url, self._on_event, prefilter=self._prefilter)
+        self.sock.call("Network.enable", {"maxPostDataSize": 65536})
+
+    @classmethod
+    def attach(cls, drv, target_id=None, **kw):
+        return cls(devtools_ws_url(drv, target_id or drv.current_window_handle), **kw)
+
+    def _prefilter(self, raw):
+        if '"Network.requestWillBeSent"' in raw:
+            return "graphql" in raw
+        return bool(self._inflight) and ('"Network.loadingFinished"' in raw or '"Network.loadingFailed"' in raw)
+
+    def _on_event(self, method, params):
+        rid = params.get("requestId")
+        if method == "Network.requestWillBeSent":
+            req = params.get("request") or {}
+            url = req.get("url") or ""
+            if "graphql" not in url.lower() or params.get("type") not in ("XHR", "Fetch"):
+                return
+            ops = _OPNAME_RE.findall(req.get("postData") or url)
+            if self.operations and not self.operations.intersection(ops):
+                return
+            info = {"url": url, "method": req.get("method"), "headers": req.get("headers") or {},
+                    "postData": req.get("postData"), "operations": ops}
+            self._inflight[rid] = info
+            for op in ops:
+                self.requests[op] = info
+        elif method == "Network.loadingFailed":
+            self._inflight.pop(rid, None)
+        elif method == "Network.loadingFinished" and rid in self._inflight:
+            info = self._inflight.pop(rid)
+            self.sock.send("Network.getResponseBody", {"requestId": rid},
+                           lambda msg, info=info: self._on_body(info, msg))
+
+    def _on_body(self, info, msg):
+        res = msg.get("result") or {}
+        text = res.get("body") or ""
+        if res.get("base64Encoded"):
+            text = base64.b64decode(text).decode("utf-8", "replace")
+        if not text or text[0] not in "{[":
+            return
+        try: data = json.loads(text)
+        except ValueError: return
+        items = data if isinstance(data, list) else [data]   # 批量 GraphQL 拆成单条
+        with self._cond:
+            for i, item in enumerate(items):
+                if not isinstance(item, dict): continue
+                self._seq += 1
+                op = info["operations"][i] if i < len(info["operations"]) else None
+                self.buffer.append({"seq": self._seq, "operation": op, "data": item, "request": info})
+            self._cond.notify_all()
+
+    def mark(self):
+        with self._cond:
+            return self._seq
+
+    def wait_idle(self, timeout=1.0):
+        """等在途的 GraphQL 请求都拿到响应体（或超时）。"""
+        deadline = time.monotonic() + timeout
+        while self._inflight and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def responses(self, since=0, operation=None):
+        with self._cond:
+            return [it["data"] for it in self.buffer
+                    if it["seq"] > since and (operation is None or it["operation"] == operation)]
+
+    def wait_for(self, predicate, operation=None, since=0, timeout=10, with_request=False):
+        """等到 since 之后第一个 predicate(data) 非 None 的响应并返回该值；超时返回 None。
+        with_request=True 时返回 (值, 对应的请求信息)，用于记录回放模板。"""
+        deadline = time.monotonic() + timeout
+        checked = since
+        with self._cond:
+            while True:
+                for it in list(self.buffer):
+                    if it["seq"] <= checked: continue
+                    checked = it["seq"]
+                    if operation is not None and it["operation"] != operation: continue
+                    hit = predicate(it["data"])
+                    if hit is not None: return (hit, it["request"]) if with_request else hit
+                remaining = deadline - time.monotonic()
+                if remaining <= 0: return None
+                self._cond.wait(remaining)
+
+    def close(self):
+        self.sock.close()
+
+class DownloadTracker:
+    """browser 级 DevTools 会话管理下载：文件按 GUID 存进 DOWNLOAD_DIR，
+    靠 Browser.downloadWillBegin / downloadProgress 事件精确认领每次点击对应的下载，完成即读。
+    超时放弃的下载（开始得太晚没人认领、下载中卡住）发 Browser.cancelDownload，之后才落盘的 GUID 文件也删掉。"""
+    def __init__(self, ws_url, download_dir=DOWNLOAD_DIR):
+        self.dir = download_dir
+        self._cond = threading.Condition()
+        self._begun = []      # downloadWillBegin 事件，按到达顺序（带到达时间 _t）
+        self._claimed = set()
+        self._abandoned = set()   # 已放弃的 guid：收到 completed / canceled 时删文件
+        self._progress = {}   # guid -> 最近一次 downloadProgress
+        self.sock = CdpSocket(ws_url, self._on_event, prefilter=lambda raw: '"Browser.download' in raw)
+        self.sock.call("Browser.setDownloadBehavior", {
+            "behavior": "allowAndName", "downloadPath": download_dir, "eventsEnabled": True})
+
+    @classmethod
+    def attach(cls, drv, **kw):
+        return cls(devtools_ws_url(drv), **kw)
+
+    def _on_event(self, method, params):
+        with self._cond:
+            if method == "Browser.downloadWillBegin":
+                self._begun.append({**params, "_t": time.monotonic()})
+            elif method == "Browser.downloadProgress":
+                guid = params.get("guid")
+                if guid in self._abandoned:
+                    if params.get("state") in ("completed", "canceled"):
+                        self._abandoned.discard(guid)
+                        self._remove(guid)
+                    return
+                self._progress[guid] = params
+            self._cond.notify_all()
+
+    def _remove(self, guid):
+        try: os.remove(os.path.join(self.dir, guid))
+        except OSError: pass
+
+    def _abandon(self, guid):
+        """放弃一个下载：取消；已经完成的直接删文件，否则等 completed / canceled 事件再删。调用方持有 _cond。"""
+        self._abandoned.add(guid)
+        if (self._progress.pop(guid, None) or {}).get("state") in ("completed", "canceled"):
+            self._abandoned.discard(guid)
+            self._remove(guid)
+            return
+        try: self.sock.send("Browser.cancelDownload", {"guid": guid})
+        except Exception: pass
+
+    def _reap(self, max_age=DOWNLOAD_BEGIN_TIMEOUT):
+        """开始了 max_age 秒还没人认领的下载（点击方已超时走了）：认领并放弃。调用方持有 _cond。"""
+        now = time.monotonic()
+        for ev in self._begun:
+            guid = ev.get("guid")
+            if guid in self._claimed or now - ev["_t"] < max_age: continue
+            self._claimed.add(guid)
+            self._abandon(guid)
+
+    def mark(self):
+        with self._cond:
+            return len(self._begun)
+
+    def wait_begin(self, since, frame_id=None, timeout=DOWNLOAD_BEGIN_TIMEOUT):
+        """认领 since 之后第一个未被认领（且属于 frame_id）的下载，返回 GUID；超时返回 None。"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for ev in self._begun[since:]:
+                    guid = ev.get("guid")
+                    if guid in self._claimed: continue
+                    if frame_id is not None and ev.get("frameId") != frame_id: continue
+                    self._claimed.add(guid)
+                    return guid
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._reap()
+                    return None
+                self._cond.wait(remaining)
+
+    def wait_done(self, guid, stall_timeout=DOWNLOAD_STALL_TIMEOUT):
+        """等下载完成并返回文件内容（读完即删）；被取消或 stall_timeout 内没有进度则返回 None。"""
+        last_bytes, last_change = -1, time.monotonic()
+        with self._cond:
+            while True:
+                ev = self._progress.get(guid) or {}
+                state = ev.get("state")
+                if state in ("completed", "canceled"):
+                    self._progress.pop(guid, None)
+                    break
+                if ev.get("receivedBytes", 0) != last_bytes:
+                    last_bytes, last_change = ev.get("receivedBytes", 0), time.monotonic()
+                remaining = last_change + stall_timeout - time.monotonic()
+                if remaining <= 0:
+                    state = "stalled"
+                    break
+                self._cond.wait(remaining)
+            if state == "stalled":
+                self._abandon(guid)   # 取消；取消前刚好下完的，completed 事件到了再删
+                return None
+        fp = os.path.join(self.dir, guid)
+        try:
+            if state == "completed":
+                with open(fp, "rb") as f:
+                    return f.read()
+            return None
+        except OSError:
+            return None
+        finally:
+            self._remove(guid)
+
+    def close(self):
+        """放弃所有还没人认领的下载，删掉已放弃、已落盘的 GUID 文件，再断开。"""
+        with self._cond:
+            self._reap(max_age=0)
+            for guid in list(self._abandoned):
+                self._remove(guid)
+        self.sock.close()
+
 def _iter_graphql_responses():
-    """从 performance 日志里筛选所有 graphql 响应体，返回解析后的 JSON 列表。"""
+    """（perflog 模式）从 performance 日志里筛选所有 graphql 响应体，返回解析后的 JSON 列表。"""
     out = []
     logs = driver.get_log("performance")  # 读取即清空
     for entry in logs:
@@ -232,44 +587,111 @@ def _iter_graphql_responses():
             continue
     return out
 
+def graphql_mark():
+    """记录起点；perflog 模式下就是清空日志。浏览器流程都从这里开始，浏览器没起就先起。"""
+    get_driver()
+    if GRAPHQL is not None:
+        return GRAPHQL.mark()
+    _ = driver.get_log("performance")
+    return 0
+
+def graphql_responses(since=0):
+    return GRAPHQL.responses(since) if GRAPHQL is not None else _iter_graphql_responses()
+
+
 
 # =========================
-# HTTPS 详情抓取（先拿 cf_clearance，再请求）
+# Chrome（原生 Selenium；GraphQL 走 DevTools 事件订阅，perflog 模式才开 Performance 日志）
+# 第一次真要用浏览器时才启动：凭据缓存有效、GraphQL 模板在、不需要开抽屉的运行全程不起 Chrome
 # =========================
-VERIFICATION_HINTS = ("verify you are human", "hcaptcha", "robot check", "unusual traffic", "cloudflare")
+def build_chrome_options():
+    chrome_opts = Options()
+    chrome_opts.add_argument("--window-size=1920,1080")
+    chrome_opts.add_argument("--disable-gpu")
+    chrome_opts.add_argument("--no-sandbox")
+    chrome_opts.add_argument("--disable-dev-shm-usage")
+    chrome_opts.add_argument("--disable-notifications")
+    chrome_opts.add_argument(f"--user-data-dir={CHROME_USER_DATA_DIR}")
+    chrome_opts.add_argument(f"--profile-directory={CHROME_PROFILE_DIR}")
+    # 降低自动化痕迹
+    chrome_opts.add_experimental_option("excludeSwitches", ["enable-automation"])
+    chrome_opts.add_experimental_option("useAutomationExtension", False)
+    chrome_opts.add_experimental_option("prefs", {
+       "download.default_directory": DOWNLOAD_DIR,
+       "download.prompt_for_download": False,
+       "download.directory_upgrade": True,
+       "safebrowsing.enabled": True,
+       "profile.default_content_setting_values.automatic_downloads": 1,
+    })
+    if CHROME_HEADLESS:
+        chrome_opts.add_argument("--headless=new")
+    if DRAWER_TABS > 1:
+        # 后台 tab 不降频：否则抽屉里的 JS / 定时器被节流，并行就没意义了
+        for flag in ("--disable-background-timer-throttling", "--disable-renderer-backgrounding",
+                     "--disable-backgrounding-occluded-windows"):
+            chrome_opts.add_argument(flag)
+    if GRAPHQL_CAPTURE == "perflog":
+        chrome_opts.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    return chrome_opts
+
+def get_driver():
+    """返回浏览器；第一次调用才启动 Chrome 并挂上 DevTools（GraphQL 捕获 + 下载跟踪）。只在主线程调用。"""
+    global driver, wait, GRAPHQL, DOWNLOADS
+    if driver is not None:
+        return driver
+    print("[INFO] starting Chrome...")
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    with METRICS.stage("browser_start"):
+        driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()),
+                                  options=build_chrome_options())
+    METRICS.incr("browser_launch")
+    wait = WebDriverWait(driver, DRAWER_TIMEOUT)
+    driver.execute_cdp_cmd("Network.enable", {})
+
+    if GRAPHQL_CAPTURE != "perflog":
+        try:
+            GRAPHQL = GraphQLCapture.attach(driver)
+        except Exception as e:
+            raise SystemExit(f"[FATAL] cannot attach to DevTools ({e}); rerun with GRAPHQL_CAPTURE=perflog")
+    try:
+        DOWNLOADS = DownloadTracker.attach(driver)
+    except Exception as e:
+        print(f"[WARN] DevTools download events unavailable ({e}); polling {DOWNLOAD_DIR} instead")
+        DOWNLOADS = None
+    return driver
+
+def close_driver():
+    global driver, wait, GRAPHQL, DOWNLOADS
+    if driver is None: return
+    if DOWNLOADS is not None:
+        try: DOWNLOADS.close()
+        except Exception: pass
+    try: driver.quit()
+    except Exception: pass
+    driver = wait = GRAPHQL = DOWNLOADS = None
 
+
+# =========================
+# HTTPS 详情抓取（先拿 cf_clearance，再请求）
+# =========================
 def ensure_cf_clearance(max_wait=30):
-    driver.get(APPLIED_URL)
+    # 这里本来就是让浏览器过验证的地方，验证页不算被限流
+    PACER.acquire(APPLIED_URL)
+    get_driver().get(APPLIED_URL)
     deadline = time.time() + max_wait
     while time.time() < deadline:
         try:
             cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
-            have = any((c.get("name") == "cf_clearance" and "seek.co.nz" in (c.get("domain") or "")) for c in cookies)
+            have = any((c.get("name") == "cf_clearance" and SEEK_COOKIE_DOMAIN in (c.get("domain") or "")) for c in cookies)
             if have: return True
         except Exception:
             pass
-        time.sleep(1.0)
+        time.sleep(0.25)   # 本地轮询 Cookie，不打网络
     return False
 
-def cookies_header_from_cdp(domain_filter="seek.co.nz"):
-    try:
-        cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
-    except Exception:
-        cookies = []
-    pairs = []
-    for c in cookies:
-        d = c.get("domain") or ""
-        if domain_filter in d:
-            pairs.append(f"{c['name']}={c['value']}")
-    return "; ".join(pairs)
-
-def _requests_headers_from_driver():
-    try:
-        ua = driver.execute_script("return navigator.userAgent;")
-    except Exception:
-        ua = "Mozilla/5.0"
+def _request_headers(user_agent):
     return {
-        "User-Agent": ua,
+        "User-Agent": user_agent or "Mozilla/5.0",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
         "Accept-Language": "en-US,en;q=0.9,zh-CN;q=0.8",
         "Connection": "keep-alive",
@@ -278,49 +700,343 @@ def _requests_headers_from_driver():
         "Referer": APPLIED_URL,
     }
 
-def fetch_detail_via_https(job_id: str, is_active: bool = True, max_retry: int = 2):
-    if not job_id: return (None, None, None, None)
+class SessionCredentials:
+    """cf_clearance + SEEK 站点 Cookie 缓存。
+    只在过期或响应命中 VERIFICATION_HINTS 时才回浏览器刷新；落盘到 CRED_CACHE_PATH，下次运行可跳过预热。"""
+    EXPIRY_MARGIN = 120  # 提前这么多秒视为过期
+
+    def __init__(self, path=CRED_CACHE_PATH, domain=SEEK_COOKIE_DOMAIN):
+        self.path = path
+        self.domain = domain
+        self.cookies = []
+        self.user_agent = None
+        self.captured_at = 0.0
+        self.templates = {}   # GraphQL 回放模板：名字 -> {url, headers, body}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.cookies = data.get("cookies") or []
+        self.user_agent = data.get("user_agent")
+        self.captured_at = float(data.get("captured_at") or 0)
+        self.templates = data.get("templates") or {}
+        return True
 
-    def _url(active: bool):
-        return f"https://www.seek.co.nz/job/{job_id}?ref=applied" if active \
-               else f"https://www.seek.co.nz/expiredjob/{job_id}?ref=applied"
+    def save(self):
+        # Cookie 属于登录凭据，文件只给当前用户读写
+        tmp = self.path + ".tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"cookies": self.cookies, "user_agent": self.user_agent,
+                       "captured_at": self.captured_at, "templates": self.templates}, f)
+        os.replace(tmp, self.path)
+
+    def _clearance(self):
+        for c in self.cookies:
+            if c.get("name") == "cf_clearance":
+                return c
+        return None
 
-    try: ensure_cf_clearance()
+    def expires_at(self):
+        """cf_clearance 自身过期时间与会话 TTL 取较早者。"""
+        cf = self._clearance()
+        if not cf: return 0.0
+        end = self.captured_at + CRED_SESSION_TTL
+        exp = cf.get("expires")
+        if exp and exp > 0:
+            end = min(end, float(exp))
+        return end
+
+    def is_valid(self):
+        return time.time() < self.expires_at() - self.EXPIRY_MARGIN
+
+    def capture_from_driver(self):
+        """浏览器里过一次 Cloudflare，再一次性读取全部站点 Cookie 与 UA。"""
+        METRICS.incr("credential_capture")
+        with METRICS.stage("credential_capture"):
+            ensure_cf_clearance()
+        try:
+            cookies = driver.execute_cdp_cmd("Network.getAllCookies", {})["cookies"]
+        except Exception:
+            cookies = []
+        self.cookies = [
+            {"name": c["name"], "value": c["value"], "domain": c.get("domain"), "expires": c.get("expires")}
+            for c in cookies if self.domain in (c.get("domain") or "")
+        ]
+        try: self.user_agent = driver.execute_script("return navigator.userAgent;")
+        except Exception: pass
+        self.captured_at = time.time()
+        self.save()
+        return self.is_valid()
+
+    def ensure(self):
+        with self._lock:
+            if self.is_valid(): return True
+            return self.capture_from_driver()
+
+    def invalidate(self):
+        """命中验证页后调用：下次 ensure() 必然回浏览器刷新。"""
+        with self._lock:
+            self.captured_at = 0.0
+
+    def refresh(self):
+        self.invalidate()
+        return self.ensure()
+
+    def headers(self):
+        headers = _request_headers(self.user_agent)
+        cookie_header = "; ".join(f"{c['name']}={c['value']}" for c in self.cookies)
+        if cookie_header: headers["Cookie"] = cookie_header
+        return headers
+
+SESSION_CREDS = SessionCredentials()
+
+class AdaptivePacer:
+    """所有打到 SEEK 的请求（HTTPS、GraphQL 回放、浏览器导航、下载点击）共用的按 host 限速器（线程安全）。
+    每个 host 一个令牌桶，速率按 AIMD 调整：成功一次加 increase；429 / 验证页（明确的限流）立即乘 decrease；
+    503 / 其它 5xx / 403 / 超时可能只是偶发故障：window 秒内连着 soft_failures 次（中间没有成功）才降，
+    且减得轻一些（乘 sqrt(decrease)）；404 等正常的非 200 不算。同一波并发失败只降一次速（两次降速至少隔一个
+    当前间隔 + 1 秒）；429 / 503 带 Retry-After 就整个 host 暂停到那时（不管降不降速）。"""
+    PUSHBACK_STATUS = (429, 503)   # 看 Retry-After、回放时重试
+
+    def __init__(self, rate=DETAIL_RATE_PER_HOST, min_rate=PACE_MIN_RATE, max_rate=PACE_MAX_RATE,
+                 increase=PACE_INCREASE, decrease=PACE_DECREASE, burst=2.0,
+                 soft_failures=PACE_SOFT_FAILURES, window=PACE_FAIL_WINDOW):
+        self.initial = max(min_rate, min(rate, max_rate)) if rate > 0 else max_rate
+        self.min_rate, self.max_rate = min_rate, max_rate
+        self.increase, self.decrease = increase, decrease
+        self.burst = burst
+        self.soft_failures, self.window = max(1, soft_failures), window
+        self._lock = threading.Lock()
+        self._hosts = {}   # host -> {rate, tokens, stamp, paused_until, last_cut, fails}
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        st = self._hosts.get(host)
+        if st is None:
+            st = self._hosts[host] = {"rate": self.initial, "tokens": 1.0, "stamp": time.monotonic(),
+                                      "paused_until": 0.0, "last_cut": 0.0, "fails": deque()}
+        return st
+
+    def acquire(self, url):
+        """取一个令牌；没有就睡到下一个令牌生成（或 Retry-After 到期）。返回等了多少秒。"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                st = self._host(url)
+                now = time.monotonic()
+                st["tokens"] = min(self.burst, st["tokens"] + (now - st["stamp"]) * st["rate"])
+                st["stamp"] = now
+                delay = st["paused_until"] - now
+                if delay <= 0:
+                    if st["tokens"] >= 1.0:
+                        st["tokens"] -= 1.0
+                        break
+                    delay = (1.0 - st["tokens"]) / st["rate"]
+            time.sleep(delay)
+            waited += delay
+        if waited: METRICS.observe("pace_wait", waited)
+        return waited
+
+    def feedback(self, url, status=None, blocked=False, error=False, retry_after=None):
+        """请求结束后报告结果：status 为 HTTP 状态码；blocked=命中验证页；error=超时 / 连接失败 / 页面没加载出来。"""
+        soft = False
+        if blocked or status == 429:
+            factor = self.decrease
+        elif error or status == 403 or (status is not None and status >= 500):
+            factor, soft = self.decrease ** 0.5, True
+        elif status is not None and status >= 400:
+            return   # 404 之类：过期职位走 /job/ 的正常结果，与限流无关
+        else:
+            factor = None
+        with self._lock:
+            st = self._host(url)
+            now = time.monotonic()
+            if factor is None:
+                st["rate"] = min(self.max_rate, st["rate"] + self.increase)
+                st["fails"].clear()
+                return
+            if retry_after:
+                st["paused_until"] = max(st["paused_until"], now + retry_after)
+            if soft:
+                fails = st["fails"]
+                fails.append(now)
+                while now - fails[0] > self.window: fails.popleft()
+                if len(fails) < self.soft_failures: return
+                fails.clear()
+            if now - st["last_cut"] < 1.0 / st["rate"] + 1.0:
+                return
+            st["last_cut"] = now
+            old, st["rate"] = st["rate"], max(self.min_rate, st["rate"] * factor)
+            st["tokens"] = min(st["tokens"], 0.0)
+        METRICS.incr("pace_backoff")
+        print(f"  [PACE] {urlsplit(url).netloc}: {old:.2f} -> {st['rate']:.2f} req/s"
+              + (f" (status {status})" if status else " (verification)" if blocked else ""))
+
+    def feedback_response(self, url, resp, blocked=False):
+        retry_after = None
+        if resp.status_code in self.PUSHBACK_STATUS:
+            try: retry_after = min(float(resp.headers.get("Retry-After") or 0), 300.0) or None
+            except ValueError: retry_after = None
+        self.feedback(url, resp.status_code, blocked=blocked, retry_after=retry_after)
+
+    def rates(self):
+        with self._lock:
+            return {h: round(st["rate"], 3) for h, st in self._hosts.items()}
+
+def build_http_session(pool_size):
+    """共享 keep-alive 连接池，所有详情请求复用 TLS 连接。"""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("https://", adapter)
+    s.mount("http://", adapter)
+    return s
+
+HTTP_SESSION   = build_http_session(max(DETAIL_CONCURRENCY, 4))
+PACER          = AdaptivePacer()
+
+_PAGE_HEAD_JS = "return (document.title || '') + ' ' + (document.body ? document.body.innerText.slice(0, 2000) : '');"
+
+def browser_get(url):
+    """浏览器导航同样走 PACER；落地页是验证页就按被限流反馈，返回 False。"""
+    PACER.acquire(url)
+    get_driver().get(url)
+    try: blocked = is_verification_page(driver.execute_script(_PAGE_HEAD_JS))
+    except Exception: blocked = False
+    PACER.feedback(url, blocked=blocked)
+    if blocked: METRICS.incr("verification_hit")
+    return not blocked
+PAGE_ARCHIVE   = None   # main() 里按 ARCHIVE_PAGES 打开
+
+def detail_request_headers():
+    """取缓存的凭据生成详情请求头；过期才回浏览器刷新（只在主线程调用，driver 非线程安全）。"""
+    try: SESSION_CREDS.ensure()
     except Exception: pass
+    return SESSION_CREDS.headers()
+
+def _fetch_detail(job_id, is_active, max_retry, headers, preferred=None):
+    """返回 (结果四元组, 是否命中验证页, 成功的 URL 变体)。
+    限流 / 5xx / 网络错误重试同一个 URL；404、跳转到空页这类定论才换下一个变体。"""
+    variants = detail_variant_order(is_active, preferred)
+    tries = dict.fromkeys(variants, 0)
+    while variants:
+        variant = variants[0]
+        if tries[variant] >= max_retry:
+            variants.pop(0)
+            continue
+        tries[variant] += 1
+        url = build_job_url_from_jobid(job_id, is_active=variant == "job")
+        PACER.acquire(url)
+        try:
+            with METRICS.stage("detail_request"):
+                resp = HTTP_SESSION.get(url, headers=headers, timeout=20, allow_redirects=True)
+                html = resp.text or ""
+        except Exception:
+            METRICS.incr("detail_http_error")
+            PACER.feedback(url, error=True)
+            continue
+        blocked = resp.status_code == 200 and is_verification_page(html)
+        PACER.feedback_response(url, resp, blocked=blocked)
+        if resp.status_code != 200:
+            METRICS.incr("detail_http_error")
+            if resp.status_code not in AdaptivePacer.PUSHBACK_STATUS and resp.status_code < 500:
+                variants.pop(0)
+            continue
 
-    headers = _requests_headers_from_driver()
-    cookie_header = cookies_header_from_cdp()
-    if cookie_header: headers["Cookie"] = cookie_header
-
-    for _ in range(max_retry):
-        time.sleep(random.uniform(0.25, 0.8))
-        for active_flag in ([is_active, False] if is_active else [False]):
-            url = _url(active_flag)
-            try:
-                resp = requests.get(url, headers=headers, timeout=20, allow_redirects=True)
-            except Exception:
-                continue
-            if resp.status_code != 200:
-                continue
-
-            html = resp.text or ""
-            lower = html.lower()
-            if any(k in lower for k in VERIFICATION_HINTS):
-                return (None, None, None, None)
+        if blocked:
+            METRICS.incr("verification_hit")
+            return (None, None, None, None), True, None
 
-            soup = BeautifulSoup(html, "lxml")
-            jd_node = soup.select_one("div[data-automation='jobAdDetails']")
-            jd_text = jd_node.get_text("\n", strip=True) if jd_node else None
-            html_fragment = str(jd_node) if jd_node else None
-            field_node = soup.select_one("[data-automation='job-detail-classifications'] a")
-            job_type_node = soup.select_one("[data-automation='job-detail-work-type'] a")
-            field_text = field_node.get_text(strip=True) if field_node else None
-            job_type_text = job_type_node.get_text(strip=True) if job_type_node else None
+        archive_page(job_id, url, html)
+        with METRICS.stage("detail_parse"):
+            result = parse_detail(html)
+        if any(result):
+            return result, False, variant
+        variants.pop(0)
 
-            if any([jd_text, html_fragment, field_text, job_type_text]):
-                return (field_text, job_type_text, jd_text, html_fragment)
+    return (None, None, None, None), False, None
 
-    return (None, None, None, None)
+def fetch_detail_via_https(job_id: str, is_active: bool = True, max_retry: int = 2, headers=None, preferred=None):
+    if not job_id: return (None, None, None, None)
+    result, blocked, _ = _fetch_detail(job_id, is_active, max_retry, headers or detail_request_headers(), preferred)
+    if blocked and headers is None:
+        # 凭据失效：刷新一次再试
+        METRICS.incr("credential_refresh")
+        try: SESSION_CREDS.refresh()
+        except Exception: return result
+        result, _, _ = _fetch_detail(job_id, is_active, max_retry, SESSION_CREDS.headers(), preferred)
+    return result
+
+class DetailPrefetcher:
+    """HTTP 阶段：线程池按处理顺序预取详情页（共享连接池，按 host 限速），最多领先 window 个 job，
+    内存里的页面数有上限。get(jid) 必须按 job_ids 的顺序调用；成功的 URL 变体写回 jobs_map[jid]["detail_variant"]。
+    命中验证页的条目在调用方线程（主线程，driver 非线程安全）刷新凭据后补抓；每抓成功一个回调 on_result(jid, result, variant)。"""
+    MAX_REFRESH = 3
+
+    def __init__(self, job_ids, jobs_map, concurrency=DETAIL_CONCURRENCY, window=DETAIL_PREFETCH, on_result=None):
+        self.jobs_map = jobs_map
+        self.on_result = on_result
+        self.window = max(1, window)
+        self._ids = iter([j for j in job_ids if j])
+        self._pending = deque()   # (jid, 提交时的凭据代数, future)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="detail")
+        self._headers = detail_request_headers()
+        self._gen = 0
+        self._refreshes = 0
+        self._fill()
+
+    def _fetch(self, jid, headers):
+        base = self.jobs_map.get(jid) or {}
+        result, blocked, variant = _fetch_detail(jid, base.get("is_active", True), 2, headers, base.get("detail_variant"))
+        if variant and base: base["detail_variant"] = variant
+        if self.on_result is not None and any(result): self.on_result(jid, result, variant)
+        return result, blocked
+
+    def _fill(self):
+        while len(self._pending) < self.window:
+            jid = next(self._ids, None)
+            if jid is None: return
+            self._pending.append((jid, self._gen, self._pool.submit(self._fetch, jid, self._headers)))
+
+    def get(self, jid):
+        """按顺序取下一个 job 的 (field, job_type, jd, html_fragment)。"""
+        pjid, gen, fut = self._pending.popleft()
+        assert pjid == jid, (pjid, jid)
+        self._fill()
+        with METRICS.stage("wait_detail"):
+            try: result, blocked = fut.result()
+            except Exception: result, blocked = (None, None, None, None), False
+        if not blocked:
+            return result
+        # 这次请求用的就是当前凭据：刷新一次；用的是旧凭据：前面的 job 已经刷新过，直接补抓
+        if gen == self._gen:
+            if self._refreshes >= self.MAX_REFRESH:
+                return result
+            print("[WARN] verification page on detail request, refreshing session credentials...")
+            METRICS.incr("credential_refresh")
+            self._refreshes += 1
+            try:
+                SESSION_CREDS.refresh()
+            except Exception as e:
+                print("[WARN] credential refresh failed:", e)
+                return result
+            self._headers, self._gen = SESSION_CREDS.headers(), self._gen + 1
+            for i in range(len(self._pending)):
+                pj, _, pf = self._pending[i]
+                if pf.cancel():   # 还没开始的用新凭据重新排队
+                    self._pending[i] = (pj, self._gen, self._pool.submit(self._fetch, pj, self._headers))
+        result, _ = self._fetch(jid, self._headers)
+        return result
+
+    def close(self):
+        for _, _, fut in self._pending: fut.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=True)
 
 
 # =========================
@@ -331,18 +1047,30 @@ def ensure_job_details_node():
         "//div[@data-automation='jobAdDetails']",
         "//*[@id='app']//div[contains(@data-automation,'jobAdDetails')]",
     ]
+    # 每轮最多等 1 秒（元素一出现立刻返回），找不到再往下滚一屏
     for _ in range(8):
-        for xp in paths:
-            try:
-                node = driver.find_element(By.XPATH, xp)
-                return node
-            except Exception:
-                time.sleep(0.5)
-        driver.execute_script("window.scrollBy(0,800);")
+        try:
+            return WebDriverWait(driver, 1.0, poll_frequency=0.1).until(
+                lambda d: next((n for xp in paths for n in d.find_elements(By.XPATH, xp)), None))
+        except TimeoutException:
+            driver.execute_script("window.scrollBy(0,800);")
     return None
 
+def archive_page(job_id, url, html):
+    """详情页原文进 PAGE_ARCHIVE（HTTP 抓取和 Selenium 回退都走这里），page_archive.py reparse 可离线重解析。"""
+    if PAGE_ARCHIVE is None or not html: return
+    try: PAGE_ARCHIVE.put(job_id, url, html)
+    except Exception as e: print(f"  [Warn] archive {job_id} failed:", e)
+
+def _archive_rendered(job_url, html):
+    """Selenium 回退：渲染后的页面按 URL 里的 job ID 归档（验证页不存）。"""
+    m = re.search(r"/(?:job|expiredjob)/(\d+)", job_url or "")
+    if m and not is_verification_page(html):
+        archive_page(m.group(1), job_url, html)
+
 def parse_detail_page_via_selenium(job_url):
     """安全的 Selenium 详情页兜底，不关闭主窗口。"""
+    get_driver()
     if not is_session_alive():
         return (None, None, None, None)
 
@@ -354,6 +1082,7 @@ def parse_detail_page_via_selenium(job_url):
         return (None, None, None, None)
 
     before = set(driver.window_handles)
+    PACER.acquire(job_url)
     driver.execute_script("window.open(arguments[0], '_blank');", job_url)
 
     new_handle = None
@@ -374,7 +1103,17 @@ def parse_detail_page_via_selenium(job_url):
 
     try:
         try: wait.until(EC.presence_of_element_located((By.XPATH, "//h1|//h2")))
-        except TimeoutException: time.sleep(0.8)
+        except TimeoutException: PACER.feedback(job_url, error=True)
+
+        # 先用共享解析器过一遍渲染后的页面；拿到 JD 就不再逐个找元素
+        try:
+            html = driver.page_source
+            _archive_rendered(job_url, html)
+            field_text, job_type_text, jd_text, html_fragment = parse_detail(html)
+        except Exception:
+            pass
+        if jd_text:
+            return (field_text, job_type_text, jd_text, html_fragment)
 
         try:
             n = driver.find_element(By.XPATH, "//span[@data-automation='job-detail-classifications']/a")
@@ -392,18 +1131,21 @@ def parse_detail_page_via_selenium(job_url):
         else:
             m = re.search(r"/(?:job|expiredjob)/(\d+)", job_url or "")
             if m and "/expiredjob/" not in job_url:
-                expired = f"https://www.seek.co.nz/expiredjob/{m.group(1)}?ref=applied"
-                driver.get(expired)
+                expired = build_job_url_from_jobid(m.group(1), is_active=False)
+                browser_get(expired)
                 node = ensure_job_details_node()
+                try: _archive_rendered(expired, driver.page_source)
+                except Exception: pass
                 if node:
                     jd_text = driver.execute_script("return arguments[0].innerText;", node).strip()
                     html_fragment = driver.execute_script("return arguments[0].outerHTML;", node)
     finally:
+        # 只关自己开的 tab：并行抽屉的 tab 也在 window_handles 里
         try:
             handles = driver.window_handles
             if len(handles) > 1:
                 for h in list(handles):
-                    if h != orig_handle:
+                    if h != orig_handle and h not in before:
                         try:
                             driver.switch_to.window(h)
                             driver.close()
@@ -415,7 +1157,6 @@ def parse_detail_page_via_selenium(job_url):
                     pass
         except Exception:
             pass
-        time.sleep(0.2)
 
     return (field_text, job_type_text, jd_text, html_fragment)
 
@@ -423,247 +1164,941 @@ def parse_detail_page_via_selenium(job_url):
 # =========================
 # (A) 首次加载：收集 appliedJobs 全量（含顺序）
 # =========================
+def _applied_jobs_page(data):
+    return ((data.get("data") or {}).get("viewer") or {}).get("appliedJobs")
+
+def _job_entry(node, page_idx=None):
+    job = node.get("job") or {}
+    adv = job.get("advertiser") or {}
+    loc = job.get("location") or {}
+    sal = job.get("salary") or {}
+    crt = job.get("createdAt") or {}
+    return {
+        "job_title": job.get("title"),
+        "company": adv.get("name"),
+        "address": loc.get("label"),
+        "salary": (sal or {}).get("label"),
+        "posted_date": clean_date_text((crt or {}).get("label")),
+        "events": node.get("events") or [],
+        "is_active": node.get("isActive", True),
+        "is_external": node.get("isExternal", True),
+        "page_idx": page_idx,
+    }
+
 def collect_all_applied_jobs_via_cdp():
-    """返回 (jobs_map, ordered_ids)，其中 jobs_map[jid] = {..., is_external, is_active, events}"""
+    """（回退路径）滚动 applied-jobs 页并收集触发的 GraphQL。返回 (jobs_map, ordered_ids)，
+    其中 jobs_map[jid] = {..., is_external, is_active, events}"""
     jobs_map = {}
     ordered_ids = []
 
-    # 清日志并打开 applied-jobs
-    _ = driver.get_log("performance")
-    driver.get(APPLIED_URL)
+    # 记下起点并打开 applied-jobs
+    since = graphql_mark()
+    browser_get(APPLIED_URL)
     try:
         wait_present((By.XPATH, "//*[contains(@id,'tabs-saved-applied_') and contains(@id,'_panel')]"))
     except TimeoutException:
         pass
 
-    # 轻滚 + 等待请求
+    # 轻滚 + 等待请求：滚动触发了下一页就等到它的响应为止（最多 0.5 秒），最后等在途请求收尾
     driver.execute_script("window.scrollTo(0,0);")
     for _ in range(6):
-        driver.execute_script("window.scrollBy(0,1400);"); time.sleep(0.5)
-    time.sleep(1.0)
+        mark = graphql_mark() if GRAPHQL is not None else None
+        driver.execute_script("window.scrollBy(0,1400);")
+        if GRAPHQL is not None: GRAPHQL.wait_for(_applied_jobs_page, since=mark, timeout=0.5)
+        else: time.sleep(0.5)
+    if GRAPHQL is not None: GRAPHQL.wait_idle(timeout=1.0)
+    else: time.sleep(1.0)
 
     # 收割 GraphQL
-    for data in _iter_graphql_responses():
-        edges = (((data.get("data") or {}).get("viewer") or {}).get("appliedJobs") or {}).get("edges") or []
+    for data in graphql_responses(since):
+        edges = (_applied_jobs_page(data) or {}).get("edges") or []
         for edge in edges:
             node = edge.get("node") or {}
-            job  = node.get("job") or {}
-            jid  = str(job.get("id") or "")
+            jid  = str((node.get("job") or {}).get("id") or "")
             if not jid: continue
             if jid not in ordered_ids:
                 ordered_ids.append(jid)
-            adv = job.get("advertiser") or {}
-            loc = job.get("location") or {}
-            sal = job.get("salary") or {}
-            crt = job.get("createdAt") or {}
-            events = node.get("events") or []
-            jobs_map[jid] = {
-                "job_title": job.get("title"),
-                "company": adv.get("name"),
-                "address": loc.get("label"),
-                "salary": (sal or {}).get("label"),
-                "posted_date": clean_date_text((crt or {}).get("label")),
-                "events": events,
-                "is_active": node.get("isActive", True),
-                "is_external": node.get("isExternal", True),
-            }
+            jobs_map[jid] = _job_entry(node)
+    return jobs_map, ordered_ids
+
+
+# =========================
+# (A') appliedJobs 直连：回放 GraphQL 请求，按游标翻页
+# =========================
+_TEMPLATE_SKIP_HEADERS = ("cookie", "content-length", "host", "user-agent")
+
+def graphql_template_from_request(req):
+    """把 CDP 记下的请求整理成可回放模板；只支持单条 POST JSON。"""
+    try: body = json.loads(req.get("postData") or "")
+    except ValueError: return None
+    if not isinstance(body, dict) or ("query" not in body and "extensions" not in body):
+        return None
+    headers = {k: v for k, v in (req.get("headers") or {}).items() if k.lower() not in _TEMPLATE_SKIP_HEADERS}
+    return {"url": req["url"], "headers": headers, "body": body}
+
+def graphql_replay_headers(tpl):
+    headers = SESSION_CREDS.headers()
+    headers.update(tpl["headers"])
+    headers["Accept"] = "application/json"
+    headers["Content-Type"] = "application/json"
+    return headers
+
+def replay_post(url, body, headers, timeout, attempts=3):
+    """GraphQL 回放的一次 POST：429 / 503 / 超时报给 PACER（降速，有 Retry-After 就整个 host 暂停到那时）后重试，
+    最多 attempts 次。返回最后一次的响应；最后一次连不上则抛出那个异常。"""
+    last = None
+    for _ in range(attempts):
+        PACER.acquire(url)
+        try:
+            last = HTTP_SESSION.post(url, json=body, headers=headers, timeout=timeout)
+        except Exception as e:
+            PACER.feedback(url, error=True)
+            last = e
+            continue
+        PACER.feedback_response(url, last)
+        if last.status_code not in AdaptivePacer.PUSHBACK_STATUS: break
+    if isinstance(last, Exception): raise last
+    return last
+
+def capture_applied_jobs_template(timeout=20):
+    """浏览器打开一次 applied-jobs（不滚动），记下 appliedJobs 请求作为模板并落盘。"""
+    since = graphql_mark()
+    browser_get(APPLIED_URL)
+    hit = GRAPHQL.wait_for(_applied_jobs_page, since=since, timeout=timeout, with_request=True)
+    if not hit: return None
+    tpl = graphql_template_from_request(hit[1])
+    if tpl:
+        SESSION_CREDS.templates["appliedJobs"] = tpl
+        SESSION_CREDS.save()
+    return tpl
+
+def _pick_key(variables, candidates, default):
+    for k in candidates:
+        if k in variables: return k
+    return default
+
+def fetch_applied_jobs_via_graphql(tpl, max_pages=1000):
+    """按模板回放 appliedJobs，跟着 pageInfo.endCursor 翻到底。
+    返回 [(page_no, node), ...]（列表顺序）；模板失效/拿不到分页信息时返回 None，由调用方回退。"""
+    body = copy.deepcopy(tpl["body"])
+    variables = body.setdefault("variables", {}) or {}
+    body["variables"] = variables
+    cursor_key = _pick_key(variables, ("after", "cursor"), "after")
+    page_size = variables.get(_pick_key(variables, ("first", "limit", "pageSize"), "first"))
+    headers = graphql_replay_headers(tpl)
+
+    out, seen, cursor = [], set(), None
+    for page_no in range(1, max_pages + 1):
+        if cursor: variables[cursor_key] = cursor
+        try: resp = replay_post(tpl["url"], body, headers, timeout=30)
+        except Exception as e:
+            print("[WARN] appliedJobs replay failed:", e); return None
+        if resp.status_code in (401, 403):
+            print(f"[WARN] appliedJobs replay rejected ({resp.status_code}), template dropped")
+            SESSION_CREDS.templates.pop("appliedJobs", None); SESSION_CREDS.save()
+            return None
+        try: page = _applied_jobs_page(resp.json()) if resp.status_code == 200 else None
+        except ValueError: page = None
+        if page is None:
+            print(f"[WARN] appliedJobs replay got no data (HTTP {resp.status_code})"); return None
+        edges = page.get("edges") or []
+        out.extend((page_no, e.get("node") or {}) for e in edges)
+
+        info = page.get("pageInfo")
+        if info is None:
+            # 查询里没有 pageInfo：一页没装满说明就这些，装满了就没法继续翻，交给回退路径
+            return out if page_size and len(edges) < page_size else None
+        cursor = info.get("endCursor")
+        if not info.get("hasNextPage") or not cursor or cursor in seen:
+            return out
+        seen.add(cursor)
+    return out
+
+def collect_all_applied_jobs():
+    """返回 (jobs_map, ordered_ids)。优先回放缓存的 appliedJobs 模板；没有就开一次页面抓模板；
+    都不行才回退滚动收集。jobs_map[jid]["page_idx"] 来自真实分页。"""
+    pages = None
+    tpl = SESSION_CREDS.templates.get("appliedJobs")
+    if tpl:
+        pages = fetch_applied_jobs_via_graphql(tpl)
+    if pages is None and GRAPHQL_CAPTURE != "perflog":
+        tpl = capture_applied_jobs_template()
+        if tpl:
+            pages = fetch_applied_jobs_via_graphql(tpl)
+    if pages is None:
+        print("[WARN] appliedJobs replay unavailable, falling back to scrolling")
+        return collect_all_applied_jobs_via_cdp()
+
+    jobs_map, ordered_ids = {}, []
+    for page_no, node in pages:
+        jid = str((node.get("job") or {}).get("id") or "")
+        if not jid or jid in jobs_map: continue
+        ordered_ids.append(jid)
+        jobs_map[jid] = _job_entry(node, page_idx=page_no)
     return jobs_map, ordered_ids
 
 
 # =========================
 # (B) 打开“构造的抽屉页 URL”后：只取 ApplicantCount（不取下载直链）
 # =========================
-def get_competitor_from_drawer_via_cdp(wait_secs=6):
-    """当前页为 /my-activity/applied-jobs/{job_id}?page=X，读取 GraphQL 中的 ApplicantCount。"""
-    _ = driver.get_log("performance")
+def _applicant_count(data):
+    insights = ((data.get("data") or {}).get("jobDetails") or {}).get("insights") or []
+    for ins in insights:
+        if isinstance(ins, dict) and ins.get("__typename") == "ApplicantCount":
+            c = ins.get("count")
+            if c is not None:
+                return int(c)
+    return None
+
+def get_competitor_from_drawer_via_cdp(wait_secs=6, since=None):
+    """当前页为 /my-activity/applied-jobs/{job_id}?page=X，读取 GraphQL 中的 ApplicantCount。
+    since 为打开抽屉前 graphql_mark() 的返回值；响应一到就返回，不等到截止时间。"""
+    if GRAPHQL is not None:
+        return GRAPHQL.wait_for(_applicant_count, since=since or 0, timeout=wait_secs)
+
+    if since is None:
+        _ = driver.get_log("performance")
     deadline = time.time() + wait_secs
-    competitor = None
+    poll = 0.1
     while time.time() < deadline:
-        time.sleep(0.6)
+        time.sleep(poll)
+        poll = min(poll * 2, 0.6)   # 响应通常很快到；先密后疏地读日志
         for data in _iter_graphql_responses():
-            insights = ((data.get("data") or {}).get("jobDetails") or {}).get("insights") or []
-            for ins in insights:
-                if isinstance(ins, dict) and ins.get("__typename") == "ApplicantCount":
-                    c = ins.get("count")
-                    if c is not None:
-                        competitor = int(c)
-        if competitor is not None:
-            break
-    return competitor
+            competitor = _applicant_count(data) if isinstance(data, dict) else None
+            if competitor is not None:
+                return competitor
+    return None
 
 
 # =========================
-# 时间线 & 竞争者合并策略
+# (B') ApplicantCount 批量直连：回放 jobDetails GraphQL，不开抽屉
 # =========================
-def merge_timelines(existing, incoming):
-    """合并时间线：去重（status, date, note），再按 date 排序（空放最后）"""
-    def key(t): return (t.get("status",""), t.get("date",""), t.get("note",""))
-    merged = { key(t): t for t in (existing or []) }
-    for t in (incoming or []):
-        merged[key(t)] = t
-    arr = list(merged.values())
-    arr.sort(key=lambda x: (x.get("date","")=="" , x.get("date","")))
-    return arr
-
-def max_competitor(old_txt, new_int):
-    def to_int(x):
-        try: return int(x)
-        except Exception: return None
-    old = to_int(old_txt)
-    if old is None: return str(new_int) if new_int is not None else None
-    if new_int is None: return str(old)
-    return str(max(old, new_int))
+def _value_paths(obj, value, prefix=()):
+    """找出 variables 里等于 value 的所有键路径（回放时把 job_id 换掉）。"""
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            yield from _value_paths(v, value, prefix + (k,))
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            yield from _value_paths(v, value, prefix + (i,))
+    elif str(obj) == value:
+        yield prefix
+
+def _set_path(obj, path, value):
+    for k in path[:-1]:
+        obj = obj[k]
+    obj[path[-1]] = value
+
+def capture_job_details_template(job_id, page_idx, timeout=10):
+    """开一次该 job 的抽屉页，记下带 ApplicantCount 的 jobDetails 请求作为模板并落盘。"""
+    since = graphql_mark()
+    browser_get(build_drawer_url(job_id, page_idx))
+    hit = GRAPHQL.wait_for(_applicant_count, since=since, timeout=timeout, with_request=True)
+    if not hit: return None
+    tpl = graphql_template_from_request(hit[1])
+    if not tpl: return None
+    tpl["job_id_paths"] = [list(p) for p in _value_paths(tpl["body"].get("variables") or {}, str(job_id))]
+    if not tpl["job_id_paths"]: return None
+    SESSION_CREDS.templates["jobDetails"] = tpl
+    SESSION_CREDS.save()
+    return tpl
+
+def fetch_applicant_counts(job_ids, tpl, concurrency=COMPETITOR_CONCURRENCY):
+    """并发回放 jobDetails（共享连接池 + 按 host 限速，429 / 503 / 超时重试），返回 {job_id: count 或 None}。"""
+    headers = graphql_replay_headers(tpl)
+    rejected = threading.Event()
+
+    def _one(jid):
+        if rejected.is_set(): return None
+        body = copy.deepcopy(tpl["body"])
+        for path in tpl["job_id_paths"]:
+            _set_path(body["variables"], path, str(jid))
+        resp = replay_post(tpl["url"], body, headers, timeout=20)
+        if resp.status_code in (401, 403):
+            rejected.set(); return None
+        if resp.status_code != 200: return None
+        data = resp.json()
+        for item in (data if isinstance(data, list) else [data]):
+            c = _applicant_count(item) if isinstance(item, dict) else None
+            if c is not None: return c
+        return None
+
+    counts = {}
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(_one, jid): jid for jid in job_ids}
+        for fut in as_completed(futures):
+            try: counts[futures[fut]] = fut.result()
+            except Exception: counts[futures[fut]] = None
+    if rejected.is_set():
+        print("[WARN] jobDetails replay rejected, template dropped; remaining counts come from drawers")
+        SESSION_CREDS.templates.pop("jobDetails", None); SESSION_CREDS.save()
+    return counts
+
+def collect_applicant_counts(job_ids, jobs_map):
+    """COMPETITOR_MODE=graphql 时批量取 ApplicantCount；没有模板就先开第一个抽屉抓一次。"""
+    if COMPETITOR_MODE != "graphql" or not job_ids:
+        return {}
+    tpl = SESSION_CREDS.templates.get("jobDetails")
+    if not tpl and GRAPHQL_CAPTURE != "perflog":
+        jid = job_ids[0]
+        tpl = capture_job_details_template(jid, (jobs_map.get(jid) or {}).get("page_idx") or 1)
+    if not tpl:
+        print("[WARN] no jobDetails template, applicant counts come from drawers")
+        return {}
+    counts = fetch_applicant_counts(job_ids, tpl)
+    print(f"[INFO] applicant counts: {sum(c is not None for c in counts.values())}/{len(job_ids)} via GraphQL")
+    return counts
 
 
 # =========================
-# 主流程
+# (C) 抽屉：打开构造的抽屉页 URL，等 ApplicantCount（批量没拿到时），点按钮下载 CV/CL
 # =========================
-print(f"[MODE] {MODE.upper()}")
-print("[INFO] Warmup & collect applied jobs via CDP...")
-ensure_cf_clearance()
-all_jobs_map, ordered_ids = collect_all_applied_jobs_via_cdp()
-print(f"[INIT] collected jobs: {len(ordered_ids)}")
-
-# 逐条处理（按列表顺序，便于计算 page）
-for idx, jid in enumerate(ordered_ids):
-    base = all_jobs_map.get(jid, {})
-    if not base:
-        continue
-
-    is_external = base.get("is_external", True)
-    is_active   = base.get("is_active", True)
-    page_idx    = idx // 20 + 1  # 0-19:1, 20-39:2, ...
-
-    # 1) SEEK 源：进入“构造的抽屉页 URL”，拿 ApplicantCount + 点击下载 CV/CL
-    competitor = None
-    cv_bytes = cl_bytes = None
-    if not is_external:
-        drawer_url = build_drawer_url(jid, page_idx)
-        driver.get(drawer_url)
+def visit_drawer(jid, page_idx, competitor=None):
+    """单 tab（Selenium 主窗口）顺序处理一个抽屉，返回 (competitor, cv_bytes, cl_bytes, ok)。
+    ok=False：抽屉没打开（验证页 / 导航失败）或下载失败，这个 job 不存增量指纹，下次重跑。"""
+    since = graphql_mark()
+    url = build_drawer_url(jid, page_idx)
+    with METRICS.stage("drawer_nav"):
+        if browser_get(url):
+            try:
+                wait_present((By.XPATH, "//div[starts-with(@id,'drawer-view-')]"))
+            except TimeoutException:
+                # 某些情况下抽屉自动打开略慢，等一点日志也能拿到 insights
+                METRICS.incr("drawer_timeout")
+                PACER.feedback(url, error=True)
+        else:
+            return competitor, None, None, False   # 验证页：不等人数、不点按钮
+    if competitor is None:
+        with METRICS.stage("competitor_wait"):
+            competitor = get_competitor_from_drawer_via_cdp(wait_secs=6, since=since)
+        if competitor is None: METRICS.incr("competitor_missing")
+    # 只通过按钮下载
+    with METRICS.stage("downloads"):
+        cv_bytes, cl_bytes, ok = download_cv_cl_via_buttons()
+    return competitor, cv_bytes, cl_bytes, ok
+
+# 抽屉出现且地址已经是这个 job（防止读到上一个 job 的旧页面）才算加载好
+_DRAWER_READY_JS = """new Promise(resolve => {
+  const end = Date.now() + %d;
+  (function poll() {
+    if (location.pathname.endsWith("/" + %s) && document.querySelector("div[id^='drawer-view-']")) return resolve(true);
+    if (Date.now() > end) return resolve(false);
+    setTimeout(poll, 100);
+  })();
+})"""
+
+_DRAWER_CLICK_JS = """(() => {
+  const drawer = document.evaluate("//div[starts-with(@id,'drawer-view-')]", document, null, 9, null).singleNodeValue;
+  const btn = drawer && document.evaluate(%s, drawer, null, 9, null).singleNodeValue;
+  if (!btn) return false;
+  btn.click();
+  return true;
+})()"""
+
+class DrawerTab:
+    """并行抽屉用的一个后台 tab：自己的 GraphQLCapture（导航 / 执行 JS 也走这条 DevTools 连接），
+    不经过 chromedriver，不抢 Selenium 主窗口的焦点。下载按 frameId（= tab 的 target id）认领。"""
+    def __init__(self, target_id):
+        self.target_id = target_id
+        self.graphql = GraphQLCapture.attach(driver, target_id=target_id)
+        self.sock = self.graphql.sock
+
+    def eval(self, expression, timeout=10):
+        res = self.sock.call("Runtime.evaluate", {"expression": expression, "returnByValue": True,
+                                                  "awaitPromise": True}, timeout=timeout)
+        return (res.get("result") or {}).get("value")
+
+    def _wait_drawer(self, jid, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0: return False
+            step = min(remaining, 5.0)
+            try:
+                if self.eval(_DRAWER_READY_JS % (int(step * 1000), json.dumps(str(jid))), timeout=step + 5):
+                    return True
+            except (RuntimeError, TimeoutError):
+                time.sleep(0.1)   # 导航途中执行上下文被销毁，换新页面再等
+
+    def _download(self):
+        """返回 (cv_bytes, cl_bytes, ok)，ok 同 download_cv_cl_via_buttons。"""
+        guids = {}
+        ok = True
+        for label, xp in (("CV", CV_BUTTON_XPATH), ("CL", CL_BUTTON_XPATH)):
+            PACER.acquire(SEEK_BASE_URL)
+            since = DOWNLOADS.mark()
+            try: clicked = self.eval(_DRAWER_CLICK_JS % json.dumps(xp))
+            except Exception as e: clicked = None; print(f"  [Warn] {label} button failed:", e)
+            if clicked is None: ok = False
+            if not clicked: continue
+            with METRICS.stage("download_begin"):
+                guids[label] = DOWNLOADS.wait_begin(since, frame_id=self.target_id)
+            if guids[label] is None:
+                METRICS.incr("download_timeout")
+                PACER.feedback(SEEK_BASE_URL, error=True)
+                print(f"  [Warn] {label} download never started")
+                ok = False
+        out = {}
+        for label, guid in guids.items():
+            if guid is None: continue
+            with METRICS.stage("download_wait"):
+                out[label] = DOWNLOADS.wait_done(guid)
+            PACER.feedback(SEEK_BASE_URL, error=out[label] is None)
+            METRICS.incr("download_ok" if out[label] is not None else "download_timeout")
+            if out[label] is None: ok = False
+        return out.get("CV"), out.get("CL"), ok
+
+    def visit(self, jid, page_idx, competitor=None):
+        since = self.graphql.mark()
+        url = build_drawer_url(jid, page_idx)
+        PACER.acquire(url)
+        with METRICS.stage("drawer_nav"):
+            self.sock.call("Page.navigate", {"url": url}, timeout=DRAWER_TIMEOUT)
+            ready = self._wait_drawer(jid, DRAWER_TIMEOUT)
+        if not ready:
+            METRICS.incr("drawer_timeout")
+            try: blocked = is_verification_page(self.eval(_PAGE_HEAD_JS.replace("return ", "", 1)))
+            except Exception: blocked = False
+            if blocked: METRICS.incr("verification_hit")
+            PACER.feedback(url, blocked=blocked, error=not blocked)
+            return competitor, None, None, False   # 抽屉没出来：没有人数可等、没有按钮可点
+        PACER.feedback(url)
+        if competitor is None:
+            with METRICS.stage("competitor_wait"):
+                competitor = self.graphql.wait_for(_applicant_count, since=since, timeout=6)
+            if competitor is None: METRICS.incr("competitor_missing")
+        with METRICS.stage("downloads"):
+            cv_bytes, cl_bytes, ok = self._download()
+        return competitor, cv_bytes, cl_bytes, ok
+
+    def close(self):
+        self.graphql.close()
+
+class DrawerTabPool:
+    """DRAWER_TABS 个后台 tab 并行开抽屉；map_ordered() 按输入顺序交回结果，
+    预取窗口有上限，附件字节不会一次性堆在内存里。"""
+    def __init__(self, size):
+        self.size = size
+        self.tabs = []
+        self._idle = queue.Queue()
+        for _ in range(size):
+            tid = driver.execute_cdp_cmd("Target.createTarget", {"url": "about:blank", "background": True})["targetId"]
+            tab = DrawerTab(tid)
+            self.tabs.append(tab)
+            self._idle.put(tab)
+
+    def visit(self, jid, page_idx, competitor=None):
+        tab = self._idle.get()
         try:
-            wait_present((By.XPATH, "//div[starts-with(@id,'drawer-view-')]"))
-        except TimeoutException:
-            # 某些情况下抽屉自动打开略慢，等一点日志也能拿到 insights
-            pass
-        competitor = get_competitor_from_drawer_via_cdp(wait_secs=6)
-        # 只通过按钮下载
-        cv_bytes, cl_bytes = download_cv_cl_via_buttons()
-
-    # 2) 详情页（HTTPS 优先，失败回退 Selenium）
-    field, job_type, jd_text, html_fragment = fetch_detail_via_https(jid, is_active=is_active)
-    if not any([field, job_type, jd_text, html_fragment]):
-        job_url_tmp = build_job_url_from_jobid(jid, is_active=is_active)
-        f2, jt2, jd2, html2 = parse_detail_page_via_selenium(job_url_tmp)
-        field = field or f2; job_type = job_type or jt2; jd_text = jd_text or jd2; html_fragment = html_fragment or html2
-
-    # 3) 时间线/摘要
-    timeline_new = uniq_sorted_timeline(base.get("events"))
-    status_summary_new = timeline_new[-1]["status"] if timeline_new else "Applied"
-    job_url_final = build_job_url_from_jobid(jid, is_active=is_active)
-    source_label = "SEEK" if not is_external else "External"
-
-    # 4) 入库（按 job_id 与 url 中 id 匹配）
+            return tab.visit(jid, page_idx, competitor)
+        except Exception as e:
+            print(f"  [Warn] drawer {jid} failed in tab:", e)
+            return competitor, None, None, False
+        finally:
+            self._idle.put(tab)
+
+    def map_ordered(self, jobs, window=None):
+        """jobs: [(jid, page_idx, competitor)]，逐个 yield (jid, (competitor, cv, cl, ok))。"""
+        window = window or self.size * 2
+        it = iter(jobs)
+        with ThreadPoolExecutor(max_workers=self.size) as pool:
+            pending = deque((job[0], pool.submit(self.visit, *job)) for job in itertools.islice(it, window))
+            try:
+                while pending:
+                    jid, fut = pending.popleft()
+                    nxt = next(it, None)
+                    if nxt is not None:
+                        pending.append((nxt[0], pool.submit(self.visit, *nxt)))
+                    yield jid, fut.result()
+            finally:
+                for _, fut in pending:   # 提前停下（主循环出错）：排队的不再开，只等在跑的
+                    fut.cancel()
+
+    def close(self):
+        for tab in self.tabs:
+            tab.close()
+            try: driver.execute_cdp_cmd("Target.closeTarget", {"targetId": tab.target_id})
+            except Exception: pass
+
+def open_drawer_pool(n_jobs):
+    """DRAWER_TABS > 1 且 DevTools 事件可用时建 tab 池；否则返回 None，走主窗口顺序处理。"""
+    if DRAWER_TABS <= 1 or n_jobs <= 1:
+        return None
+    get_driver()
+    if GRAPHQL is None or DOWNLOADS is None:
+        print("[WARN] parallel drawers need DevTools GraphQL capture and download events; using one tab")
+        return None
     try:
-        # 用正则匹配 url 中包含该 job_id（兼容 job/ 与 expiredjob/）
-        regex = rf"/(job|expiredjob)/{re.escape(jid)}(\?|$)"
-        cur.execute("SELECT id, job_url, status_timeline, competitor_count, "
-                    "job_title, company, address, field, job_type, jd, html_content, source "
-                    "FROM jobsnew WHERE job_url ~ %s LIMIT 1", (regex,))
-        row = cur.fetchone()
-
-        if row:
-            row_id, existing_url, st_old, comp_old, \
-            jt_old, co_old, ad_old, field_old, jtype_old, jd_old, html_old, src_old = row
-
-            # 只追加时间线（合并去重）
-            merged_timeline = merge_timelines(st_old, timeline_new)
-            status_summary  = merged_timeline[-1]["status"] if merged_timeline else status_summary_new
-
-            # 竞争者人数只增不减
-            comp_final = max_competitor(comp_old, competitor)
-
-            # 仅在库里为空时补齐其它字段
-            payload = {
-                "id": row_id,
-                "job_url": existing_url or job_url_final,
-                "job_title": jt_old or base.get("job_title"),
-                "company": co_old or base.get("company"),
-                "address": ad_old or base.get("address"),
-                "field": field_old or field,
-                "job_type": jtype_old or job_type,
-                "posted_date": base.get("posted_date"),  # 日期通常稳定，可覆盖
-                "salary": base.get("salary"),
-                "competitor_count": comp_final,
-                "jd": jd_old or jd_text,
-                "html_content": html_old or html_fragment,
-                "source": src_old or source_label,
-                "status_summary": status_summary,
-                "status_timeline": Json(merged_timeline),
-                "cv_file": psycopg2.Binary(cv_bytes) if (cv_bytes and not None) else None,
-                "cl_file": psycopg2.Binary(cl_bytes) if (cl_bytes and not None) else None,
-                "created_at": datetime.utcnow().isoformat()
-            }
-
-            cur.execute("""
-                UPDATE jobsnew SET
-                  job_title=%(job_title)s, company=%(company)s, address=%(address)s,
-                  field=%(field)s, job_type=%(job_type)s, posted_date=%(posted_date)s,
-                  salary=%(salary)s, competitor_count=%(competitor_count)s, jd=%(jd)s,
-                  html_content=%(html_content)s, source=%(source)s, status_summary=%(status_summary)s,
-                  status_timeline=%(status_timeline)s,
-                  cv_file=COALESCE(%(cv_file)s, cv_file),
-                  cl_file=COALESCE(%(cl_file)s, cl_file),
-                  created_at=%(created_at)s
-                WHERE id=%(id)s
-            """, payload)
-            print(f"  ↻ Updated (merge) {jid}")
+        pool = DrawerTabPool(min(DRAWER_TABS, n_jobs))
+    except Exception as e:
+        print(f"[WARN] cannot open drawer tabs ({e}); using one tab")
+        return None
+    print(f"[INFO] drawers in {pool.size} parallel tabs")
+    return pool
+
+def iter_drawer_results(jobs, pool=None):
+    """按 jobs 顺序 yield (jid, (competitor, cv, cl, ok))；没有 tab 池就在主窗口里逐个处理。
+    结果跟着 job 走，不经过共享状态：tab 池的工作线程之间不用加锁。"""
+    if pool is not None:
+        yield from pool.map_ordered(jobs)
+        return
+    for jid, page_idx, competitor in jobs:
+        yield jid, visit_drawer(jid, page_idx, competitor)
+
+
+# =========================
+# 数据库（storage.py：DB_BACKEND=postgres / sqlite，第一次用库时建表、跑迁移）
+# =========================
+def get_db():
+    """返回 JobStore；第一次调用才连库 / 打开 SQLite 文件、建表、跑迁移。"""
+    global DB_STORE
+    if DB_STORE is not None:
+        return DB_STORE
+    with METRICS.stage("db_connect"):
+        store = connect_store()
+    with METRICS.stage("db_migrate"):
+        store.migrate()
+    DB_STORE = store
+    return DB_STORE
+
+def close_db():
+    global DB_STORE
+    if DB_STORE is None: return
+    try: DB_STORE.close()
+    except Exception: pass
+    DB_STORE = None
+
+
+# =========================
+# 增量同步：按 appliedJobs 节点指纹跳过未变化的 job
+# =========================
+def job_fingerprint(base):
+    """events / isActive / salary 的稳定哈希；这几项不变，抽屉、下载、详情都不用重跑。"""
+    raw = json.dumps({"events": base.get("events") or [], "isActive": base.get("is_active"),
+                      "salary": base.get("salary")}, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+def plan_incremental(ordered_ids, jobs_map, snapshot):
+    """返回 (需要处理的 job_id 列表, 统计)。没抓到 JD 的老记录也重跑，避免一次失败后永远被跳过；
+    其它阶段失败（抽屉没打开 / 下载失败）的 job 入库时不存指纹（见 run()），这里按“有变化”重跑。"""
+    todo, stats = [], {"new": 0, "changed": 0, "incomplete": 0, "skipped": 0}
+    for jid in ordered_ids:
+        snap = snapshot.get(jid)
+        if snap is None:
+            stats["new"] += 1
+        elif snap["fingerprint"] != job_fingerprint(jobs_map.get(jid) or {}):
+            stats["changed"] += 1
+        elif not snap["has_jd"]:
+            stats["incomplete"] += 1
         else:
-            # 新插入
-            payload = {
-                "id": str(uuid.uuid4()),
-                "job_url": job_url_final,
-                "job_title": base.get("job_title"),
-                "company": base.get("company"),
-                "address": base.get("address"),
+            stats["skipped"] += 1
+            continue
+        todo.append(jid)
+    return todo, stats
+
+def plan_detail_fetch(job_ids, jobs_map, snapshot):
+    """返回 (要抓详情的 job_id 列表, 不可变 job_id 集合)，顺带把库里记住的 URL 变体带进 jobs_map。
+    已下线且 jd / html_content 都已入库的 job：过期广告内容不会再变，详情整个跳过。"""
+    todo, frozen = [], set()
+    for jid in job_ids:
+        base, snap = jobs_map.get(jid), snapshot.get(jid)
+        if not base: continue
+        if snap is None:
+            todo.append(jid)
+            continue
+        if snap["detail_variant"] and not base.get("detail_variant"):
+            base["detail_variant"] = snap["detail_variant"]
+        if not base.get("is_active", True) and snap["has_jd"] and snap["has_html"]:
+            frozen.add(jid)
+        else:
+            todo.append(jid)
+    return todo, frozen
+
+def plan_drawers(seek_ids, snapshot, competitor_counts, frozen_ids, jobs_map):
+    """需要开抽屉的 job_id 列表。抽屉只为 CV/CL 下载和 ApplicantCount 兜底：
+    CV、CL 都已入库（投递后不会再变）且人数已拿到（或 job 已不可变）的不再开；
+    库里的指纹和现在一致的也不再开——指纹只在抽屉成功开过时才存（没显示人数、没传 CL 也算开过，见 run()），
+    再开一次拿到的还是同样的东西。"""
+    todo = []
+    for jid in seek_ids:
+        snap = snapshot.get(jid) or {}
+        if snap.get("fingerprint") and snap["fingerprint"] == job_fingerprint(jobs_map.get(jid) or {}):
+            continue
+        if snap.get("has_cv") and snap.get("has_cl") and (competitor_counts.get(jid) is not None or jid in frozen_ids):
+            continue
+        todo.append(jid)
+    return todo
+
+
+# =========================
+# 批量入库（缓冲 + 多行 upsert，单事务）
+# =========================
+def build_job_payload(rec):
+    """把本次抓到的记录转成一行 payload（按新行填）；与库中已有行的合并在 upsert 语句里由数据库完成（见 storage.py）。"""
+    base = rec["base"]
+    competitor = rec.get("competitor")
+    return {
+        "id": str(uuid.uuid4()),   # 已有行冲突时保留原 id
+        "job_url": rec["job_url"],
+        "job_title": base.get("job_title"),
+        "company": base.get("company"),
+        "address": base.get("address"),
+        "field": rec.get("field"),
+        "job_type": rec.get("job_type"),
+        "posted_date": base.get("posted_date"),  # 日期通常稳定，可覆盖
+        "salary": base.get("salary"),
+        "competitor_count": str(competitor) if competitor is not None else None,
+        "jd": rec.get("jd"),
+        "html_content": rec.get("html_content"),
+        "source": rec["source"],
+        "status_summary": rec["status_summary"],
+        "status_timeline": rec["timeline"],   # 写进 job_events，不是 jobsnew 的列
+        "cv_sha256": attachment_hash(rec.get("cv_bytes")),
+        "cl_sha256": attachment_hash(rec.get("cl_bytes")),
+        "created_at": datetime.utcnow().isoformat(),
+        "seek_job_id": rec["jid"],
+        "sync_fingerprint": rec.get("fingerprint"),
+        "detail_variant": base.get("detail_variant"),
+    }
+
+class JobWriter:
+    """缓冲已处理的 job，按 batch_size / flush_interval 批量落库（JobStore，见 storage.py）。
+    整批一次多行 upsert（INSERT ... ON CONFLICT DO UPDATE，合并在库里做，不回读已有行）、一次提交；
+    整批失败时回滚，逐行重试，每行一个 SAVEPOINT，坏行不拖累整批。
+    CV/CL 先按哈希写进 attachments（库里已有的哈希不再上传字节），jobsnew 只写引用。"""
+    def __init__(self, store, batch_size=DB_BATCH_SIZE, flush_interval=DB_FLUSH_INTERVAL, on_written=None):
+        self.store = store
+        self.on_written = on_written   # 提交成功后回调 (job_id 列表)，断点续跑日志用
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self._known_hashes = set()   # 已确认在 attachments 里的哈希
+
+    def add(self, rec):
+        if any(r["jid"] == rec["jid"] for r in self.buffer):
+            self.flush()  # 同一批里同一 job 只能 upsert 一次
+        self.buffer.append(rec)
+        if (len(self.buffer) >= self.batch_size
+                or time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def _store_attachments(self, recs):
+        """与 upsert 同一事务：只上传库里还没有的附件；返回本次涉及的哈希，提交成功后记入缓存。"""
+        blobs = {}
+        for rec in recs:
+            for b in (rec.get("cv_bytes"), rec.get("cl_bytes")):
+                if b: blobs.setdefault(attachment_hash(b), b)
+        missing = [h for h in blobs if h not in self._known_hashes]
+        if missing:
+            have = self.store.existing_attachments(missing)
+            now = datetime.utcnow().isoformat()
+            new = [(h, blobs[h], len(blobs[h]), now) for h in missing if h not in have]
+            if new:
+                self.store.insert_attachments(new)
+        return set(blobs)
+
+    def flush(self):
+        if not self.buffer: return
+        with METRICS.stage("db_flush"):
+            self._flush()
+
+    def _flush(self):
+        batch, self.buffer = self.buffer, []
+        self.last_flush = time.monotonic()
+        rows = [(rec, build_job_payload(rec)) for rec in batch]
+        try:
+            hashes = self._store_attachments(batch)
+            inserted = self.store.upsert([p for _, p in rows])
+            self.store.commit()
+            self._known_hashes |= hashes
+        except Exception as e:
+            self.store.rollback()
+            METRICS.incr("db_batch_retry")
+            print(f"  [DB] batch of {len(rows)} failed ({e}); retrying row by row")
+            self._write_isolated(rows)
+            return
+        METRICS.incr("db_rows_written", len(rows))
+        for rec, _ in rows:
+            print(f"  ✓ Inserted {rec['jid']}" if rec["jid"] in inserted else f"  ↻ Updated (merge) {rec['jid']}")
+        if self.on_written is not None: self.on_written([rec["jid"] for rec, _ in rows])
+
+    def _write_isolated(self, rows):
+        hashes, done = set(), []
+        for rec, payload in rows:
+            self.store.savepoint()
+            try:
+                row_hashes = self._store_attachments([rec])
+                inserted = self.store.upsert_one(payload)
+                self.store.release_savepoint()
+            except Exception as e:
+                self.store.rollback_to_savepoint()
+                METRICS.incr("db_error")
+                print(f"  [DB Error] {rec['jid']}:", e)
+                continue
+            hashes |= row_hashes
+            done.append(rec["jid"])
+            METRICS.incr("db_rows_written")
+            print(f"  ✓ Inserted {rec['jid']}" if rec["jid"] in inserted else f"  ↻ Updated (merge) {rec['jid']}")
+        self.store.commit()
+        self._known_hashes |= hashes
+        if self.on_written is not None: self.on_written(done)
+
+    def close(self):
+        self.flush()
+
+class BackgroundWriter:
+    """DB 阶段：独立线程按入队顺序把记录交给 JobWriter（同一 job 的写入顺序确定），空闲时按 flush_interval 落库。
+    队列有上限，写库跟不上时 add() 阻塞，前面的阶段跟着慢下来；写线程异常在下一次 add() / close() 抛出。"""
+    _STOP = object()
+
+    def __init__(self, writer, maxsize=DB_QUEUE_SIZE):
+        self.writer = writer
+        self.queue = queue.Queue(maxsize=max(1, maxsize))
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        idle = max(0.1, self.writer.flush_interval)
+        try:
+            while True:
+                try: rec = self.queue.get(timeout=idle)
+                except queue.Empty:
+                    self.writer.flush()
+                    continue
+                if rec is self._STOP: break
+                self.writer.add(rec)
+            self.writer.close()
+        except BaseException as e:
+            self.error = e
+
+    def _put(self, item):
+        while True:
+            if self.error is not None:
+                raise RuntimeError("DB writer stopped") from self.error
+            try:
+                self.queue.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                continue
+
+    def add(self, rec):
+        with METRICS.stage("wait_db_queue"):
+            self._put(rec)
+
+    def close(self):
+        if self.thread.is_alive():
+            self._put(self._STOP)
+            self.thread.join()
+        if self.error is not None:
+            raise RuntimeError("DB writer stopped") from self.error
+
+
+# =========================
+# 主流程
+# =========================
+def run(mode=MODE, sync_mode=SYNC_MODE, journal=None, resume=False):
+    """一次完整同步。浏览器 / 数据库都是第一次用到才创建；能全程走直连就不起 Chrome。
+    journal 记录每个 job 完成的阶段；resume=True 时接着日志里没跑完的那次运行，已完成的阶段不再重跑。"""
+    print(f"[MODE] {mode.upper()}")
+    METRICS.set_info(mode=mode, sync_mode=sync_mode, base_url=SEEK_BASE_URL)
+    resumed = bool(resume and journal is not None and journal.load())
+    if resume and not resumed:
+        print("[RESUME] no unfinished run in the journal, starting a new one")
+
+    if SESSION_CREDS.is_valid():
+        print(f"[INFO] reuse cached session credentials ({CRED_CACHE_PATH})")
+        METRICS.incr("credential_cache_hit")
+    else:
+        SESSION_CREDS.ensure()
+
+    if resumed:
+        # 续跑：job 列表取自日志，不再重新收集
+        all_jobs_map, ordered_ids = journal.header["jobs_map"], journal.header["ordered_ids"]
+        process_ids = journal.header["process_ids"]
+        journal.reopen()
+        print(f"[RESUME] run {journal.run_id}: {len(journal.written)}/{len(process_ids)} jobs already written, "
+              f"{len(journal.details)} details / {len(journal.drawers)} drawers cached")
+        METRICS.set_info(resumed_run=journal.run_id)
+        snapshot = get_db().load_snapshot()
+        inc_stats = None
+    else:
+        print("[INFO] Warmup & collect applied jobs via GraphQL...")
+        with METRICS.stage("collect_applied"):
+            all_jobs_map, ordered_ids = collect_all_applied_jobs()
+        print(f"[INIT] collected jobs: {len(ordered_ids)}")
+
+        # 增量模式：只处理新增 / 指纹变化 / 缺 JD 的 job
+        snapshot = get_db().load_snapshot()
+        process_ids = list(ordered_ids)
+        inc_stats = None
+        if sync_mode == "incremental":
+            process_ids, inc_stats = plan_incremental(ordered_ids, all_jobs_map, snapshot)
+            print(f"[INCREMENTAL] new {inc_stats['new']}, changed {inc_stats['changed']}, "
+                  f"incomplete {inc_stats['incomplete']}, unchanged {inc_stats['skipped']} (skipped)")
+        if mode == "test":
+            process_ids = process_ids[:20]
+            print("[TEST] processing first 20 items only.")
+        if journal is not None:
+            if journal.load():
+                print(f"[WARN] discarding unfinished run {journal.run_id} in {journal.path} (use --resume to continue it)")
+            journal.start(mode=mode, sync_mode=sync_mode, ordered_ids=ordered_ids,
+                          process_ids=process_ids, jobs_map=all_jobs_map)
+
+    # 已提交进库的 job 整条跳过；日志里已有的详情 / ApplicantCount / 抽屉结果直接用
+    written = journal.written if resumed else set()
+    pending = [jid for jid in process_ids if jid not in written]
+    # 日志里只有引用，内容处理到这个 job 时才从 blobs 读
+    cached_details = journal.details if resumed else {}
+    cached_drawers = journal.drawers if resumed else {}
+    for jid, (_, variant) in cached_details.items():
+        if variant and jid in all_jobs_map: all_jobs_map[jid]["detail_variant"] = variant
+
+    # 流水线：HTTP 阶段（详情预取线程池）→ 主线程（浏览器：抽屉 / 下载 / Selenium 回退，按顺序组装记录）
+    # → DB 阶段（写库线程）。阶段之间是有界窗口 / 队列，互相等的时候前面的阶段自然停下；不可变的过期 job 不抓详情
+    detail_ids, frozen_ids = plan_detail_fetch(pending, all_jobs_map, snapshot)
+    detail_ids = [jid for jid in detail_ids if jid not in cached_details]
+    detail_set = set(detail_ids)
+    METRICS.incr("detail_skipped_immutable", len(frozen_ids))
+    METRICS.set_info(jobs_collected=len(ordered_ids), jobs_to_process=len(pending))
+    print(f"[INFO] Fetching {len(detail_ids)} detail pages (concurrency={DETAIL_CONCURRENCY}, prefetch={DETAIL_PREFETCH}), "
+          f"{len(frozen_ids)} expired jobs already complete (skipped)...")
+    details = DetailPrefetcher(detail_ids, all_jobs_map,
+                               on_result=journal.record_detail if journal is not None else None)
+
+    # SEEK 源的 ApplicantCount 批量直连拿（和详情预取同时进行），抽屉里只剩下载
+    seek_ids = [j for j in pending if not (all_jobs_map.get(j) or {}).get("is_external", True)]
+    if resumed and journal.counts is not None:
+        competitor_counts = journal.counts
+    else:
+        with METRICS.stage("applicant_counts"):
+            competitor_counts = collect_applicant_counts(seek_ids, all_jobs_map)
+        if journal is not None: journal.record_counts(competitor_counts)
+
+    writer = BackgroundWriter(JobWriter(get_db(), on_written=journal.record_written if journal is not None else None))
+    list_pos = {jid: i for i, jid in enumerate(ordered_ids)}
+
+    # SEEK 源的抽屉（ApplicantCount 兜底 + CV/CL 下载）：DRAWER_TABS > 1 时多 tab 并行，结果仍按 process_ids 顺序交回
+    # page 取回放拿到的真实页码；回退路径才按 job 在完整列表里的位置估算
+    drawer_ids = plan_drawers(seek_ids, snapshot, competitor_counts, frozen_ids, all_jobs_map)
+    METRICS.incr("drawer_skipped_complete", len(seek_ids) - len(drawer_ids))
+    drawer_jobs = [(jid, all_jobs_map[jid].get("page_idx") or list_pos[jid] // 20 + 1, competitor_counts.get(jid))
+                   for jid in drawer_ids if jid not in cached_drawers]
+    drawer_set = {jid for jid, _, _ in drawer_jobs}
+    print(f"[INFO] {len(drawer_jobs)} drawers to visit, {len(seek_ids) - len(drawer_ids)} already complete (skipped)"
+          + (f", {len(drawer_ids) - len(drawer_jobs)} from the journal" if resumed else ""))
+    drawer_pool = open_drawer_pool(len(drawer_jobs))
+    drawer_results = iter_drawer_results(drawer_jobs, drawer_pool)
+
+    # 逐条处理（处理顺序 = 入库顺序）
+    try:
+        for jid in pending:
+            base = all_jobs_map.get(jid, {})
+            if not base:
+                continue
+
+            is_external = base.get("is_external", True)
+
+            # 1) SEEK 源：抽屉页下载 CV/CL（批量没拿到 ApplicantCount 时顺便等一下）
+            competitor = competitor_counts.get(jid)
+            cv_bytes = cl_bytes = None
+            drawer_ok = True
+            drawer_seen = jid in cached_drawers or jid in drawer_set   # 抽屉这次开过（或日志里有）：没显示人数也算拿过了
+            if jid in cached_drawers:
+                cached = journal.drawer(jid)
+                if cached is None: drawer_ok = False   # blob 读坏了：CV/CL 这次缺着，不存指纹，下次重开抽屉
+                else: competitor, cv_bytes, cl_bytes = cached
+            elif jid in drawer_set:
+                drawer_jid, (competitor, cv_bytes, cl_bytes, drawer_ok) = next(drawer_results)
+                assert drawer_jid == jid
+                # 没做完的抽屉不记日志，--resume 时重开
+                if journal is not None and drawer_ok: journal.record_drawer(jid, competitor, cv_bytes, cl_bytes)
+
+            # 2) 详情页（HTTPS 预取结果优先，失败回退 Selenium）
+            if jid in detail_set:
+                field, job_type, jd_text, html_fragment = details.get(jid)
+            else:
+                field, job_type, jd_text, html_fragment = journal.detail(jid) if jid in cached_details else (None, None, None, None)
+            if jid not in frozen_ids and not any([field, job_type, jd_text, html_fragment]):
+                METRICS.incr("fallback_used")
+                with METRICS.stage("selenium_fallback"):
+                    f2, jt2, jd2, html2 = parse_detail_page_via_selenium(detail_url_for(jid, base))
+                field = field or f2; job_type = job_type or jt2; jd_text = jd_text or jd2; html_fragment = html_fragment or html2
+
+            # 3) 时间线/摘要
+            timeline_new = uniq_sorted_timeline(base.get("events"))
+
+            # 有阶段没成功（没拿到 JD、抽屉 / 下载失败、没开抽屉也没拿到 ApplicantCount）：不存指纹，增量同步下次重跑这个 job。
+            # 抽屉开成功了但 SEEK 没显示人数不算失败，否则这个 job 每次都要重开抽屉、重下 CV/CL
+            complete = ((jd_text or jid in frozen_ids or (snapshot.get(jid) or {}).get("has_jd"))
+                        and (is_external or (drawer_ok and (competitor is not None or jid in frozen_ids or drawer_seen))))
+            if not complete: METRICS.incr("job_incomplete")
+
+            # 4) 交给写库线程（按 seek_job_id 合并）
+            writer.add({
+                "jid": jid,
+                "base": base,
                 "field": field,
                 "job_type": job_type,
-                "posted_date": base.get("posted_date"),
-                "salary": base.get("salary"),
-                "competitor_count": str(competitor) if competitor is not None else None,
                 "jd": jd_text,
                 "html_content": html_fragment,
-                "source": source_label,
-                "status_summary": status_summary_new,
-                "status_timeline": Json(timeline_new),
-                "cv_file": psycopg2.Binary(cv_bytes) if cv_bytes else None,
-                "cl_file": psycopg2.Binary(cl_bytes) if cl_bytes else None,
-                "created_at": datetime.utcnow().isoformat()
-            }
-            cur.execute("""
-                INSERT INTO jobsnew (
-                  id, job_url, job_title, company, address, field, job_type,
-                  posted_date, salary, competitor_count, jd, html_content,
-                  source, status_summary, status_timeline, cv_file, cl_file, created_at
-                ) VALUES (
-                  %(id)s, %(job_url)s, %(job_title)s, %(company)s, %(address)s, %(field)s, %(job_type)s,
-                  %(posted_date)s, %(salary)s, %(competitor_count)s, %(jd)s, %(html_content)s,
-                  %(source)s, %(status_summary)s, %(status_timeline)s, %(cv_file)s, %(cl_file)s, %(created_at)s
-                )
-            """, payload)
-            print(f"  ✓ Inserted {jid}")
-
-        PG_CONN.commit()
-    except Exception as e:
-        PG_CONN.rollback()
-        print("  [DB Error]", e)
-
-    # TEST 模式可只跑前若干项
-    if MODE == "test" and idx >= 19:
-        print("[TEST] processed first 20 items, stopping.")
-        break
-
-# 清理
-try: driver.quit()
-except Exception: pass
-cur.close(); PG_CONN.close()
-print("✅ All done.")
+                "competitor": competitor,
+                "cv_bytes": cv_bytes,
+                "cl_bytes": cl_bytes,
+                "timeline": timeline_new,
+                "status_summary": timeline_new[-1]["status"] if timeline_new else "Applied",
+                "job_url": detail_url_for(jid, base),
+                "source": "SEEK" if not is_external else "External",
+                "fingerprint": job_fingerprint(base) if complete else None,
+            })
+    except BaseException:
+        # 崩溃前已组装好的记录尽量落库（续跑时少做一点），再往外抛
+        details.close()
+        try: writer.close()
+        except Exception as e: print("[WARN] pending writes lost:", e)
+        raise
+    finally:
+        # 先停掉抽屉结果生成器（等在跑的 tab 做完），再关 tab 和它们的 DevTools 连接
+        drawer_results.close()
+        if drawer_pool is not None: drawer_pool.close()
+
+    writer.close()
+    details.close()
+    if journal is not None: journal.finish()
+    METRICS.set_info(pace_rates=PACER.rates(), browser_launched=driver is not None)
+    METRICS.status = "ok"
+    if inc_stats is not None:
+        print(f"[INCREMENTAL] processed {len(pending)}, skipped {inc_stats['skipped']} unchanged")
+    if driver is None:
+        print("[INFO] finished without launching Chrome")
+
+
+def main(argv=None):
+    global PAGE_ARCHIVE
+    ap = argparse.ArgumentParser(description="同步 SEEK 投递记录到 Postgres（环境变量见文件头）")
+    ap.add_argument("--mode", choices=("prod", "test"), default=MODE, help="test 只处理前 20 条（默认取 MODE）")
+    ap.add_argument("--sync-mode", choices=("full", "incremental"), default=SYNC_MODE,
+                    help="incremental 跳过指纹未变的 job（默认取 SYNC_MODE）")
+    ap.add_argument("--resume", action="store_true",
+                    help="接着进度日志（RUN_JOURNAL_PATH）里没跑完的那次运行，已完成的 job / 阶段不再重跑")
+    args = ap.parse_args(argv)
+
+    atexit.register(_write_run_report)
+    PAGE_ARCHIVE = PageArchive(PAGE_ARCHIVE_PATH) if ARCHIVE_PAGES else None
+    journal = RunJournal(RUN_JOURNAL_PATH) if RUN_JOURNAL_PATH else None
+    if args.resume and journal is None:
+        ap.error("--resume needs RUN_JOURNAL_PATH")
+    try:
+        run(args.mode, args.sync_mode, journal=journal, resume=args.resume)
+    finally:
+        # 清理
+        close_driver()
+        close_db()
+        if journal is not None: journal.close()
+        if PAGE_ARCHIVE is not None: PAGE_ARCHIVE.close()
+    print("✅ All done.")
+
+
+if __name__ == "__main__":
+    main()
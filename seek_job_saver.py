@@ -16,6 +16,8 @@ from dateutil.relativedelta import relativedelta
 from dateutil import parser as date_parser
 from datetime import datetime, timedelta
 
+from seek_parser import parse_job_page
+
 # Load .env file
 load_dotenv()
 # -----------------------------
@@ -211,12 +213,17 @@ while True:
         except:
             print(f"[Warn] JD page didn't load properly: {job_url}")
 
-        job_title  = safe_text(By.CSS_SELECTOR, "h1[data-automation='job-detail-title']")
-        company    = safe_text(By.CSS_SELECTOR, "span[data-automation='advertiser-name']")
-        address    = safe_text(By.CSS_SELECTOR, "span[data-automation='job-detail-location']")
-        field      = safe_text(By.CSS_SELECTOR, "span[data-automation='job-detail-classifications']")
-        job_type   = safe_text(By.CSS_SELECTOR, "span[data-automation='job-detail-work-type']")
-        jd_text    = safe_text(By.CSS_SELECTOR, "div[data-automation='jobAdDetails']")
+        # One pass over page_source instead of six find_element round-trips
+        try:
+            page = parse_job_page(driver.page_source)
+        except Exception:
+            page = {}
+        job_title  = page.get("title")    or safe_text(By.CSS_SELECTOR, "h1[data-automation='job-detail-title']")
+        company    = page.get("company")  or safe_text(By.CSS_SELECTOR, "span[data-automation='advertiser-name']")
+        address    = page.get("location") or safe_text(By.CSS_SELECTOR, "span[data-automation='job-detail-location']")
+        field      = page.get("field")    or safe_text(By.CSS_SELECTOR, "span[data-automation='job-detail-classifications']")
+        job_type   = page.get("job_type") or safe_text(By.CSS_SELECTOR, "span[data-automation='job-detail-work-type']")
+        jd_text    = page.get("jd")       or safe_text(By.CSS_SELECTOR, "div[data-automation='jobAdDetails']")
 
         # Posted … ago -> absolute date
         posted_date = ""
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+SEEK 职位详情页解析（saver_pg.py / page_archive.py / seek_job_saver.py 共用）
+只取需要的几个 data-automation 节点，不为整页建 DOM：
+1) 页面内嵌的 window.SEEK_REDUX_DATA 状态有 job 时，标题 / 公司 / 地点直接从 JSON 取，状态里缺的字段再切 DOM 节点；
+   分类 / 工作类型优先取 DOM 文本（与旧爬虫入库的写法一致），DOM 没有才用状态值（枚举转成 Full time 这种写法）
+2) jobAdDetails 等节点按标签配对从原始 HTML 里切出片段，只解析片段本身
+3) 切片失败（标签不配对等）才回退到 SoupStrainer 限定节点的整页解析
+"""
+import re, json
+from bs4 import BeautifulSoup, SoupStrainer
+
+VERIFICATION_HINTS = ("verify you are human", "hcaptcha", "robot check", "unusual traffic", "cloudflare")
+
+_STATE_MARKERS = ("window.SEEK_REDUX_DATA", "SEEK_REDUX_DATA")
+_DECODER = json.JSONDecoder()
+_TAG_RE = re.compile(r"<([a-zA-Z][a-zA-Z0-9]*)")
+_AUTOMATION_NODES = ("jobAdDetails", "job-detail-title", "advertiser-name", "job-detail-location",
+                     "job-detail-classifications", "job-detail-work-type")
+
+
+def is_verification_page(html):
+    lower = (html or "").lower()
+    return any(k in lower for k in VERIFICATION_HINTS)
+
+
+# ---------- 内嵌状态 ----------
+def _embedded_job(html):
+    """解析 SEEK_REDUX_DATA，返回 job 字典；没有或不是合法 JSON 时返回 None。"""
+    for marker in _STATE_MARKERS:
+        i = html.find(marker)
+        if i < 0: continue
+        start = html.find("{", i)
+        if start < 0: return None
+        try:
+            state, _ = _DECODER.raw_decode(html, start)
+        except ValueError:
+            return None
+        for path in (("jobdetails", "result", "job"), ("jobDetails", "result", "job"), ("jobdetails", "job")):
+            node = state
+            for k in path:
+                node = node.get(k) if isinstance(node, dict) else None
+            if isinstance(node, dict):
+                return node
+        return None
+    return None
+
+def _label(v):
+    if isinstance(v, dict):
+        return v.get("label") or v.get("name") or v.get("description")
+    if isinstance(v, list):
+        labels = [_label(x) for x in v]
+        return ", ".join(x for x in labels if x) or None
+    return v if isinstance(v, str) and v else None
+
+def _work_type(v):
+    """状态里可能是枚举（FULL_TIME），转成页面上的写法（Full time），与已入库的值一致。"""
+    if v and re.fullmatch(r"[A-Z_]+", v):
+        return v.replace("_", " ").capitalize()
+    return v
+
+def _fields_from_state(job):
+    return {
+        "title": job.get("title"),
+        "company": _label(job.get("advertiser")),
+        "location": _label(job.get("location")) or _label(job.get("locations")),
+        "field": _label(job.get("classifications")) or _label(job.get("classification")),
+        "job_type": _work_type(_label(job.get("workTypes")) or _label(job.get("workType"))),
+        "content": job.get("content") if isinstance(job.get("content"), str) else None,
+    }
+
+
+# ---------- 片段切取 ----------
+def _find_node(html, automation):
+    for quote in ('"', "'"):
+        i = html.find(f"data-automation={quote}{automation}{quote}")
+        if i >= 0: return i
+    return -1
+
+def _slice_node(html, automation):
+    """按 data-automation 找到起始标签，同名标签计数配对，切出该元素完整的 outerHTML。"""
+    i = _find_node(html, automation)
+    if i < 0: return None
+    start = html.rfind("<", 0, i)
+    m = _TAG_RE.match(html, start)
+    if start < 0 or not m: return None
+    tag = m.group(1).lower()
+    pat = re.compile(rf"<(/?){tag}\b[^>]*>", re.I)
+    depth = 0
+    for t in pat.finditer(html, start):
+        if t.group(1):
+            depth -= 1
+            if depth == 0:
+                return html[start:t.end()]
+        elif not t.group(0).endswith("/>"):
+            depth += 1
+    return None
+
+def _parse_fragment(fragment, automation):
+    soup = BeautifulSoup(fragment, "lxml")
+    return soup.find(attrs={"data-automation": automation})
+
+def _restricted_nodes(html):
+    """回退：整页过一遍，但只为 data-automation 节点建树。"""
+    strainer = SoupStrainer(attrs={"data-automation": lambda v: v in _AUTOMATION_NODES})
+    soup = BeautifulSoup(html, "lxml", parse_only=strainer)
+    return {name: soup.find(attrs={"data-automation": name}) for name in _AUTOMATION_NODES}
+
+
+# ---------- 对外接口 ----------
+def parse_job_page(html):
+    """详情页 → dict(title, company, location, field, job_type, jd, html_content, verification)。"""
+    out = dict.fromkeys(("title", "company", "location", "field", "job_type", "jd", "html_content"))
+    out["verification"] = is_verification_page(html)
+    if not html or out["verification"]:
+        return out
+
+    job = _embedded_job(html)
+    state = _fields_from_state(job) if job else {}
+    for k in ("title", "company", "location", "field", "job_type"):
+        out[k] = state.get(k) or None
+
+    # 分类 / 工作类型总是切 DOM（页面上的写法，与已入库的值一致）；其它字段状态里缺了才切
+    nodes = {}
+    need = ["jobAdDetails", "job-detail-classifications", "job-detail-work-type"]
+    need += [name for k, name in (("title", "job-detail-title"), ("company", "advertiser-name"),
+                                  ("location", "job-detail-location")) if not out[k]]
+    sliced_ok = True
+    for name in need:
+        frag = _slice_node(html, name)
+        if frag is None:
+            # 节点不在页面上是正常的（已下线的 job 没有分类等）；在但切不出来（标签不配对）才整页回退
+            if _find_node(html, name) >= 0 or name == "jobAdDetails" and not state.get("content"):
+                sliced_ok = False
+            continue
+        nodes[name] = _parse_fragment(frag, name)
+    if not sliced_ok:
+        nodes = {k: v for k, v in _restricted_nodes(html).items() if v is not None} | nodes
+
+    jd_node = nodes.get("jobAdDetails")
+    if jd_node is None and state.get("content"):
+        jd_node = _parse_fragment(f'<div data-automation="jobAdDetails">{state["content"]}</div>', "jobAdDetails")
+    if jd_node is not None:
+        out["jd"] = jd_node.get_text("\n", strip=True) or None
+        out["html_content"] = str(jd_node)
+
+    def _text(name, inner=None, sep=" "):
+        node = nodes.get(name)
+        if node is None: return None
+        if inner is not None:
+            node = node.find(inner)
+            if node is None: return None
+        return node.get_text(sep, strip=True) or None
+
+    out["title"] = out["title"] or _text("job-detail-title")
+    out["company"] = out["company"] or _text("advertiser-name")
+    out["location"] = out["location"] or _text("job-detail-location")
+    out["field"] = _text("job-detail-classifications", "a", "") or out["field"]
+    out["job_type"] = _text("job-detail-work-type", "a", "") or out["job_type"]
+    return out
+
+def parse_detail(html):
+    """saver_pg 用的四元组：(field, job_type, jd, html_content)。"""
+    r = parse_job_page(html)
+    return (r["field"], r["job_type"], r["jd"], r["html_content"])
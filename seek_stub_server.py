@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+"""
+SEEK 本地替身站（基准 / 回归用，只依赖标准库）
+saver_pg.py 设 SEEK_BASE_URL=http://127.0.0.1:<port> 即可整条流程跑在本机：
+  GET  /my-activity/applied-jobs              列表页：JS 调 appliedJobs GraphQL，滚到底加载下一页；下发 cf_clearance
+  GET  /my-activity/applied-jobs/<id>?page=N  列表页 + 抽屉：JS 调 jobDetails GraphQL（ApplicantCount），CV / CL 两个下载按钮
+  POST /graphql                               appliedJobs（游标分页，每页 20）/ jobDetails
+  GET  /job/<id>   /expiredjob/<id>           详情页；在招职位带 SEEK_REDUX_DATA，过期职位的 /job/ 返回 404
+  GET  /download/<id>/cv|cl                   附件（所有 job 共用同一份 CV，CL 每个 job 不同）
+  GET  /__stats    POST /__reset              按路由类别统计请求数、首末时间，bench_e2e.py 用来拆分各阶段耗时
+没带 cf_clearance 的请求、以及按 --verify-rate 抽中的请求返回验证页；--fail-rate 随机 503；--latency-ms 模拟网络往返；
+--throttle-rps 超过该速率的请求回 429 + Retry-After（测 saver_pg 的自适应限速）。
+    python seek_stub_server.py --jobs 500 --port 8765 --latency-ms 80 --fail-rate 0.02
+"""
+import re, json, time, random, secrets, argparse, threading
+from functools import lru_cache
+from html import escape
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+
+PAGE_SIZE = 20
+FIRST_JOB_ID = 80000000
+
+_TITLES = ("Platform Engineer", "Data Analyst", "Backend Developer", "Site Reliability Engineer",
+           "Frontend Developer", "QA Engineer", "Cloud Architect", "Business Analyst", "DevOps Engineer")
+_LEVELS = ("", "Senior ", "Junior ", "Lead ", "Intermediate ")
+_COMPANIES = ("Acme Technology Ltd", "Kiwi Data Co", "Southern Cloud", "Harbour Bank", "Tui Software",
+              "Pacific Logistics", "Aotearoa Health", "Northland Energy")
+_LOCATIONS = ("Auckland CBD, Auckland", "Wellington Central, Wellington", "Christchurch Central, Canterbury",
+              "Hamilton, Waikato", "Remote")
+_FIELDS = ("Developers/Programmers (Information & Communication Technology)",
+           "Engineering - Software (Information & Communication Technology)",
+           "Testing & Quality Assurance (Information & Communication Technology)",
+           "Business/Systems Analysts (Information & Communication Technology)")
+_WORK_TYPES = ("Full time", "Contract/Temp", "Part time")
+_WORDS = ("team", "service", "cloud", "python", "kubernetes", "deliver", "quality", "design", "customer",
+          "pipeline", "secure", "data", "automation", "stakeholder", "review", "scale", "modern", "build")
+_STATUSES = ("Applied", "Viewed by employer", "Application in progress", "Not suitable")
+
+VERIFICATION_HTML = ("<!DOCTYPE html><html><head><title>Just a moment...</title></head><body>"
+                     "<h1>Verify you are human by completing the action below.</h1>"
+                     "<p>www.seek.co.nz needs to review the security of your connection before proceeding.</p>"
+                     "<p>Performance &amp; security by Cloudflare</p></body></html>")
+
+
+class StubSite:
+    """替身站的数据与统计。同一 seed 生成同一批 job，多次运行结果可比。"""
+    def __init__(self, jobs=50, seed=1, latency_ms=0.0, fail_rate=0.0, verify_rate=0.0,
+                 external_rate=0.3, inactive_rate=0.3, page_kb=200, attachment_kb=60, throttle_rps=0.0):
+        self.latency = latency_ms / 1000.0
+        self.throttle_rps = throttle_rps
+        self._bucket = [throttle_rps, time.monotonic()]   # 令牌数, 上次补充时间；桶容量 = 1 秒的量
+        self.fail_rate = fail_rate
+        self.verify_rate = verify_rate
+        self.page_kb = page_kb
+        self.token = secrets.token_hex(16)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.stats = {}
+        self.jobs = [self._make_job(FIRST_JOB_ID + i, random.Random(seed * 1000003 + i), external_rate, inactive_rate)
+                     for i in range(jobs)]
+        self.by_id = {j["id"]: j for j in self.jobs}
+        pad = b"%" + bytes(80) + b"\n"
+        self.cv = b"%PDF-1.4\n% CV\n" + pad * (attachment_kb * 1024 // len(pad))
+
+    @staticmethod
+    def _make_job(job_id, rng, external_rate, inactive_rate):
+        events, day = [], rng.randint(1, 20)
+        for st in _STATUSES[:rng.randint(1, 3)]:
+            events.append({"status": st, "timestamp": {
+                "shortAbsoluteLabel": f"{day} Sep 2026", "dateTimeUtc": f"2026-09-{day:02d}T09:00:00Z"}})
+            day += rng.randint(1, 4)
+        return {
+            "id": str(job_id),
+            "title": rng.choice(_LEVELS) + rng.choice(_TITLES),
+            "company": rng.choice(_COMPANIES),
+            "location": rng.choice(_LOCATIONS),
+            "field": rng.choice(_FIELDS),
+            "work_type": rng.choice(_WORK_TYPES),
+            "salary": rng.choice((None, "$90,000 – $110,000", "$120k - $140k + KiwiSaver")),
+            "posted": f"{rng.randint(1, 28)} Aug 2026",
+            "is_external": rng.random() < external_rate,
+            "is_active": rng.random() >= inactive_rate,
+            "applicants": rng.randint(3, 400),
+            "events": events,
+            "paragraphs": [" ".join(rng.choice(_WORDS) for _ in range(40)).capitalize() + "."
+                           for _ in range(rng.randint(4, 9))],
+        }
+
+    def chance(self, rate):
+        if rate <= 0: return False
+        with self._rng_lock:
+            return self._rng.random() < rate
+
+    def throttled(self):
+        """服务端令牌桶：超速返回 True。"""
+        if self.throttle_rps <= 0: return False
+        with self._rng_lock:
+            now = time.monotonic()
+            tokens = min(self.throttle_rps, self._bucket[0] + (now - self._bucket[1]) * self.throttle_rps)
+            self._bucket[1] = now
+            if tokens < 1.0:
+                self._bucket[0] = tokens
+                return True
+            self._bucket[0] = tokens - 1.0
+            return False
+
+    def record(self, kind, started, status, size):
+        with self._stats_lock:
+            st = self.stats.setdefault(kind, {"count": 0, "errors": 0, "bytes": 0, "first": started, "last": started})
+            st["count"] += 1
+            st["bytes"] += size
+            if status >= 400: st["errors"] += 1
+            st["first"] = min(st["first"], started)
+            st["last"] = max(st["last"], time.time())
+
+    def snapshot(self):
+        with self._stats_lock:
+            return {k: dict(v) for k, v in self.stats.items()}
+
+    def reset(self):
+        with self._stats_lock:
+            self.stats.clear()
+
+    # ---------- GraphQL ----------
+    def applied_jobs(self, variables):
+        first = int(variables.get("first") or PAGE_SIZE)
+        after = variables.get("after")
+        start = int(after.split(":", 1)[1]) if after and after.startswith("cursor:") else 0
+        chunk = self.jobs[start:start + first]
+        end = start + len(chunk)
+        edges = [{"node": {
+            "job": {"id": j["id"], "title": j["title"], "advertiser": {"name": j["company"]},
+                    "location": {"label": j["location"]},
+                    "salary": {"label": j["salary"]} if j["salary"] else None,
+                    "createdAt": {"label": j["posted"]}},
+            "events": j["events"], "isActive": j["is_active"], "isExternal": j["is_external"],
+        }, "cursor": f"cursor:{start + i + 1}"} for i, j in enumerate(chunk)]
+        return {"data": {"viewer": {"appliedJobs": {
+            "edges": edges, "total": len(self.jobs),
+            "pageInfo": {"endCursor": f"cursor:{end}", "hasNextPage": end < len(self.jobs)}}}}}
+
+    def job_details(self, variables):
+        job = self.by_id.get(str(variables.get("jobId") or ""))
+        if job is None:
+            return {"data": {"jobDetails": None}}
+        return {"data": {"jobDetails": {"id": job["id"], "insights": [
+            {"__typename": "ApplicantCount", "count": job["applicants"]}]}}}
+
+    # ---------- 页面 ----------
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def _filler(page_kb):
+        """体积接近真实详情页：一半样式规则、一半导航链接。"""
+        half = page_kb * 512
+        out = []
+        for make in (lambda i: f".c{i}{{margin:{i % 9}px;padding:{i % 5}px;color:#{i % 1000:03d}}}",
+                     lambda i: f'<a class="c{i % 400}" href="/n{i}">Nav {i}</a>'):
+            parts, size, i = [], 0, 0
+            while size < half:
+                parts.append(make(i)); size += len(parts[-1]); i += 1
+            out.append("".join(parts))
+        return tuple(out)
+
+    @lru_cache(maxsize=4096)
+    def job_page(self, job_id, expired):
+        job = self.by_id[job_id]
+        body = "".join(f"<p>{escape(p)}</p>" for p in job["paragraphs"])
+        css, nav = self._filler(self.page_kb)
+        state = ""
+        if not expired:
+            state = "<script>window.SEEK_REDUX_DATA = " + json.dumps({"jobdetails": {"result": {"job": {
+                "id": job_id, "title": job["title"], "content": body,
+                "advertiser": {"name": job["company"]}, "location": {"label": job["location"]},
+                "classifications": [{"label": job["field"]}], "workTypes": {"label": job["work_type"]},
+            }}}}).replace("</", "<\\/") + ";</script>"
+        return (
+            f'<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>{escape(job["title"])} - SEEK</title>'
+            f'<style>{css}</style></head><body><div id="app"><header>{nav}</header><main>'
+            + ('<div class="expired">This job is no longer advertised</div>' if expired else "")
+            + f'<h1 data-automation="job-detail-title">{escape(job["title"])}</h1>'
+            f'<span data-automation="advertiser-name">{escape(job["company"])}</span>'
+            f'<span data-automation="job-detail-location"><a href="/jobs/in">{escape(job["location"])}</a></span>'
+            f'<span data-automation="job-detail-classifications"><a href="/jobs-in">{escape(job["field"])}</a></span>'
+            f'<span data-automation="job-detail-work-type"><a href="/type">{escape(job["work_type"])}</a></span>'
+            f'<div data-automation="jobAdDetails"><div>{body}</div></div>'
+            f"</main></div>{state}</body></html>"
+        )
+
+    def applied_page(self, job_id=None):
+        drawer_js = ""
+        if job_id is not None:
+            drawer_js = _DRAWER_JS.replace("__JOB_ID__", json.dumps(job_id))
+        return _APPLIED_HTML.replace("/*__DRAWER__*/", drawer_js)
+
+
+_GQL_APPLIED = ("query GetAppliedJobs($first: Int, $after: String) { viewer { appliedJobs(first: $first, after: $after) "
+                "{ edges { node { job { id title } events { status } isActive isExternal } } pageInfo { endCursor hasNextPage } } } }")
+_GQL_DETAILS = "query GetJobDetails($jobId: ID!) { jobDetails(id: $jobId) { id insights { __typename ... on ApplicantCount { count } } } }"
+
+_APPLIED_HTML = """<!DOCTYPE html><html lang="en"><head><meta charset="utf-8"><title>Applied jobs - SEEK</title></head>
+<body><h1>Applied jobs</h1><div id="tabs-saved-applied_2_panel"><div></div><div id="jobs"></div></div>
+<script>
+const Q_APPLIED = %s, Q_DETAILS = %s;
+let after = null, loading = false, done = false;
+async function gql(op, variables, query) {
+  const r = await fetch("/graphql", {method: "POST", headers: {"content-type": "application/json"},
+    body: JSON.stringify({operationName: op, variables: variables, query: query})});
+  return r.json();
+}
+async function loadPage() {
+  if (loading || done) return;
+  loading = true;
+  try {
+    const d = await gql("GetAppliedJobs", {first: 20, after: after}, Q_APPLIED);
+    const p = d.data.viewer.appliedJobs, list = document.getElementById("jobs");
+    for (const e of p.edges) {
+      const row = document.createElement("div");
+      row.style.height = "70px";
+      row.innerHTML = '<span role="button"><span>Job Title </span>' + e.node.job.title + "</span>";
+      list.appendChild(row);
+    }
+    after = p.pageInfo.endCursor; done = !p.pageInfo.hasNextPage;
+  } finally { loading = false; }
+}
+window.addEventListener("scroll", () => {
+  if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 400) loadPage();
+});
+loadPage();
+/*__DRAWER__*/
+</script></body></html>""" % (json.dumps(_GQL_APPLIED), json.dumps(_GQL_DETAILS))
+
+# 抽屉结构对上 saver_pg 的 CV_BUTTON_XPATH / CL_BUTTON_XPATH：div[1]/div[2]/div[3]/span[2|3]/span
+_DRAWER_JS = """
+(async () => {
+  const jobId = __JOB_ID__;
+  const d = await gql("GetJobDetails", {jobId: jobId}, Q_DETAILS);
+  const count = ((d.data.jobDetails || {}).insights || [{}])[0].count;
+  const drawer = document.createElement("div");
+  drawer.id = "drawer-view-" + jobId;
+  drawer.innerHTML = '<div><div><button aria-label="Close">x</button></div><div><div>' + count + ' applicants</div><div></div>'
+    + '<div><span>Documents</span><span><span role="button" data-doc="cv">Resume</span></span>'
+    + '<span><span role="button" data-doc="cl">Cover letter</span></span></div></div></div>';
+  drawer.addEventListener("click", (ev) => {
+    const doc = ev.target.getAttribute("data-doc");
+    if (!doc) return;
+    const a = document.createElement("a");
+    a.href = "/download/" + jobId + "/" + doc; a.download = "";
+    document.body.appendChild(a); a.click(); a.remove();
+  });
+  document.body.appendChild(drawer);
+})();
+"""
+
+_JOB_PATH = re.compile(r"^/(job|expiredjob)/(\d+)$")
+_DRAWER_PATH = re.compile(r"^/my-activity/applied-jobs/(\d+)$")
+_DOWNLOAD_PATH = re.compile(r"^/download/(\d+)/(cv|cl)$")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive，与真实站点一样复用连接
+    site = None                     # serve() 里按 server 绑定
+
+    def log_message(self, *args):
+        pass
+
+    def _has_clearance(self):
+        return f"cf_clearance={self.site.token}" in (self.headers.get("Cookie") or "")
+
+    def _send(self, kind, started, status, body, ctype="text/html; charset=utf-8", extra=None):
+        data = body if isinstance(body, bytes) else body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (extra or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+        self.site.record(kind, started, status, len(data))
+
+    def _delay(self):
+        if self.site.latency > 0:
+            time.sleep(self.site.latency * random.uniform(0.5, 1.5))
+
+    def _gate(self, kind, started):
+        """Cloudflare / 故障模拟：返回 True 表示已经替调用方回了响应。"""
+        self._delay()
+        if self.site.throttled():
+            self._send("throttled", started, 429, "Too Many Requests", "text/plain", {"Retry-After": "1"})
+            return True
+        if self.site.chance(self.site.fail_rate):
+            self._send(kind, started, 503, "Service Unavailable", "text/plain")
+            return True
+        if not self._has_clearance() or self.site.chance(self.site.verify_rate):
+            self._send("verification", started, 200, VERIFICATION_HTML)
+            return True
+        return False
+
+    def do_GET(self):
+        started = time.time()
+        parts = urlsplit(self.path)
+        path = parts.path.rstrip("/") or "/"
+        if path == "/__stats":
+            return self._send("__stats", started, 200, json.dumps(self.site.snapshot()), "application/json")
+
+        if path == "/my-activity/applied-jobs" or _DRAWER_PATH.match(path):
+            m = _DRAWER_PATH.match(path)
+            self._delay()
+            cookie = f"cf_clearance={self.site.token}; Path=/; Max-Age=86400; SameSite=Lax"
+            return self._send("drawer_page" if m else "list_page", started, 200,
+                              self.site.applied_page(m.group(1) if m else None), extra={"Set-Cookie": cookie})
+
+        m = _JOB_PATH.match(path)
+        if m:
+            expired = m.group(1) == "expiredjob"
+            kind = "expired_page" if expired else "job_page"
+            if self._gate(kind, started): return
+            job = self.site.by_id.get(m.group(2))
+            if job is None or (not expired and not job["is_active"]):
+                return self._send(kind, started, 404, "<html><body><h1>Page not found</h1></body></html>")
+            return self._send(kind, started, 200, self.site.job_page(job["id"], expired))
+
+        m = _DOWNLOAD_PATH.match(path)
+        if m:
+            if self._gate("download", started): return
+            jid, doc = m.groups()
+            if jid not in self.site.by_id:
+                return self._send("download", started, 404, "not found", "text/plain")
+            body = self.site.cv if doc == "cv" else (f"%PDF-1.4\n% Cover letter for {jid}\n".encode() + bytes(2048))
+            return self._send("download", started, 200, body, "application/pdf",
+                              {"Content-Disposition": f'attachment; filename="{doc}_{jid}.pdf"'})
+
+        self._send("other", started, 404, "not found", "text/plain")
+
+    def do_POST(self):
+        started = time.time()
+        path = urlsplit(self.path).path
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if path == "/__reset":
+            self.site.reset()
+            return self._send("__reset", started, 204, b"")
+        if path != "/graphql":
+            return self._send("other", started, 404, "not found", "text/plain")
+        try:
+            payload = json.loads(raw or b"{}")
+        except ValueError:
+            return self._send("graphql", started, 400, '{"errors":[{"message":"bad json"}]}', "application/json")
+        op = payload.get("operationName") or ""
+        kind = {"GetAppliedJobs": "graphql_applied_jobs", "GetJobDetails": "graphql_job_details"}.get(op, "graphql")
+        self._delay()
+        if self.site.throttled():
+            return self._send("throttled", started, 429, '{"errors":[{"message":"rate limited"}]}',
+                              "application/json", {"Retry-After": "1"})
+        if self.site.chance(self.site.fail_rate):
+            return self._send(kind, started, 503, '{"errors":[{"message":"unavailable"}]}', "application/json")
+        if not self._has_clearance():
+            return self._send(kind, started, 403, '{"errors":[{"message":"forbidden"}]}', "application/json")
+        variables = payload.get("variables") or {}
+        if kind == "graphql_applied_jobs":
+            data = self.site.applied_jobs(variables)
+        elif kind == "graphql_job_details":
+            data = self.site.job_details(variables)
+        else:
+            data = {"errors": [{"message": f"unknown operation {op!r}"}]}
+        self._send(kind, started, 200, json.dumps(data), "application/json")
+
+
+def serve(site, host="127.0.0.1", port=0):
+    """起一个后台线程跑替身站，返回 (server, base_url)；server.shutdown() 停止。"""
+    handler = type("BoundStubHandler", (StubHandler,), {"site": site})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="SEEK 本地替身站")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--jobs", type=int, default=50, help="applied jobs 数量")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="每个请求的平均延迟（±50%% 抖动）")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="GraphQL / 详情 / 下载随机 503 的比例")
+    ap.add_argument("--verify-rate", type=float, default=0.0, help="即使带了 cf_clearance 也返回验证页的比例")
+    ap.add_argument("--external-rate", type=float, default=0.3, help="外部投递（无抽屉）的比例")
+    ap.add_argument("--inactive-rate", type=float, default=0.3, help="已过期职位的比例")
+    ap.add_argument("--page-kb", type=int, default=200, help="详情页大致体积")
+    ap.add_argument("--throttle-rps", type=float, default=0.0, help="超过该速率回 429（0 = 不限）")
+    args = ap.parse_args()
+
+    site = StubSite(jobs=args.jobs, seed=args.seed, latency_ms=args.latency_ms, fail_rate=args.fail_rate,
+                    verify_rate=args.verify_rate, external_rate=args.external_rate,
+                    inactive_rate=args.inactive_rate, page_kb=args.page_kb, throttle_rps=args.throttle_rps)
+    server, base_url = serve(site, args.host, args.port)
+    print(f"[STUB] {len(site.jobs)} jobs at {base_url}  (SEEK_BASE_URL={base_url})")
+    try:
+        while True: time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,925 @@
+# -*- coding: utf-8 -*-
+"""
+jobsnew 存储层：同一套表结构（jobsnew + attachments），两个后端
+    store = open_store()                      # DB_BACKEND=postgres（默认）/ sqlite
+    snapshot = store.load_snapshot()          # {seek_job_id: {...}}，增量同步 / 跳过规则用
+    inserted = store.upsert(payloads)         # 新插入的 seek_job_id 集合；已有行在语句里合并
+    store.insert_attachments(...); store.commit()
+- PostgresStore：psycopg2；建表 + 在线迁移（seek_job_id 回填 / 去重 / CONCURRENTLY 唯一索引 / 内联附件搬家），
+  一批一条 execute_values 多行 upsert，逐行重试走 PREPARE 好的语句
+- SQLiteStore：单文件，WAL + synchronous=NORMAL，一批一个事务，INSERT ... ON CONFLICT(seek_job_id) DO UPDATE；
+  单用户 / CI 不需要数据库服务，大批量同步按磁盘速度写，不再每条 fsync
+状态时间线存在 job_events（每个事件一行，唯一键 (job_id, status, event_date, note)，只插不改），
+按 (status, event_date) 建索引；时间线数组从视图 jobsnew_status_timeline 读（按 seek_job_id 连 jobsnew）。
+旧库的 jobsnew.status_timeline 迁移时展开进 job_events，随后改名 status_timeline_legacy 冻结，不再读写。
+全文检索：store.search(query, status=, since=, until=)，Postgres 用 search_tsv（tsvector，触发器维护）+ GIN 索引，
+SQLite 用 FTS5 外部内容表；命令行见 job_search.py
+旧库导入：store.stage_import(payloads) 分批暂存（Postgres 走 COPY），store.merge_import() 一次合并（只补空）；见 migrate_legacy.py
+两个后端的 upsert 语义相同，合并在数据库里一条语句完成，客户端不回读已有行（jd / html_content 不出库）：
+  - job_url / 标题 / 公司 / 地址 / field / job_type / jd / html_content / source：库里为空才补
+  - posted_date / salary / created_at / sync_fingerprint：以新值为准；cv_sha256 / cl_sha256 / detail_variant：新值为空时保留旧值
+  - competitor_count：两边都是数字取大，旧值不是数字用新值
+  - 状态事件 INSERT ... ON CONFLICT DO NOTHING 进 job_events；status_summary 取该 job 按 event_date 排序（空放最后）的最后一条
+"""
+import io, os, re, json, sqlite3, hashlib, itertools
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+DB_BACKEND  = os.getenv("DB_BACKEND", "postgres").lower()   # postgres / sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH", os.path.join(os.getcwd(), "seek_jobs.sqlite3"))
+SEARCH_TS_CONFIG = os.getenv("SEARCH_TS_CONFIG", "english")   # Postgres 全文检索分词配置；改了要清空 search_tsv 重建
+
+
+# =========================
+# 时间线 & 竞争者合并策略（两个后端、迁移、写入共用）
+# =========================
+def merge_timelines(existing, incoming):
+    """合并时间线：去重（status, date, note），再按 date 排序（空放最后）"""
+    def key(t): return (t.get("status",""), t.get("date",""), t.get("note",""))
+    merged = { key(t): t for t in (existing or []) }
+    for t in (incoming or []):
+        merged[key(t)] = t
+    arr = list(merged.values())
+    arr.sort(key=lambda x: (x.get("date","")=="" , x.get("date","")))
+    return arr
+
+def max_competitor(old_txt, new_int):
+    def to_int(x):
+        try: return int(x)
+        except Exception: return None
+    old = to_int(old_txt)
+    if old is None: return str(new_int) if new_int is not None else None
+    if new_int is None: return str(old)
+    return str(max(old, new_int))
+
+
+# =========================
+# 列定义 & upsert 语句
+# =========================
+JOB_COLUMNS = (
+    ("id", "uuid"), ("job_url", "text"), ("job_title", "text"), ("company", "text"),
+    ("address", "text"), ("field", "text"), ("job_type", "text"), ("posted_date", "text"),
+    ("salary", "text"), ("competitor_count", "text"), ("jd", "text"), ("html_content", "text"),
+    ("source", "text"), ("status_summary", "text"),
+    ("cv_sha256", "text"), ("cl_sha256", "text"), ("created_at", "text"), ("seek_job_id", "text"),
+    ("sync_fingerprint", "text"), ("detail_variant", "text"),
+)
+COL_NAMES = [c for c, _ in JOB_COLUMNS]
+KEEP_IF_NULL  = ("cv_sha256", "cl_sha256", "detail_variant")   # 新值为空时保留旧值
+FILL_IF_EMPTY = ("job_url", "job_title", "company", "address", "field", "job_type",
+                 "jd", "html_content", "source")                  # 库里为空才补
+
+def _upsert_set(excluded, competitor, fill_only=False):
+    """ON CONFLICT DO UPDATE 的 SET 子句；competitor 是各后端的人数合并表达式（{old} / {new}）。
+    状态事件在 upsert 之前已写进 job_events（同一事务），status_summary 直接从那里取。
+    fill_only：导入旧数据用，库里已有的值一律保留，只补空。"""
+    sets = []
+    for c in COL_NAMES:
+        if c in ("id", "seek_job_id"): continue
+        if c == "competitor_count": sets.append(f"{c}={competitor.format(old='jobsnew.competitor_count', new=f'{excluded}.competitor_count')}")
+        elif c == "status_summary":
+            keep = "NULLIF(jobsnew.status_summary, ''), " if fill_only else ""
+            sets.append(f"{c}=COALESCE(({LAST_EVENT_SQL.format(job_id=f'{excluded}.seek_job_id')}), {keep}{excluded}.status_summary)")
+        elif c in KEEP_IF_NULL and fill_only: sets.append(f"{c}=COALESCE(jobsnew.{c}, {excluded}.{c})")
+        elif c in KEEP_IF_NULL: sets.append(f"{c}=COALESCE({excluded}.{c}, jobsnew.{c})")
+        elif c in FILL_IF_EMPTY or fill_only: sets.append(f"{c}=COALESCE(NULLIF(jobsnew.{c}, ''), {excluded}.{c})")
+        else: sets.append(f"{c}={excluded}.{c}")
+    return ",\n  ".join(sets)
+
+# 与 merge_timelines 的顺序一致：按 event_date 排序、空放最后，同一天按写入顺序；取最后一条
+LAST_EVENT_SQL = ("SELECT status FROM job_events WHERE job_id = {job_id} "
+                  "ORDER BY event_date = '' DESC, event_date DESC, id DESC LIMIT 1")
+EVENT_COLUMNS = ("job_id", "status", "event_date", "note", "created_at")
+
+def attachment_hash(blob):
+    """attachments 的主键：内容的 SHA-256（十六进制）；空内容返回 None。"""
+    return hashlib.sha256(blob).hexdigest() if blob else None
+
+def timeline_events(payloads, now):
+    """payload 里的 status_timeline（uniq_sorted_timeline 的输出）展开成 job_events 行。"""
+    return [(p["seek_job_id"], t.get("status") or "", t.get("date") or "", t.get("note") or "", now)
+            for p in payloads for t in (p.get("status_timeline") or [])]
+
+
+class JobStore(ABC):
+    """后端接口。写操作都在当前事务里，commit() / rollback() 由调用方（JobWriter）决定；
+    savepoint 系列用于整批失败后逐行重试。同一时刻只能一个线程用。"""
+    backend = None
+
+    @abstractmethod
+    def migrate(self): ...   # 建表 / 迁移，幂等
+    @abstractmethod
+    def load_snapshot(self): ...
+    @abstractmethod
+    def existing_attachments(self, hashes): ...
+    @abstractmethod
+    def insert_attachments(self, rows): ...
+    @abstractmethod
+    def upsert(self, payloads): ...   # 返回新插入（之前不存在）的 seek_job_id 集合
+    def upsert_one(self, payload): return self.upsert([payload])
+    @abstractmethod
+    def update_details(self, rows): ...
+    @abstractmethod
+    def search(self, query, status=None, since=None, until=None, limit=20): ...
+    @abstractmethod
+    def stage_import(self, payloads): ...
+    @abstractmethod
+    def merge_import(self): ...
+    @abstractmethod
+    def savepoint(self): ...
+    @abstractmethod
+    def release_savepoint(self): ...
+    @abstractmethod
+    def rollback_to_savepoint(self): ...
+    @abstractmethod
+    def commit(self): ...
+    @abstractmethod
+    def rollback(self): ...
+    @abstractmethod
+    def close(self): ...
+
+    @staticmethod
+    def _row_values(payload):
+        return [payload.get(c) for c in COL_NAMES]
+
+
+# =========================
+# 批量导入（migrate_legacy.py）：暂存表 → 状态事件 → 按轮合并
+# =========================
+# 同一 job 在暂存表里可能有多行（/job/ 与 /expiredjob/、不同来源）；一条 INSERT ... ON CONFLICT DO UPDATE
+# 不能两次命中同一行，所以按 row_number() 分轮，第 k 轮合并每个 job 的第 k 行（暂存顺序 ord 即优先级）。
+IMPORT_TABLE = "jobsnew_import"
+
+def seek_job_id_from_url(url):
+    m = JOB_ID_FROM_URL_RE.search(url or "")
+    return m.group(1) if m else None
+
+# 新插入的行同样从 job_events 取 status_summary（事件已先写入）
+IMPORT_STATUS_SQL = f"COALESCE(({LAST_EVENT_SQL.format(job_id='s.seek_job_id')}), s.status_summary)"
+
+def _import_round_select(status_summary):
+    cols = ", ".join(status_summary if c == "status_summary" else f"s.{c}" for c in COL_NAMES)
+    return (f"SELECT {cols} FROM (SELECT *, row_number() OVER (PARTITION BY seek_job_id ORDER BY ord) AS rn "
+            f"FROM {IMPORT_TABLE}) s WHERE s.rn = {{rn}}")
+
+
+# =========================
+# PostgreSQL
+# =========================
+JOBSNEW_DDL = """
+CREATE TABLE IF NOT EXISTS jobsnew (
+    id UUID PRIMARY KEY,
+    job_url TEXT UNIQUE,
+    job_title TEXT,
+    company TEXT,
+    address TEXT,
+    field TEXT,
+    job_type TEXT,
+    posted_date TEXT,
+    salary TEXT,
+    competitor_count TEXT,
+    jd TEXT,
+    html_content TEXT,
+    source TEXT,
+    status_summary TEXT,
+    cv_file BYTEA,              -- 旧版内联附件，迁移后为空，见 attachments
+    cl_file BYTEA,
+    created_at TEXT,
+    seek_job_id TEXT,
+    sync_fingerprint TEXT
+)
+"""
+
+# url 里的 job_id（兼容 job/ 与 expiredjob/）
+JOB_ID_FROM_URL_SQL = r"substring(job_url from '/(?:job|expiredjob)/(\d+)(?:\?|$)')"
+JOB_ID_FROM_URL_RE  = re.compile(r"/(?:job|expiredjob)/(\d+)(?:\?|$)")
+SEEK_JOB_ID_INDEX   = "jobsnew_seek_job_id_key"
+
+SCHEMA_UPGRADES = (
+    "ALTER TABLE jobsnew ADD COLUMN IF NOT EXISTS seek_job_id TEXT",
+    "ALTER TABLE jobsnew ADD COLUMN IF NOT EXISTS sync_fingerprint TEXT",
+    # CV/CL 按 SHA-256 去重存一份，jobsnew 只存引用
+    """CREATE TABLE IF NOT EXISTS attachments (
+        sha256 TEXT PRIMARY KEY,
+        content BYTEA NOT NULL,
+        size_bytes INTEGER,
+        created_at TEXT
+    )""",
+    "ALTER TABLE jobsnew ADD COLUMN IF NOT EXISTS cv_sha256 TEXT REFERENCES attachments(sha256)",
+    "ALTER TABLE jobsnew ADD COLUMN IF NOT EXISTS cl_sha256 TEXT REFERENCES attachments(sha256)",
+    # 详情页哪个 URL 变体（job / expiredjob）抓成功过
+    "ALTER TABLE jobsnew ADD COLUMN IF NOT EXISTS detail_variant TEXT",
+    # 全文检索：标题 A / 公司 B / 领域 C / JD D 加权；触发器在每次 upsert / reparse 时维护，相关列没变不重算
+    "ALTER TABLE jobsnew ADD COLUMN IF NOT EXISTS search_tsv tsvector",
+    f"""CREATE OR REPLACE FUNCTION jobsnew_search_doc(title TEXT, company TEXT, field TEXT, jd TEXT)
+        RETURNS tsvector LANGUAGE sql IMMUTABLE AS $$
+        SELECT setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(title, '')), 'A')
+            || setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(company, '')), 'B')
+            || setweight(to_tsvector('{SEARCH_TS_CONFIG}', coalesce(field, '')), 'C')
+            || setweight(to_tsvector('{SEARCH_TS_CONFIG}', left(coalesce(jd, ''), 500000)), 'D')  -- tsvector 上限 1MB
+    $$""",
+    """CREATE OR REPLACE FUNCTION jobsnew_search_tsv() RETURNS trigger LANGUAGE plpgsql AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' OR NEW.search_tsv IS NULL
+           OR NEW.job_title IS DISTINCT FROM OLD.job_title OR NEW.company IS DISTINCT FROM OLD.company
+           OR NEW.field IS DISTINCT FROM OLD.field OR NEW.jd IS DISTINCT FROM OLD.jd THEN
+            NEW.search_tsv := jobsnew_search_doc(NEW.job_title, NEW.company, NEW.field, NEW.jd);
+        END IF;
+        RETURN NEW;
+    END $$""",
+    """DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'jobsnew_search_tsv' AND tgrelid = 'jobsnew'::regclass) THEN
+            CREATE TRIGGER jobsnew_search_tsv BEFORE INSERT OR UPDATE ON jobsnew
+                FOR EACH ROW EXECUTE FUNCTION jobsnew_search_tsv();
+        END IF;
+    END $$""",
+)
+SEARCH_INDEX = "jobsnew_search_tsv_idx"
+
+SCHEMA_UPGRADES += (
+    """CREATE TABLE IF NOT EXISTS job_events (
+        id BIGSERIAL PRIMARY KEY,
+        job_id TEXT NOT NULL,                 -- jobsnew.seek_job_id
+        status TEXT NOT NULL,
+        event_date TEXT NOT NULL DEFAULT '',  -- YYYY-MM-DD；唯一键里不用 NULL
+        note TEXT NOT NULL DEFAULT '',
+        created_at TEXT,
+        CONSTRAINT job_events_key UNIQUE (job_id, status, event_date, note)
+    )""",
+    "CREATE INDEX IF NOT EXISTS job_events_status_date_idx ON job_events (status, event_date)",
+    # 兼容旧的 status_timeline：[{status, date, note}, ...]，顺序同 merge_timelines
+    """CREATE OR REPLACE VIEW jobsnew_status_timeline AS
+        SELECT job_id AS seek_job_id,
+               jsonb_agg(jsonb_build_object('status', status, 'date', event_date, 'note', note)
+                         ORDER BY event_date = '', event_date, id) AS status_timeline
+        FROM job_events GROUP BY job_id""",
+)
+EVENTS_INSERT_SQL = (f"INSERT INTO job_events ({', '.join(EVENT_COLUMNS)}) VALUES %s "
+                     "ON CONFLICT ON CONSTRAINT job_events_key DO NOTHING")
+# 旧库的 jobsnew.status_timeline 搬进 job_events 后改成这个名字（冻结，不再读写）
+LEGACY_TIMELINE_COLUMN = "status_timeline_legacy"
+
+# 旧值不是纯数字（空 / 脏数据）时直接用新值，不让 ::numeric 报错
+PG_COMPETITOR_SQL = r"""CASE
+    WHEN {old} ~ '^\s*\d+\s*$' AND {new} ~ '^\s*\d+\s*$' THEN GREATEST(btrim({old})::numeric, btrim({new})::numeric)::text
+    WHEN {old} ~ '^\s*\d+\s*$' THEN btrim({old})::numeric::text
+    ELSE {new} END"""
+PG_UPSERT_SET = _upsert_set("EXCLUDED", PG_COMPETITOR_SQL)
+# xmax = 0：这一行是本语句插入的（不是冲突后更新的）
+UPSERT_SQL = (f"INSERT INTO jobsnew ({', '.join(COL_NAMES)}) VALUES %s\n"
+              f"ON CONFLICT (seek_job_id) DO UPDATE SET\n  {PG_UPSERT_SET}\n"
+              f"RETURNING seek_job_id, xmax = 0")
+PREPARE_UPSERT_SQL = (
+    f"PREPARE jobsnew_upsert ({', '.join(t for _, t in JOB_COLUMNS)}) AS\n"
+    f"INSERT INTO jobsnew ({', '.join(COL_NAMES)}) "
+    f"VALUES ({', '.join(f'${i}' for i in range(1, len(JOB_COLUMNS) + 1))})\n"
+    f"ON CONFLICT (seek_job_id) DO UPDATE SET\n  {PG_UPSERT_SET}\n"
+    f"RETURNING seek_job_id, xmax = 0"
+)
+EXECUTE_UPSERT_SQL = f"EXECUTE jobsnew_upsert ({', '.join(['%s'] * len(JOB_COLUMNS))})"
+
+PG_IMPORT_DDL = (f"CREATE TEMP TABLE IF NOT EXISTS {IMPORT_TABLE} (ord BIGINT, "
+                 f"{', '.join(f'{c} {t}' for c, t in JOB_COLUMNS)}, status_timeline JSONB) ON COMMIT DROP")
+PG_IMPORT_COLUMNS = ("ord", *COL_NAMES, "status_timeline")
+PG_IMPORT_EVENTS_SQL = f"""
+    INSERT INTO job_events ({', '.join(EVENT_COLUMNS)})
+    SELECT s.seek_job_id, coalesce(e->>'status', ''), coalesce(e->>'date', ''), coalesce(e->>'note', ''), %s
+    FROM {IMPORT_TABLE} s, jsonb_array_elements(CASE WHEN jsonb_typeof(s.status_timeline) = 'array'
+                                                     THEN s.status_timeline ELSE '[]' END) WITH ORDINALITY t(e, pos)
+    ORDER BY s.ord, pos
+    ON CONFLICT ON CONSTRAINT job_events_key DO NOTHING
+"""
+PG_IMPORT_ROUND_SQL = (
+    f"WITH merged AS (\n"
+    f"INSERT INTO jobsnew ({', '.join(COL_NAMES)})\n"
+    f"{_import_round_select(IMPORT_STATUS_SQL)}\n"
+    f"ON CONFLICT (seek_job_id) DO UPDATE SET\n  {_upsert_set('EXCLUDED', PG_COMPETITOR_SQL, fill_only=True)}\n"
+    f"RETURNING xmax = 0 AS inserted)\n"
+    f"SELECT count(*) FILTER (WHERE inserted), count(*) FILTER (WHERE NOT inserted) FROM merged"
+)
+
+def _copy_field(v):
+    """COPY 文本格式：NULL 写 \\N，反斜杠 / 制表符 / 换行转义。"""
+    if v is None: return "\\N"
+    return str(v).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+def pg_connect():
+    import psycopg2
+    return psycopg2.connect(
+        host=os.getenv("POSTGRES_HOST", "localhost"),
+        port=os.getenv("POSTGRES_PORT", "5432"),
+        dbname=os.getenv("POSTGRES_DB", "jobsdb"),
+        user=os.getenv("POSTGRES_USER", "postgres"),
+        password=os.getenv("POSTGRES_PASSWORD", "postgres"),
+    )
+
+def migrate_schema(conn):
+    cur = conn.cursor()
+    cur.execute(JOBSNEW_DDL)
+    for ddl in SCHEMA_UPGRADES:
+        cur.execute(ddl)
+    conn.commit()
+    cur.close()
+    migrate_seek_job_id(conn)
+    migrate_inline_attachments(conn)
+    migrate_search_index(conn)
+    migrate_timeline_events(conn)
+
+def _merge_duplicate_rows(rows):
+    """同一 job 的多行（/job/ 与 /expiredjob/ 各存一份）合并成一行：
+    信息最全的一行为主，其余字段仅在为空时补齐，时间线合并，竞争者取最大。"""
+    fill_cols = ("job_title", "company", "address", "field", "job_type", "posted_date",
+                 "salary", "jd", "html_content", "source", "cv_file", "cl_file",
+                 "cv_sha256", "cl_sha256")
+    rows = sorted(rows, key=lambda r: sum(1 for c in fill_cols if r[c]), reverse=True)
+    keep = dict(rows[0])
+    for r in rows[1:]:
+        for c in fill_cols:
+            keep[c] = keep[c] or r[c]
+        keep["status_timeline"] = merge_timelines(keep["status_timeline"], r["status_timeline"])
+        keep["competitor_count"] = max_competitor(keep["competitor_count"],
+                                                  int(r["competitor_count"]) if (r["competitor_count"] or "").isdigit() else None)
+    if keep["status_timeline"]:
+        keep["status_summary"] = keep["status_timeline"][-1]["status"]
+    return keep, [r["id"] for r in rows[1:]]
+
+def _dedupe_seek_job_ids(conn):
+    from psycopg2.extras import Json
+    cur = conn.cursor()
+    cur.execute("SELECT seek_job_id FROM jobsnew WHERE seek_job_id IS NOT NULL "
+                "GROUP BY seek_job_id HAVING count(*) > 1")
+    dup_ids = [r[0] for r in cur.fetchall()]
+    cols = ("id", "job_url", "job_title", "company", "address", "field", "job_type", "posted_date",
+            "salary", "competitor_count", "jd", "html_content", "source", "status_summary",
+            "status_timeline", "cv_file", "cl_file", "cv_sha256", "cl_sha256")
+    for jid in dup_ids:
+        try:
+            cur.execute(f"SELECT {', '.join(cols)} FROM jobsnew WHERE seek_job_id = %s FOR UPDATE", (jid,))
+            keep, drop_ids = _merge_duplicate_rows([dict(zip(cols, r)) for r in cur.fetchall()])
+            # 先删再改：被删行可能占着 keep 想要的 job_url
+            cur.execute("DELETE FROM jobsnew WHERE id = ANY(%s::uuid[])", (drop_ids,))
+            keep["status_timeline"] = Json(keep["status_timeline"] or [])
+            cur.execute(f"UPDATE jobsnew SET {', '.join(f'{c}=%({c})s' for c in cols if c != 'id')} "
+                        "WHERE id = %(id)s", keep)
+            conn.commit()
+            print(f"[MIGRATE] merged {len(drop_ids) + 1} rows of job {jid}")
+        except Exception as e:
+            conn.rollback()
+            print(f"[MIGRATE] dedupe of job {jid} failed:", e)
+    cur.close()
+
+def migrate_seek_job_id(conn, chunk=5000):
+    """在线迁移：分块回填 seek_job_id（每块独立提交）→ 合并重复 → CONCURRENTLY 建唯一索引。
+    每次启动都可重复执行，已完成的步骤几乎零成本。"""
+    cur = conn.cursor()
+    while True:
+        cur.execute(f"""
+            UPDATE jobsnew SET seek_job_id = {JOB_ID_FROM_URL_SQL}
+            WHERE id IN (SELECT id FROM jobsnew
+                         WHERE seek_job_id IS NULL AND {JOB_ID_FROM_URL_SQL} IS NOT NULL
+                         LIMIT %s)
+        """, (chunk,))
+        n = cur.rowcount
+        conn.commit()
+        if n: print(f"[MIGRATE] backfilled seek_job_id for {n} rows")
+        if n < chunk: break
+
+    _dedupe_seek_job_ids(conn)
+
+    cur.close()
+    ensure_index_concurrently(conn, SEEK_JOB_ID_INDEX,
+                              f"CREATE UNIQUE INDEX CONCURRENTLY {SEEK_JOB_ID_INDEX} ON jobsnew (seek_job_id)")
+
+def ensure_index_concurrently(conn, name, ddl):
+    """索引已有效则直接返回；否则（含上次中断留下的 INVALID 索引）CONCURRENTLY 重建，不锁写。"""
+    cur = conn.cursor()
+    cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    conn.commit()
+    if row and row[0]:
+        cur.close(); return
+    # CREATE/DROP INDEX CONCURRENTLY 不能在事务里跑
+    conn.autocommit = True
+    try:
+        if row:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        cur.execute(ddl)
+        print(f"[MIGRATE] created index {name}")
+    finally:
+        conn.autocommit = False
+        cur.close()
+
+
+def migrate_inline_attachments(conn, chunk=200):
+    """把 jobsnew 里内联的 cv_file / cl_file 搬进 attachments（按 SHA-256 去重），原列置空。
+    分块提交；全部搬完后该函数只剩一次空扫描。"""
+    cur = conn.cursor()
+    moved = 0
+    for col in ("cv", "cl"):
+        while True:
+            cur.execute(f"SELECT id FROM jobsnew WHERE {col}_file IS NOT NULL LIMIT %s", (chunk,))
+            ids = [r[0] for r in cur.fetchall()]
+            if not ids: break
+            cur.execute(f"""
+                INSERT INTO attachments (sha256, content, size_bytes, created_at)
+                SELECT DISTINCT ON (h) h, c, octet_length(c), %s
+                FROM (SELECT encode(sha256({col}_file), 'hex') AS h, {col}_file AS c
+                      FROM jobsnew WHERE id = ANY(%s::uuid[])) t
+                ON CONFLICT (sha256) DO NOTHING
+            """, (datetime.utcnow().isoformat(), ids))
+            cur.execute(f"UPDATE jobsnew SET {col}_sha256 = encode(sha256({col}_file), 'hex'), {col}_file = NULL "
+                        "WHERE id = ANY(%s::uuid[])", (ids,))
+            conn.commit()
+            moved += len(ids)
+    cur.close()
+    if moved:
+        print(f"[MIGRATE] moved {moved} inline CV/CL blobs into attachments; "
+              "run VACUUM FULL jobsnew to return the space")
+
+
+def migrate_search_index(conn, chunk=2000):
+    """分块回填 search_tsv（触发器只管之后的写入）→ CONCURRENTLY 建 GIN 索引。"""
+    cur = conn.cursor()
+    total = 0
+    while True:
+        cur.execute("""
+            UPDATE jobsnew SET search_tsv = jobsnew_search_doc(job_title, company, field, jd)
+            WHERE id IN (SELECT id FROM jobsnew WHERE search_tsv IS NULL LIMIT %s)
+        """, (chunk,))
+        n = cur.rowcount
+        conn.commit()
+        total += n
+        if n < chunk: break
+    cur.close()
+    if total: print(f"[MIGRATE] built search_tsv for {total} rows")
+    ensure_index_concurrently(conn, SEARCH_INDEX,
+                              f"CREATE INDEX CONCURRENTLY {SEARCH_INDEX} ON jobsnew USING GIN (search_tsv)")
+
+
+def migrate_timeline_events(conn):
+    """旧库的 jobsnew.status_timeline 数组展开进 job_events，然后列改名 status_timeline_legacy：
+    之后没有代码再写它，时间线只从视图 jobsnew_status_timeline 读，读旧列的查询直接报错而不是读到过期数据。
+    一个事务（改名只改元数据）；中断了下次启动整体重来，事件插入是幂等的。没有 seek_job_id 的行不搬。"""
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM information_schema.columns WHERE table_schema = current_schema() "
+                "AND table_name = 'jobsnew' AND column_name = 'status_timeline'")
+    if cur.fetchone() is None:
+        conn.commit(); cur.close(); return
+    cur.execute(f"""
+        INSERT INTO job_events ({', '.join(EVENT_COLUMNS)})
+        SELECT j.seek_job_id, coalesce(e->>'status', ''), coalesce(e->>'date', ''), coalesce(e->>'note', ''), %s
+        FROM jobsnew j, jsonb_array_elements(CASE WHEN jsonb_typeof(j.status_timeline) = 'array'
+                                                  THEN j.status_timeline ELSE '[]' END) WITH ORDINALITY t(e, pos)
+        WHERE j.seek_job_id IS NOT NULL
+        ORDER BY j.seek_job_id, pos
+        ON CONFLICT ON CONSTRAINT job_events_key DO NOTHING
+    """, (datetime.utcnow().isoformat(),))
+    moved = cur.rowcount
+    cur.execute(f"ALTER TABLE jobsnew RENAME COLUMN status_timeline TO {LEGACY_TIMELINE_COLUMN}")
+    conn.commit()
+    cur.close()
+    print(f"[MIGRATE] moved {moved} status_timeline events into job_events; "
+          f"jobsnew.status_timeline renamed to {LEGACY_TIMELINE_COLUMN}, read jobsnew_status_timeline instead")
+
+
+class PostgresStore(JobStore):
+    backend = "postgres"
+
+    def __init__(self, conn=None):
+        self.conn = conn if conn is not None else pg_connect()
+        self.cur = self.conn.cursor()
+
+    def migrate(self):
+        migrate_schema(self.conn)
+        # 预编译语句属于连接；同一连接上重复 migrate 直接复用
+        self.cur.execute("SELECT 1 FROM pg_prepared_statements WHERE name = 'jobsnew_upsert'")
+        if self.cur.fetchone() is None:
+            self.cur.execute(PREPARE_UPSERT_SQL)
+        self.conn.commit()
+
+    def load_snapshot(self):
+        """启动时一次读回已有行的轻量快照；octet_length 不解压 TOAST，不拉 jd 本身。"""
+        self.cur.execute("SELECT seek_job_id, sync_fingerprint, COALESCE(octet_length(jd), 0) > 0, "
+                         "COALESCE(octet_length(html_content), 0) > 0, detail_variant, "
+                         "cv_sha256 IS NOT NULL, cl_sha256 IS NOT NULL "
+                         "FROM jobsnew WHERE seek_job_id IS NOT NULL")
+        rows = self.cur.fetchall()
+        self.conn.commit()
+        return _snapshot(rows)
+
+    def existing_attachments(self, hashes):
+        self.cur.execute("SELECT sha256 FROM attachments WHERE sha256 = ANY(%s)", (list(hashes),))
+        return {r[0] for r in self.cur.fetchall()}
+
+    def insert_attachments(self, rows):
+        import psycopg2
+        from psycopg2.extras import execute_values
+        execute_values(self.cur, "INSERT INTO attachments (sha256, content, size_bytes, created_at) "
+                                 "VALUES %s ON CONFLICT (sha256) DO NOTHING",
+                       [(h, psycopg2.Binary(b), size, ts) for h, b, size, ts in rows])
+
+    def _insert_events(self, payloads):
+        from psycopg2.extras import execute_values
+        events = timeline_events(payloads, datetime.utcnow().isoformat())
+        if events:
+            execute_values(self.cur, EVENTS_INSERT_SQL, events, page_size=len(events))
+
+    def _values(self, payload):
+        return tuple(self._row_values(payload))
+
+    def upsert(self, payloads):
+        from psycopg2.extras import execute_values
+        self._insert_events(payloads)
+        rows = execute_values(self.cur, UPSERT_SQL, [self._values(p) for p in payloads],
+                              page_size=max(1, len(payloads)), fetch=True)
+        return {jid for jid, inserted in rows if inserted}
+
+    def upsert_one(self, payload):
+        self._insert_events([payload])
+        self.cur.execute(EXECUTE_UPSERT_SQL, self._values(payload))
+        rows = self.cur.fetchall()
+        return {jid for jid, inserted in rows if inserted}
+
+    def update_details(self, rows):
+        """rows: [(seek_job_id, field, job_type, jd, html_content)]；解析不到的字段保留库里原值。返回更新行数。"""
+        from psycopg2.extras import execute_values
+        execute_values(self.cur, """
+            UPDATE jobsnew AS j SET
+              field = COALESCE(v.field, j.field),
+              job_type = COALESCE(v.job_type, j.job_type),
+              jd = COALESCE(v.jd, j.jd),
+              html_content = COALESCE(v.html_content, j.html_content)
+            FROM (VALUES %s) AS v (seek_job_id, field, job_type, jd, html_content)
+            WHERE j.seek_job_id = v.seek_job_id
+        """, rows, page_size=max(1, len(rows)))
+        return self.cur.rowcount
+
+    def search(self, query, status=None, since=None, until=None, limit=20):
+        """websearch 语法（"短语"、or、-排除）；GIN 索引命中后按 ts_rank 取前 limit 条，只对这几条的 JD 做 ts_headline。"""
+        self.cur.execute(f"""
+            SELECT seek_job_id, job_title, company, status_summary, posted_date, rank,
+                   ts_headline('{SEARCH_TS_CONFIG}', coalesce(jd, ''), q, %s)
+            FROM (SELECT seek_job_id, job_title, company, status_summary, posted_date, jd, q,
+                         ts_rank(search_tsv, q) AS rank
+                  FROM jobsnew, websearch_to_tsquery('{SEARCH_TS_CONFIG}', %s) AS q
+                  WHERE search_tsv @@ q
+                    AND (%s::text IS NULL OR lower(status_summary) = lower(%s))
+                    AND (%s::text IS NULL OR posted_date >= %s)
+                    AND (%s::text IS NULL OR posted_date <= %s)
+                  ORDER BY rank DESC, posted_date DESC NULLS LAST
+                  LIMIT %s) hits
+            ORDER BY rank DESC, posted_date DESC NULLS LAST
+        """, (HEADLINE_OPTIONS, query, status, status, since, since, until, until, limit))
+        rows = self.cur.fetchall()
+        self.conn.commit()
+        return rows
+
+    def stage_import(self, payloads):
+        """一批 payload（含 status_timeline 列表）COPY 进暂存表；暂存顺序即同一 job 多行的合并优先级。"""
+        if not hasattr(self, "_import_ord"):
+            self.cur.execute(PG_IMPORT_DDL)
+            self._import_ord = 0
+        buf = io.StringIO()
+        for p in payloads:
+            self._import_ord += 1
+            vals = [self._import_ord, *self._row_values(p), json.dumps(p.get("status_timeline") or [], ensure_ascii=False)]
+            buf.write("\t".join(_copy_field(v) for v in vals) + "\n")
+        buf.seek(0)
+        self.cur.copy_expert(f"COPY {IMPORT_TABLE} ({', '.join(PG_IMPORT_COLUMNS)}) FROM STDIN", buf)
+
+    def merge_import(self):
+        """暂存行的状态事件进 job_events，再按轮合并进 jobsnew；返回 (新插入, 合并进已有行)。暂存表随提交删除。"""
+        if not hasattr(self, "_import_ord"): return 0, 0
+        self.cur.execute(PG_IMPORT_EVENTS_SQL, (datetime.utcnow().isoformat(),))
+        inserted = merged = 0
+        for rn in itertools.count(1):
+            self.cur.execute(PG_IMPORT_ROUND_SQL.format(rn=rn))
+            ins, upd = self.cur.fetchone()
+            if not ins and not upd: break
+            inserted += ins; merged += upd
+        self.cur.execute(f"DROP TABLE IF EXISTS {IMPORT_TABLE}")
+        del self._import_ord
+        return inserted, merged
+
+    def savepoint(self): self.cur.execute("SAVEPOINT job_row")
+    def release_savepoint(self): self.cur.execute("RELEASE SAVEPOINT job_row")
+    def rollback_to_savepoint(self): self.cur.execute("ROLLBACK TO SAVEPOINT job_row")
+    def commit(self): self.conn.commit()
+    def rollback(self): self.conn.rollback()
+
+    def close(self):
+        try: self.cur.close()
+        except Exception: pass
+        self.conn.close()
+
+
+# =========================
+# SQLite
+# =========================
+SQLITE_DDL = (
+    """CREATE TABLE IF NOT EXISTS attachments (
+        sha256 TEXT PRIMARY KEY,
+        content BLOB NOT NULL,
+        size_bytes INTEGER,
+        created_at TEXT
+    )""",
+    """CREATE TABLE IF NOT EXISTS jobsnew (
+        id TEXT PRIMARY KEY,
+        job_url TEXT UNIQUE,
+        job_title TEXT,
+        company TEXT,
+        address TEXT,
+        field TEXT,
+        job_type TEXT,
+        posted_date TEXT,
+        salary TEXT,
+        competitor_count TEXT,
+        jd TEXT,
+        html_content TEXT,
+        source TEXT,
+        status_summary TEXT,
+        created_at TEXT,
+        seek_job_id TEXT,
+        sync_fingerprint TEXT,
+        cv_sha256 TEXT REFERENCES attachments(sha256),
+        cl_sha256 TEXT REFERENCES attachments(sha256),
+        detail_variant TEXT
+    )""",
+    f"CREATE UNIQUE INDEX IF NOT EXISTS {SEEK_JOB_ID_INDEX} ON jobsnew (seek_job_id)",
+    """CREATE TABLE IF NOT EXISTS job_events (
+        id INTEGER PRIMARY KEY,
+        job_id TEXT NOT NULL,
+        status TEXT NOT NULL,
+        event_date TEXT NOT NULL DEFAULT '',
+        note TEXT NOT NULL DEFAULT '',
+        created_at TEXT,
+        UNIQUE (job_id, status, event_date, note)
+    )""",
+    "CREATE INDEX IF NOT EXISTS job_events_status_date_idx ON job_events (status, event_date)",
+    # json_group_array 按子查询的顺序聚合
+    """CREATE VIEW IF NOT EXISTS jobsnew_status_timeline AS
+        SELECT job_id AS seek_job_id,
+               json_group_array(json_object('status', status, 'date', event_date, 'note', note)) AS status_timeline
+        FROM (SELECT * FROM job_events ORDER BY job_id, event_date = '', event_date, id)
+        GROUP BY job_id""",
+)
+SQLITE_EVENTS_INSERT_SQL = (f"INSERT INTO job_events ({', '.join(EVENT_COLUMNS)}) VALUES (?, ?, ?, ?, ?) "
+                            "ON CONFLICT (job_id, status, event_date, note) DO NOTHING")
+
+# 全文检索：FTS5 外部内容表（不另存一份正文），触发器跟着 jobsnew 的写入维护
+SQLITE_FTS_DDL = (
+    """CREATE VIRTUAL TABLE jobsnew_fts USING fts5(
+        job_title, company, field, jd, content='jobsnew', content_rowid='rowid', tokenize='porter unicode61')""",
+    """CREATE TRIGGER jobsnew_fts_ai AFTER INSERT ON jobsnew BEGIN
+        INSERT INTO jobsnew_fts (rowid, job_title, company, field, jd)
+        VALUES (new.rowid, new.job_title, new.company, new.field, new.jd);
+    END""",
+    """CREATE TRIGGER jobsnew_fts_ad AFTER DELETE ON jobsnew BEGIN
+        INSERT INTO jobsnew_fts (jobsnew_fts, rowid, job_title, company, field, jd)
+        VALUES ('delete', old.rowid, old.job_title, old.company, old.field, old.jd);
+    END""",
+    """CREATE TRIGGER jobsnew_fts_au AFTER UPDATE OF job_title, company, field, jd ON jobsnew
+    WHEN old.job_title IS NOT new.job_title OR old.company IS NOT new.company
+      OR old.field IS NOT new.field OR old.jd IS NOT new.jd BEGIN
+        INSERT INTO jobsnew_fts (jobsnew_fts, rowid, job_title, company, field, jd)
+        VALUES ('delete', old.rowid, old.job_title, old.company, old.field, old.jd);
+        INSERT INTO jobsnew_fts (rowid, job_title, company, field, jd)
+        VALUES (new.rowid, new.job_title, new.company, new.field, new.jd);
+    END""",
+    "INSERT INTO jobsnew_fts (jobsnew_fts) VALUES ('rebuild')",   # 已有行一次建好
+)
+
+# 人数合并注册成连接上的 Python 函数（max_competitor），规则与 Postgres 一致
+SQLITE_UPSERT_SQL = (f"INSERT INTO jobsnew ({', '.join(COL_NAMES)}) VALUES ({', '.join(['?'] * len(COL_NAMES))})\n"
+                     f"ON CONFLICT (seek_job_id) DO UPDATE SET\n  "
+                     f"{_upsert_set('excluded', 'jobsnew_max_competitor({old}, {new})')}")
+
+SQLITE_IMPORT_DDL = (f"CREATE TEMP TABLE IF NOT EXISTS {IMPORT_TABLE} (ord INTEGER, "
+                     f"{', '.join(COL_NAMES)}, status_timeline TEXT)")
+SQLITE_IMPORT_INSERT_SQL = (f"INSERT INTO {IMPORT_TABLE} (ord, {', '.join(COL_NAMES)}, status_timeline) "
+                            f"VALUES ({', '.join(['?'] * (len(COL_NAMES) + 2))})")
+SQLITE_IMPORT_EVENTS_SQL = f"""
+    INSERT INTO job_events ({', '.join(EVENT_COLUMNS)})
+    SELECT s.seek_job_id, coalesce(json_extract(e.value, '$.status'), ''), coalesce(json_extract(e.value, '$.date'), ''),
+           coalesce(json_extract(e.value, '$.note'), ''), ?
+    FROM {IMPORT_TABLE} s, json_each(CASE WHEN json_valid(s.status_timeline) AND json_type(s.status_timeline) = 'array'
+                                         THEN s.status_timeline ELSE '[]' END) e
+    WHERE true
+    ORDER BY s.ord, e.key
+    ON CONFLICT (job_id, status, event_date, note) DO NOTHING
+"""
+SQLITE_IMPORT_ROUND_SQL = (
+    f"INSERT INTO jobsnew ({', '.join(COL_NAMES)})\n"
+    f"{_import_round_select(IMPORT_STATUS_SQL)}\n"
+    f"ON CONFLICT (seek_job_id) DO UPDATE SET\n  "
+    f"{_upsert_set('excluded', 'jobsnew_max_competitor({old}, {new})', fill_only=True)}"
+)
+SQLITE_IMPORT_COUNT_SQL = (f"SELECT count(*), count(*) FILTER (WHERE NOT EXISTS "
+                           f"(SELECT 1 FROM jobsnew j WHERE j.seek_job_id = s.seek_job_id)) "
+                           f"FROM (SELECT seek_job_id, row_number() OVER (PARTITION BY seek_job_id ORDER BY ord) AS rn "
+                           f"FROM {IMPORT_TABLE}) s WHERE s.rn = ?")
+
+def _sqlite_max_competitor(old, new):
+    try: new = int(new) if new is not None else None
+    except (TypeError, ValueError): return new
+    return max_competitor(old, new)
+
+class SQLiteStore(JobStore):
+    """单文件嵌入式后端。isolation_level=None 自己管事务：第一次写时 BEGIN，commit() 时 COMMIT。
+    写线程（BackgroundWriter）和主线程先后用同一连接，所以 check_same_thread=False；同一时刻只有一个线程用。"""
+    backend = "sqlite"
+    CHUNK = 500   # IN (...) 每次最多这么多参数
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.create_function("jobsnew_max_competitor", 2, _sqlite_max_competitor, deterministic=True)
+        self._in_tx = False
+
+    def migrate(self):
+        for ddl in SQLITE_DDL:
+            self.conn.execute(ddl)
+        if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'jobsnew_fts'").fetchone():
+            self.conn.execute("BEGIN")
+            for ddl in SQLITE_FTS_DDL:
+                self.conn.execute(ddl)
+            self.conn.execute("COMMIT")
+        # 旧的 status_timeline JSON 搬进 job_events 后改名冻结，同 migrate_timeline_events
+        if "status_timeline" in {r[1] for r in self.conn.execute("PRAGMA table_info(jobsnew)")}:
+            self.conn.execute("BEGIN")
+            moved = self.conn.execute(f"""
+                INSERT INTO job_events ({', '.join(EVENT_COLUMNS)})
+                SELECT j.seek_job_id, coalesce(json_extract(e.value, '$.status'), ''), coalesce(json_extract(e.value, '$.date'), ''),
+                       coalesce(json_extract(e.value, '$.note'), ''), ?
+                FROM jobsnew j, json_each(CASE WHEN json_valid(j.status_timeline) AND json_type(j.status_timeline) = 'array'
+                                              THEN j.status_timeline ELSE '[]' END) e
+                WHERE j.status_timeline IS NOT NULL AND j.seek_job_id IS NOT NULL
+                ORDER BY j.rowid, e.key
+                ON CONFLICT (job_id, status, event_date, note) DO NOTHING
+            """, (datetime.utcnow().isoformat(),)).rowcount
+            self.conn.execute(f"ALTER TABLE jobsnew RENAME COLUMN status_timeline TO {LEGACY_TIMELINE_COLUMN}")
+            self.conn.execute("COMMIT")
+            print(f"[MIGRATE] moved {moved} status_timeline events into job_events; "
+                  f"jobsnew.status_timeline renamed to {LEGACY_TIMELINE_COLUMN}, read jobsnew_status_timeline instead")
+
+    def _begin(self):
+        if not self._in_tx:
+            self.conn.execute("BEGIN")
+            self._in_tx = True
+
+    def _chunks(self, items):
+        items = list(items)
+        for i in range(0, len(items), self.CHUNK):
+            yield items[i:i + self.CHUNK]
+
+    def load_snapshot(self):
+        rows = self.conn.execute(
+            "SELECT seek_job_id, sync_fingerprint, COALESCE(length(jd), 0) > 0, "
+            "COALESCE(length(html_content), 0) > 0, detail_variant, "
+            "cv_sha256 IS NOT NULL, cl_sha256 IS NOT NULL "
+            "FROM jobsnew WHERE seek_job_id IS NOT NULL").fetchall()
+        return _snapshot((jid, fp, bool(a), bool(b), v, bool(c), bool(d)) for jid, fp, a, b, v, c, d in rows)
+
+    def existing_attachments(self, hashes):
+        have = set()
+        for part in self._chunks(hashes):
+            have |= {r[0] for r in self.conn.execute(
+                f"SELECT sha256 FROM attachments WHERE sha256 IN ({', '.join(['?'] * len(part))})", part)}
+        return have
+
+    def insert_attachments(self, rows):
+        self._begin()
+        self.conn.executemany("INSERT INTO attachments (sha256, content, size_bytes, created_at) "
+                              "VALUES (?, ?, ?, ?) ON CONFLICT (sha256) DO NOTHING",
+                              [(h, sqlite3.Binary(b), size, ts) for h, b, size, ts in rows])
+
+
+    def upsert(self, payloads):
+        self._begin()
+        # 只走 seek_job_id 索引判断哪些是新行（executemany 不能带 RETURNING）
+        jids = [p["seek_job_id"] for p in payloads]
+        existed = set()
+        for part in self._chunks(jids):
+            existed |= {r[0] for r in self.conn.execute(
+                f"SELECT seek_job_id FROM jobsnew WHERE seek_job_id IN ({', '.join(['?'] * len(part))})", part)}
+        self.conn.executemany(SQLITE_EVENTS_INSERT_SQL, timeline_events(payloads, datetime.utcnow().isoformat()))
+        self.conn.executemany(SQLITE_UPSERT_SQL, [self._row_values(p) for p in payloads])
+        return set(jids) - existed
+
+    def update_details(self, rows):
+        self._begin()
+        cur = self.conn.executemany("""
+            UPDATE jobsnew SET
+              field = COALESCE(?2, field),
+              job_type = COALESCE(?3, job_type),
+              jd = COALESCE(?4, jd),
+              html_content = COALESCE(?5, html_content)
+            WHERE seek_job_id = ?1
+        """, rows)
+        return cur.rowcount   # total_changes 会把 FTS 触发器的写入也算进去
+
+    def search(self, query, status=None, since=None, until=None, limit=20):
+        """同 PostgresStore.search；bm25 按 标题 / 公司 / 领域 / JD 加权，snippet 取 JD 片段。"""
+        match = fts5_query(query)
+        if not match: return []
+        return self.conn.execute("""
+            SELECT j.seek_job_id, j.job_title, j.company, j.status_summary, j.posted_date,
+                   -bm25(jobsnew_fts, 8.0, 4.0, 2.0, 1.0) AS rank,
+                   snippet(jobsnew_fts, 3, '[', ']', ' ... ', 24)
+            FROM jobsnew_fts JOIN jobsnew j ON j.rowid = jobsnew_fts.rowid
+            WHERE jobsnew_fts MATCH ?1
+              AND (?2 IS NULL OR lower(j.status_summary) = lower(?2))
+              AND (?3 IS NULL OR j.posted_date >= ?3)
+              AND (?4 IS NULL OR j.posted_date <= ?4)
+            ORDER BY rank DESC, j.posted_date DESC
+            LIMIT ?5
+        """, (match, status, since, until, limit)).fetchall()
+
+    def stage_import(self, payloads):
+        """同 PostgresStore.stage_import，暂存用临时表 + executemany。"""
+        self._begin()
+        if not hasattr(self, "_import_ord"):
+            self.conn.execute(SQLITE_IMPORT_DDL)
+            self._import_ord = 0
+        rows = []
+        for p in payloads:
+            self._import_ord += 1
+            rows.append((self._import_ord, *self._row_values(p), json.dumps(p.get("status_timeline") or [], ensure_ascii=False)))
+        self.conn.executemany(SQLITE_IMPORT_INSERT_SQL, rows)
+
+    def merge_import(self):
+        if not hasattr(self, "_import_ord"): return 0, 0
+        self.conn.execute(SQLITE_IMPORT_EVENTS_SQL, (datetime.utcnow().isoformat(),))
+        inserted = merged = 0
+        for rn in itertools.count(1):
+            total, new = self.conn.execute(SQLITE_IMPORT_COUNT_SQL, (rn,)).fetchone()
+            if not total: break
+            self.conn.execute(SQLITE_IMPORT_ROUND_SQL.format(rn=rn))
+            inserted += new; merged += total - new
+        self.conn.execute(f"DROP TABLE temp.{IMPORT_TABLE}")
+        del self._import_ord
+        return inserted, merged
+
+    def savepoint(self):
+        self._begin()
+        self.conn.execute("SAVEPOINT job_row")
+    def release_savepoint(self): self.conn.execute("RELEASE SAVEPOINT job_row")
+    def rollback_to_savepoint(self): self.conn.execute("ROLLBACK TO SAVEPOINT job_row")
+
+    def commit(self):
+        if self._in_tx:
+            self.conn.execute("COMMIT")
+            self._in_tx = False
+
+    def rollback(self):
+        if self._in_tx:
+            self.conn.execute("ROLLBACK")
+            self._in_tx = False
+
+    def close(self):
+        self.commit()
+        self.conn.close()
+
+
+HEADLINE_OPTIONS = "StartSel=[, StopSel=], MaxFragments=2, MaxWords=24, MinWords=8, FragmentDelimiter=\" ... \""
+
+def fts5_query(query):
+    """把 websearch 风格的查询（"短语"、or、-排除）翻成 FTS5 语法；词都加引号，标点不会被当成运算符。"""
+    terms, negated = [], []
+    for m in re.finditer(r'(-?)"([^"]*)"|(\S+)', query or ""):
+        neg, phrase, word = m.groups()
+        if word is not None:
+            if word.lower() == "or":
+                if terms and terms[-1] != "OR": terms.append("OR")
+                continue
+            neg, phrase = ("-", word[1:]) if word.startswith("-") else ("", word)
+        phrase = phrase.replace('"', "").strip()
+        if not phrase: continue
+        (negated if neg else terms).append(f'"{phrase}"')
+    while terms and terms[-1] == "OR": terms.pop()
+    if not terms: return None
+    return f"({' '.join(terms)})" + "".join(f" NOT {t}" for t in negated)
+
+def _snapshot(rows):
+    return {jid: {"fingerprint": fp, "has_jd": has_jd, "has_html": has_html, "detail_variant": variant,
+                  "has_cv": has_cv, "has_cl": has_cl}
+            for jid, fp, has_jd, has_html, variant, has_cv, has_cl in rows}
+
+
+def connect_store(backend=None):
+    """按 DB_BACKEND 建后端（连库 / 打开文件），不跑迁移。"""
+    backend = (backend or DB_BACKEND).lower()
+    if backend in ("postgres", "postgresql", "pg"):
+        return PostgresStore()
+    if backend == "sqlite":
+        return SQLiteStore(SQLITE_PATH)
+    raise ValueError(f"unknown DB_BACKEND {backend!r} (postgres / sqlite)")
+
+def open_store(backend=None):
+    """connect_store + 建表 / 迁移（幂等）。"""
+    store = connect_store(backend)
+    store.migrate()
+    return store
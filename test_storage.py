@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+storage.py 的合并规则（upsert / merge_import 在 SQL 里完成，这里是唯一的校验）：SQLite 后端，不需要数据库服务
+    python -m pytest -q test_storage.py
+"""
+import json, uuid
+
+import pytest
+
+from storage import SQLiteStore
+
+
+def payload(jid, **kw):
+    p = {"id": str(uuid.uuid4()), "job_url": f"https://www.seek.co.nz/job/{jid}", "seek_job_id": jid,
+         "created_at": "2025-01-01T00:00:00", "status_timeline": []}
+    p.update(kw)
+    return p
+
+def row(store, jid, *cols):
+    return store.conn.execute(f"SELECT {', '.join(cols)} FROM jobsnew WHERE seek_job_id = ?", (jid,)).fetchone()
+
+def timeline(store, jid):
+    r = store.conn.execute("SELECT status_timeline FROM jobsnew_status_timeline WHERE seek_job_id = ?", (jid,)).fetchone()
+    return [(t["status"], t["date"]) for t in json.loads(r[0])] if r else []
+
+@pytest.fixture
+def store(tmp_path):
+    s = SQLiteStore(str(tmp_path / "jobs.sqlite3"))
+    s.migrate()
+    yield s
+    s.close()
+
+
+def test_upsert_returns_only_new_ids(store):
+    assert store.upsert([payload("1"), payload("2")]) == {"1", "2"}
+    assert store.upsert([payload("2"), payload("3")]) == {"3"}
+
+
+def test_fill_if_empty_and_overwrite_columns(store):
+    store.upsert([payload("1", job_title="old title", company="", jd=None, posted_date="2025-01-01",
+                          sync_fingerprint="fp1")])
+    store.upsert([payload("1", job_title="new title", company="Acme", jd="jd", posted_date="2025-02-01",
+                          sync_fingerprint="fp2")])
+    # 库里有值保留、为空（NULL / ''）才补；posted_date / sync_fingerprint 以新值为准
+    assert row(store, "1", "job_title", "company", "jd", "posted_date", "sync_fingerprint") == \
+        ("old title", "Acme", "jd", "2025-02-01", "fp2")
+
+
+def test_keep_if_null_columns(store):
+    store.insert_attachments([("h1", b"cv", 2, "2025-01-01")])
+    store.upsert([payload("1", cv_sha256="h1", detail_variant="expiredjob")])
+    store.upsert([payload("1", cv_sha256=None, detail_variant=None)])
+    assert row(store, "1", "cv_sha256", "detail_variant") == ("h1", "expiredjob")
+
+
+@pytest.mark.parametrize("old, new, expected", [
+    ("5", 9, "9"),
+    ("9", 5, "9"),
+    ("7", None, "7"),
+    (None, 3, "3"),
+    ("n/a", 4, "4"),     # 旧值不是数字，用新值
+])
+def test_competitor_count_takes_max(store, old, new, expected):
+    store.upsert([payload("1", competitor_count=old)])
+    store.upsert([payload("1", competitor_count=new)])
+    assert row(store, "1", "competitor_count") == (expected,)
+
+
+def test_timeline_events_merge_and_summary(store):
+    store.upsert([payload("1", status_summary="Applied",
+                          status_timeline=[{"status": "Applied", "date": "2025-01-02", "note": ""}])])
+    store.upsert([payload("1", status_summary="Unknown",
+                          status_timeline=[{"status": "Applied", "date": "2025-01-02", "note": ""},
+                                           {"status": "Viewed", "date": "2025-01-05", "note": ""},
+                                           {"status": "Undated", "date": "", "note": ""}])])
+    # (status, date, note) 去重；按日期排序、空日期放最后；status_summary 取最后一条
+    assert timeline(store, "1") == [("Applied", "2025-01-02"), ("Viewed", "2025-01-05"), ("Undated", "")]
+    assert row(store, "1", "status_summary") == ("Undated",)
+    assert store.conn.execute("SELECT count(*) FROM job_events").fetchone() == (3,)
+
+
+def test_status_summary_without_events_uses_payload(store):
+    store.upsert([payload("1", status_summary="Applied")])
+    assert row(store, "1", "status_summary") == ("Applied",)
+
+
+def test_merge_import_only_fills_gaps(store):
+    store.upsert([payload("1", job_title="current", competitor_count="3", status_summary="Viewed",
+                          status_timeline=[{"status": "Viewed", "date": "2025-01-10", "note": ""}])])
+    store.stage_import([
+        payload("1", job_title="legacy", company="LegacyCo", competitor_count="8",
+                status_timeline=[{"status": "Applied", "date": "2024-12-01", "note": ""}]),
+        payload("2", job_title="first", jd=""),
+        payload("2", job_title="second", jd="legacy jd"),   # 同一 job 第二行：只补第一行留空的列
+    ])
+    assert store.merge_import() == (1, 2)
+    assert row(store, "1", "job_title", "company", "competitor_count", "status_summary") == \
+        ("current", "LegacyCo", "8", "Viewed")
+    assert timeline(store, "1") == [("Applied", "2024-12-01"), ("Viewed", "2025-01-10")]
+    assert row(store, "2", "job_title", "jd") == ("first", "legacy jd")